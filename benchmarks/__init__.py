@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Run benchmarks from the repo root, e.g. `python -m benchmarks.bench_fetch`
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))), 'lambda_handlers'))
@@ -0,0 +1,86 @@
+"""One /compare grid vs a separate chart per symbol.
+
+Both paths draw the same symbols from the reusable templates and encode to
+PNG; the grid encodes once where the separate charts encode (and would
+upload) once per symbol. The grid's per-panel time is its data swap plus its
+axes' share of the Agg draw.
+
+    python -m benchmarks.bench_compare --symbols 4 --runs 5
+"""
+import argparse
+import statistics
+import time
+
+from utils.chart_template import ChartTemplatePool, prepare_chart_data
+from utils.compare_grid import MAX_PANELS, CompareTemplate, prepare_compare_data
+from utils.image_utils import encode_figure
+from utils.indicator_utils import IndicatorEngine
+from utils.parse_utils import parse_closes, parse_ohlcv
+from tests.stubs import make_historical
+
+
+def sample_frames(count):
+    spy_df = parse_closes(make_historical('SPY')['historical'], 'SPY Close')
+    return {f'BENCH{i}': parse_ohlcv(make_historical(f'BENCH{i}')['historical']).join(
+                spy_df, how='inner')
+            for i in range(count)}
+
+
+def make_render_separate(frames):
+    pool = ChartTemplatePool()
+    engine = IndicatorEngine()
+
+    def render_separate():
+        sizes = []
+        for frame in frames.values():
+            indicators, _ = engine.run(frame)
+            with pool.acquire() as template:
+                buf, _ = encode_figure(template.render(prepare_chart_data(frame, indicators)))
+            sizes.append(buf.getbuffer().nbytes)
+        return sizes, {}
+    return render_separate
+
+
+def make_render_grid(frames):
+    pool = ChartTemplatePool(CompareTemplate)
+
+    def render_grid():
+        compare_data = prepare_compare_data(frames)
+        with pool.acquire(len(compare_data['panels'])) as template:
+            buf, _ = encode_figure(template.render(compare_data))
+            return [buf.getbuffer().nbytes], template.panel_ms()
+    return render_grid
+
+
+def time_runs(fn, runs):
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    frames = sample_frames(min(args.symbols, MAX_PANELS))
+
+    print(f'{"mode":<10}{"objects":>9}{"KB":>9}{"first ms":>10}{"p50 ms":>10}{"min ms":>10}')
+    for name, fn in (('separate', make_render_separate(frames)),
+                     ('grid', make_render_grid(frames))):
+        first = time_runs(fn, 1)[0][0]
+        samples, (sizes, panel_ms) = time_runs(fn, args.runs)
+        print(f'{name:<10}{len(sizes):>9}{sum(sizes) / 1024:>9.0f}{first:>10.1f}'
+              f'{statistics.median(samples):>10.1f}{min(samples):>10.1f}')
+
+    print()
+    print(f'{"panel":<10}{"ms":>9}')
+    for symbol, ms in panel_ms.items():
+        print(f'{symbol:<10}{ms:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Encode time and size of a rendered chart for each output format.
+
+    python -m benchmarks.bench_encode --runs 5
+"""
+import argparse
+import statistics
+import time
+
+from utils.chart_template import ChartTemplatePool
+from utils.image_utils import encode_figure
+from benchmarks.bench_render import sample_chart_data
+
+VARIANTS = (
+    ('png level 6 (default)', {'fmt': 'png', 'compress_level': 6}),
+    ('png level 1', {'fmt': 'png', 'compress_level': 1}),
+    ('png level 9', {'fmt': 'png', 'compress_level': 9}),
+    ('png 256 colours', {'fmt': 'png', 'colors': 256}),
+    ('png 64 colours', {'fmt': 'png', 'colors': 64}),
+    ('webp q80', {'fmt': 'webp', 'quality': 80}),
+    ('webp q90', {'fmt': 'webp', 'quality': 90}),
+    ('webp lossless', {'fmt': 'webp', 'quality': 100}),
+    ('jpeg q85', {'fmt': 'jpeg', 'quality': 85}),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with ChartTemplatePool().acquire() as template:
+        fig = template.render(sample_chart_data())
+        encode_figure(fig)  # warm up fonts and the Agg renderer
+
+        print(f'{"format":<24}{"p50 ms":>10}{"KiB":>10}')
+        for name, options in VARIANTS:
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                buf, _ = encode_figure(fig, **options)
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f'{name:<24}{statistics.median(samples):>10.1f}'
+                  f'{len(buf.getvalue()) / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Serial vs concurrent ticker+SPY fetch latency against a local FMP stub.
+
+    python -m benchmarks.bench_fetch --latency 0.15 --runs 10
+"""
+import argparse
+import statistics
+import time
+
+from utils import fetch_utils
+from tests.stubs import FmpStub
+
+
+def fetch_serial(tickers, session):
+    return [fetch_utils.fetch_data_from_api(t, session=session) for t in tickers]
+
+
+def fetch_parallel(tickers, session):
+    return fetch_utils.fetch_concurrently(
+        lambda t: fetch_utils.fetch_data_from_api(t, session=session), tickers)
+
+
+def time_runs(fn, tickers, session, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(tickers, session)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.15,
+                        help='simulated server latency per request (s)')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--tickers', default='NVDA,SPY')
+    args = parser.parse_args()
+    tickers = args.tickers.split(',')
+
+    with FmpStub(delay=args.latency) as stub:
+        fetch_utils.base_url = stub.url
+        session = fetch_utils.make_session()
+        fetch_parallel(tickers, session)  # warm the connection pool
+
+        print(f'{"mode":<12}{"p50 ms":>10}{"max ms":>10}')
+        for name, fn in (('serial', fetch_serial), ('concurrent', fetch_parallel)):
+            samples = time_runs(fn, tickers, session, args.runs)
+            print(f'{name:<12}{statistics.median(samples):>10.1f}'
+                  f'{max(samples):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""End-to-end latency, memory and throughput of the chart handler, offline.
+
+Each scenario runs in a fresh interpreter, like a new Lambda container: it
+imports the handler, swaps its stores for in-memory ones and invokes
+`handler` with a synthetic SNS /chart event. FMP and the Discord webhook are
+local stubs in this process; FMP serves the JSON fixtures in --fixtures
+(written by --record) or deterministic synthetic bars ending FIXTURE_END.
+
+Per scenario it reports
+  init      module import, what Lambda bills as the init phase
+  cold      the first invocation (empty stores, lazy imports, first render)
+  warm_miss later invocations that still render (chart cache cleared)
+  warm_hit  later invocations served from the chart cache
+and the child's peak RSS. Results go to a JSON file named after the commit,
+so two commits can be compared before changing the Lambda memory size.
+
+    python -m benchmarks.bench_handler --runs 5
+    python -m benchmarks.bench_handler --compare benchmarks/results/a.json benchmarks/results/b.json
+    FMP_API_KEY=... python -m benchmarks.bench_handler --record
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures', 'fmp')
+RESULTS = os.path.join(ROOT, 'benchmarks', 'results')
+
+FIXTURE_END = datetime.date(2024, 5, 10)
+BATCH = ['AAPL', 'MSFT', 'NVDA', 'AMZN', 'META', 'GOOGL', 'TSLA', 'AMD', 'AVGO', 'NFLX']
+SCENARIOS = {
+    'single': ['AAPL'],
+    'batch': BATCH,
+}
+
+
+def load_fixtures(path, symbols):
+    # Recorded payloads where present, synthetic ones otherwise
+    from tests.stubs import make_historical
+    payloads = {}
+    for symbol in symbols:
+        fixture = os.path.join(path, f'{symbol}.json')
+        if os.path.exists(fixture):
+            with open(fixture) as f:
+                payloads[symbol] = json.load(f)
+        else:
+            payloads[symbol] = make_historical(symbol, days=2 * 365, end=FIXTURE_END)
+    return payloads
+
+
+def record_fixtures(path, symbols):
+    from utils.fetch_utils import default_from_date, fetch_data_from_api
+    os.makedirs(path, exist_ok=True)
+    for symbol in symbols:
+        payload = fetch_data_from_api(symbol, default_from_date(2 * 365))
+        if payload is None:
+            print('could not record', symbol)
+            continue
+        with open(os.path.join(path, f'{symbol}.json'), 'w') as f:
+            json.dump(payload, f)
+        print('recorded', symbol, len(payload['historical']), 'bars')
+
+
+def run_child(config):
+    # Runs in the fresh interpreter; returns the scenario's measurements
+    import importlib
+    import resource
+
+    started = time.perf_counter()
+    module = importlib.import_module('candlestick-maker')
+    init_ms = (time.perf_counter() - started) * 1000
+
+    from utils import metrics_utils
+    from utils.benchmark_cache import BenchmarkCache
+    from utils.blob_store import MemoryBlobStore
+    from utils.chart_cache import ChartCache
+    from utils.ohlcv_store import OhlcvStore
+    from tests.stubs import make_chart_event
+
+    store = MemoryBlobStore()
+    module.benchmark_cache = BenchmarkCache(module.fmp_client.historical, store,
+                                            transform=module.parse_benchmark)
+    module.ohlcv_store = OhlcvStore(store, module.fmp_client.historical)
+    module.chart_cache = ChartCache(store)
+    module.request_stats = None
+    # Fixtures end on a fixed date, so the year of bars is counted from it
+    module.default_from_date = lambda days=365: config['from_date']
+    event = make_chart_event(' '.join(config['symbols']))
+
+    def invoke():
+        start = time.perf_counter()
+        module.handler(event, None)
+        values = metrics_utils.current().values()
+        return {'ms': (time.perf_counter() - start) * 1000,
+                'first_response_ms': values.get('first_response_ms')}
+
+    def clear_charts():
+        with store._lock:
+            for key in [k for k in store.objects if k.startswith('charts/')]:
+                del store.objects[key]
+
+    runs = {'cold': [invoke()], 'warm_miss': [], 'warm_hit': []}
+    for _ in range(config['runs']):
+        clear_charts()
+        runs['warm_miss'].append(invoke())
+    for _ in range(config['runs']):
+        runs['warm_hit'].append(invoke())
+
+    return {'init_ms': init_ms, 'runs': runs,
+            # ru_maxrss is in KiB on Linux
+            'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def child_process(config, fmp_url, discord_url, **kwargs):
+    # Starts the scenario's fresh interpreter; `kwargs` go to Popen
+    env = dict(os.environ, FMP_BASE_URL=fmp_url, FMP_API_KEY='bench',
+               DISCORD_API_BASE=discord_url, CHART_STORE_DIR='/tmp/ss-charting-bot-bench',
+               PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, 'lambda_handlers')]))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.bench_handler', '--child', json.dumps(config)],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+
+
+def child_result(process):
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        sys.stderr.write(stderr)
+        raise RuntimeError('benchmark child failed')
+    # The handler logs freely; the result is the last line
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def spawn(symbols, from_date, runs, fmp_url, discord_url):
+    config = {'symbols': symbols, 'from_date': from_date, 'runs': runs}
+    return child_result(child_process(config, fmp_url, discord_url))
+
+
+def summarize(symbols, child):
+    summary = {'symbols': len(symbols), 'init_ms': round(child['init_ms'], 1),
+               'peak_rss_mib': round(child['peak_rss_mib'], 1)}
+    for phase, samples in child['runs'].items():
+        if not samples:
+            continue
+        ms = [s['ms'] for s in samples]
+        first = [s['first_response_ms'] for s in samples if s['first_response_ms'] is not None]
+        p50 = statistics.median(ms)
+        summary[phase] = {
+            'p50_ms': round(p50, 1),
+            'max_ms': round(max(ms), 1),
+            'first_response_p50_ms': round(statistics.median(first), 1) if first else None,
+            'charts_per_s': round(len(symbols) / p50 * 1000, 2),
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_summary(results):
+    print(f'commit {results["commit"]}, python {results["python"]}, {results["cpus"]} cpus')
+    print(f'{"scenario":<10}{"phase":<11}{"p50 ms":>10}{"max ms":>10}'
+          f'{"first ms":>10}{"charts/s":>10}')
+    for name, summary in results['scenarios'].items():
+        print(f'{name:<10}{"init":<11}{summary["init_ms"]:>10.1f}')
+        for phase in ('cold', 'warm_miss', 'warm_hit'):
+            row = summary[phase]
+            first = row['first_response_p50_ms']
+            print(f'{"":<10}{phase:<11}{row["p50_ms"]:>10.1f}{row["max_ms"]:>10.1f}'
+                  f'{first if first is not None else float("nan"):>10.1f}'
+                  f'{row["charts_per_s"]:>10.2f}')
+        print(f'{"":<10}{"peak rss":<11}{summary["peak_rss_mib"]:>10.1f} MiB')
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old["commit"]} -> {new["commit"]}')
+    for name, summary in new['scenarios'].items():
+        before = old['scenarios'].get(name)
+        if before is None:
+            continue
+        rows = [('init_ms', before['init_ms'], summary['init_ms']),
+                ('peak_rss_mib', before['peak_rss_mib'], summary['peak_rss_mib'])]
+        rows += [(f'{phase}.p50_ms', before[phase]['p50_ms'], summary[phase]['p50_ms'])
+                 for phase in ('cold', 'warm_miss', 'warm_hit')]
+        for metric, a, b in rows:
+            change = (b / a - 1) * 100 if a else float('nan')
+            print(f'{name:<10}{metric:<18}{a:>10.1f}{b:>10.1f}{change:>+9.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3, help='warm invocations per phase')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS))
+    parser.add_argument('--fixtures', default=FIXTURES)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the FMP stub waits per request')
+    parser.add_argument('--output', help='results file (default benchmarks/results/handler-<commit>.json)')
+    parser.add_argument('--record', action='store_true', help='record FMP fixtures and exit')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        config = json.loads(args.child)
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                result = run_child(config)
+            finally:
+                sys.stdout = stdout
+        print(json.dumps(result))
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    symbols = sorted(set(BATCH + ['SPY']))
+    if args.record:
+        record_fixtures(args.fixtures, symbols)
+        return
+
+    from tests.stubs import DiscordStub, FmpStub
+    payloads = load_fixtures(args.fixtures, symbols)
+    last_date = max(row['date'] for row in payloads['SPY']['historical'])
+    from_date = (datetime.date.fromisoformat(last_date) -
+                 datetime.timedelta(days=365)).isoformat()
+
+    results = {'commit': git_commit(),
+               'recorded_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+               'python': platform.python_version(), 'platform': platform.platform(),
+               'cpus': os.cpu_count(), 'runs': args.runs, 'fmp_latency_s': args.latency,
+               'fixtures': sorted(os.path.basename(p) for p in glob.glob(os.path.join(args.fixtures, '*.json'))),
+               'scenarios': {}}
+    with FmpStub(payloads, delay=args.latency) as fmp, DiscordStub() as discord:
+        for name in args.scenario or list(SCENARIOS):
+            child = spawn(SCENARIOS[name], from_date, args.runs, fmp.url, discord.url)
+            results['scenarios'][name] = summarize(SCENARIOS[name], child)
+
+    output = args.output or os.path.join(RESULTS, f'handler-{results["commit"]}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print('results written to', os.path.relpath(output, ROOT))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Cold-start import cost of the chart handler, per top-level module.
+
+Each run starts a fresh interpreter with `-X importtime`, imports the handler
+the way the Lambda runtime does, and sums the self time of every module by
+top-level package (pandas, botocore, ...). What the first render adds on top
+(mplfinance, matplotlib) is listed separately, so a change that moves those
+into the init phase stands out.
+
+    python -m benchmarks.bench_imports --runs 5
+    python -m benchmarks.bench_imports --max-ms 1500   # exit 1 over budget
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HANDLER_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'lambda_handlers')
+
+HANDLER_IMPORT = "import importlib; importlib.import_module('candlestick-maker')"
+LAZY_IMPORT = HANDLER_IMPORT + \
+    "; from utils.mpl_utils import load_mplfinance; load_mplfinance()"
+
+
+def import_times(code):
+    # {top-level package: self microseconds} for one fresh interpreter
+    env = dict(os.environ, CHART_STORE_DIR=os.environ.get(
+        'CHART_STORE_DIR', '/tmp/ss-charting-bot-bench'))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=HANDLER_DIR, env=env, capture_output=True,
+                            text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        if package == 'utils':
+            package = name.strip()
+        times[package] = times.get(package, 0) + int(self_us)
+    return times
+
+
+def median_times(code, runs):
+    samples = [import_times(code) for _ in range(runs)]
+    names = set().union(*samples)
+    return {name: statistics.median(s.get(name, 0) for s in samples) / 1000
+            for name in names}
+
+
+def report(title, times, top):
+    print(title)
+    rows = sorted(times.items(), key=lambda item: -item[1])
+    for name, ms in rows[:top]:
+        print(f'  {name:<40}{ms:>10.1f} ms')
+    total = sum(times.values())
+    print(f'  {"total":<40}{total:>10.1f} ms')
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-ms', type=float,
+                        help='fail if the handler init imports exceed this')
+    args = parser.parse_args()
+
+    init = median_times(HANDLER_IMPORT, args.runs)
+    first_render = median_times(LAZY_IMPORT, args.runs)
+    init_total = report('handler init (module import)', init, args.top)
+    report('added by the first render (lazy imports)',
+           {name: ms - init.get(name, 0) for name, ms in first_render.items()
+            if ms - init.get(name, 0) > 0.5}, args.top)
+
+    if args.max_ms is not None and init_total > args.max_ms:
+        print(f'handler init imports took {init_total:.1f} ms, '
+              f'budget is {args.max_ms:.1f} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
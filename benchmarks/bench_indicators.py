@@ -0,0 +1,72 @@
+"""Indicator time: the legacy per-request pandas pass vs the indicator engine.
+
+`legacy` recomputes every indicator over the whole history on each request,
+as the handler used to; `full` is the engine without saved state and
+`incremental` resumes from the state of the previous day's run, which is what
+a warm container pays for a repeat request.
+
+    python -m benchmarks.bench_indicators --years 20 --runs 10
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from utils.indicator_utils import IndicatorEngine, calculate_adrp
+from utils.parse_utils import parse_closes, parse_ohlcv
+from tests.stubs import make_historical
+
+
+def sample_frame(years):
+    days = int(years * 365)
+    end = datetime.date(2024, 5, 10)
+    df = parse_ohlcv(make_historical('BENCH', days=days, seed=1, end=end)['historical'])
+    spy_df = parse_closes(make_historical('SPY', days=days, seed=2, end=end)['historical'],
+                          'SPY Close')
+    return df.join(spy_df, how='inner')
+
+
+def legacy(frame):
+    # The handler's original per-request indicator code
+    df = frame.copy()
+    df['50 SMA'] = df['Close'].rolling(window=50).mean()
+    df['10 EMA'] = df['Close'].ewm(span=10, adjust=False).mean()
+    df['21 EMA'] = df['Close'].ewm(span=21, adjust=False).mean()
+    df['RS Ratio'] = df['Close'] / df['SPY Close']
+    calculate_adrp(df, 20)
+    return df
+
+
+def time_runs(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=float, default=20)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    frame = sample_frame(args.years)
+    engine = IndicatorEngine()
+    _, yesterday = engine.run(frame.iloc[:-1])
+
+    cases = (
+        ('legacy', lambda: legacy(frame)),
+        ('full', lambda: engine.run(frame)),
+        ('incremental', lambda: engine.run(frame, yesterday)),
+    )
+    print(f'{len(frame)} bars, {len(engine.indicators)} indicators')
+    print(f'{"path":<14}{"p50 ms":>10}{"min ms":>10}')
+    for name, fn in cases:
+        samples = time_runs(fn, args.runs)
+        print(f'{name:<14}{statistics.median(samples):>10.2f}{min(samples):>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
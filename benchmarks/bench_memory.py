@@ -0,0 +1,125 @@
+"""Peak memory of the chart data path for 1y, 5y and 1-minute intraday input.
+
+Each case runs in a fresh interpreter. It imports the handler's modules and
+matplotlib first, so the baseline RSS is what a warm container already
+holds, then pushes one ticker plus SPY through the handler's path: JSON
+decode, parse, OHLCV store round trip, the SPY join, indicators, chart data,
+template render and PNG encode. Reported per case:
+
+  bars       rows in the ticker frame
+  frame KiB  the joined frame's own memory
+  data KiB   tracemalloc peak from JSON decode through chart data
+  peak MiB   peak RSS over the baseline, render and encode included
+
+--dtype float32 parses prices as float32, for comparison with the float64
+columns the handler uses.
+
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --dtype float32 --intraday-days 60
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+END = datetime.date(2024, 5, 10)
+
+CASES = ('1y', '5y', 'intraday')
+
+
+def rss_mib(field):
+    # VmRSS (current) or VmHWM (peak) from /proc, in MiB
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def payloads(case, intraday_days):
+    from tests.stubs import make_historical, make_intraday
+    if case == 'intraday':
+        return (make_intraday('BENCH', days=intraday_days, end=END),
+                make_intraday('SPY', days=intraday_days, end=END))
+    days = 365 * (5 if case == '5y' else 1)
+    return (make_historical('BENCH', days=days, end=END)['historical'],
+            make_historical('SPY', days=days, end=END)['historical'])
+
+
+def run_child(case, dtype, intraday_days):
+    import gc
+    import tracemalloc
+
+    import numpy as np
+
+    from utils import ohlcv_store, parse_utils
+    from utils.blob_store import MemoryBlobStore
+    from utils.chart_template import ChartTemplate, prepare_chart_data
+    from utils.image_utils import encode_figure
+    from utils.indicator_utils import IndicatorEngine
+    from utils.mpl_utils import load_mplfinance
+
+    parse_utils.PRICE_DTYPE = ohlcv_store.PRICE_DTYPE = getattr(np, dtype)
+    load_mplfinance()
+    # The JSON text stands in for the HTTP body the handler receives
+    ticker_rows, spy_rows = payloads(case, intraday_days)
+    ticker_body, spy_body = json.dumps(ticker_rows), json.dumps(spy_rows)
+    del ticker_rows, spy_rows
+    gc.collect()
+    baseline = rss_mib('VmRSS')
+
+    tracemalloc.start()
+    store = ohlcv_store.OhlcvStore(MemoryBlobStore(), None)
+    df = parse_utils.parse_ohlcv(json.loads(ticker_body))
+    spy_df = parse_utils.parse_closes(json.loads(spy_body), 'SPY Close')
+    store.save('BENCH', df, '2000-01-01')
+    df, _ = store.load('BENCH')
+    frame = df.join(spy_df, how='inner')
+    indicators, _ = IndicatorEngine().run(frame)
+    chart_data = prepare_chart_data(frame, indicators)
+    _, data_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    encode_figure(ChartTemplate().render(chart_data))
+    return {'bars': len(df),
+            'frame_kib': frame.memory_usage(deep=True).sum() / 1024,
+            'data_kib': data_peak / 1024,
+            'baseline_mib': baseline,
+            'peak_mib': rss_mib('VmHWM') - baseline}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--case', action='append', choices=CASES)
+    parser.add_argument('--dtype', choices=('float32', 'float64'), default='float64')
+    parser.add_argument('--intraday-days', type=int, default=30)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.dtype, args.intraday_days)))
+        return
+
+    env = dict(os.environ, CHART_STORE_DIR='/tmp/ss-charting-bot-bench',
+               PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, 'lambda_handlers')]))
+    print(f'prices as {args.dtype}')
+    print(f'{"case":<10}{"bars":>8}{"frame KiB":>12}{"data KiB":>12}'
+          f'{"base MiB":>10}{"peak MiB":>10}')
+    for case in args.case or CASES:
+        result = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_memory', '--child', case,
+             '--dtype', args.dtype, '--intraday-days', str(args.intraday_days)],
+            cwd=ROOT, env=env, capture_output=True, text=True)
+        if result.returncode:
+            sys.stderr.write(result.stderr)
+            sys.exit(1)
+        row = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f'{case:<10}{row["bars"]:>8}{row["frame_kib"]:>12.1f}{row["data_kib"]:>12.1f}'
+              f'{row["baseline_mib"]:>10.1f}{row["peak_mib"]:>+10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Columnar parse_ohlcv vs the old per-row list comprehensions.
+
+    python -m benchmarks.bench_parse --years 1 5 10 20
+"""
+import argparse
+import timeit
+
+from utils.parse_utils import parse_ohlcv
+from tests.stubs import make_historical
+from tests.unit.test_parse_utils import legacy_parse
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"years":>6}{"bars":>8}{"legacy ms":>12}{"columnar ms":>14}{"speedup":>9}')
+    for years in args.years:
+        historical = make_historical('BENCH', days=365 * years)['historical']
+        timings = []
+        for fn in (legacy_parse, parse_ohlcv):
+            best = min(timeit.repeat(lambda: fn(historical),
+                                     number=args.number, repeat=5))
+            timings.append(best / args.number * 1000)
+        print(f'{years:>6}{len(historical):>8}{timings[0]:>12.2f}'
+              f'{timings[1]:>14.2f}{timings[0] / timings[1]:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
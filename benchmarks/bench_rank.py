@@ -0,0 +1,85 @@
+"""Universe size against wall time for the /rank scan.
+
+Synthetic tickers (a year and a half of daily bars each) are saved to an
+in-memory OHLCV store, then ranked the way rs_rank does it: load every
+archive, align all tickers to SPY's dates and rank in one pass. For
+comparison, --loop also times the per-ticker way, a frame join and the
+chart's indicator engine per ticker, on universes up to --loop-max.
+
+    python -m benchmarks.bench_rank --sizes 100 1000 3000
+    python -m benchmarks.bench_rank --sizes 500 --loop
+"""
+import argparse
+import datetime
+import time
+
+from utils.blob_store import MemoryBlobStore
+from utils.indicator_utils import IndicatorEngine
+from utils.ohlcv_store import OhlcvStore
+from utils.parse_utils import parse_closes, parse_ohlcv
+from utils.rs_ranking import align_universe, load_universe, rank_universe, rank_window
+from tests.stubs import make_historical
+
+END = datetime.date(2024, 5, 10)
+DAYS = 550
+
+
+def build_store(size):
+    store = OhlcvStore(MemoryBlobStore(), None)
+    for i in range(size):
+        df = parse_ohlcv(make_historical(f'T{i}', days=DAYS, end=END)['historical'])
+        store.save(f'T{i}', df, '2000-01-01')
+    return store
+
+
+def rank_loop(store, symbols, spy_df):
+    # The per-ticker way: one frame join and indicator run per ticker
+    engine = IndicatorEngine()
+    scores = {}
+    for symbol in symbols:
+        df, _ = store.load(symbol)
+        frame = df.join(spy_df, how='inner')
+        indicators, _ = engine.run(frame)
+        rs = indicators['rs']
+        scores[symbol] = rs.iloc[-1] / rs.iloc[-64] - 1
+    return sorted(scores, key=scores.get, reverse=True)[:25]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 1000, 3000])
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--loop', action='store_true', help='also time the per-ticker loop')
+    parser.add_argument('--loop-max', type=int, default=1000)
+    args = parser.parse_args()
+
+    spy_df = parse_closes(make_historical('SPY', days=DAYS, end=END)['historical'], 'SPY Close')
+    spy_df = spy_df.iloc[-rank_window():]
+    dates, benchmark = spy_df.index.values, spy_df['SPY Close'].to_numpy()
+
+    print(f'{"tickers":>8}{"load ms":>10}{"align ms":>10}{"rank ms":>10}{"total ms":>10}'
+          f'{"loop ms":>10}')
+    for size in args.sizes:
+        store = build_store(size)
+        symbols = store.tickers()
+
+        started = time.perf_counter()
+        universe = load_universe(store, symbols, args.workers)
+        loaded = time.perf_counter()
+        aligned = align_universe(universe, dates)
+        aligned_at = time.perf_counter()
+        rank_universe(*aligned, benchmark)
+        finished = time.perf_counter()
+
+        loop_ms = float('nan')
+        if args.loop and size <= args.loop_max:
+            loop_started = time.perf_counter()
+            rank_loop(store, symbols, spy_df)
+            loop_ms = (time.perf_counter() - loop_started) * 1000
+        print(f'{size:>8}{(loaded - started) * 1000:>10.1f}{(aligned_at - loaded) * 1000:>10.1f}'
+              f'{(finished - aligned_at) * 1000:>10.1f}{(finished - started) * 1000:>10.1f}'
+              f'{loop_ms:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Render time of the reusable chart template vs a full mpf.plot.
+
+Both paths draw the same 120-bar input and encode it to PNG, which is what a
+chart request pays for on a warm container.
+
+    python -m benchmarks.bench_render --runs 10
+"""
+import argparse
+import statistics
+import time
+from io import BytesIO
+
+from utils.chart_template import ChartTemplatePool, prepare_chart_data, render_with_mplfinance
+from utils.indicator_utils import IndicatorEngine
+from utils.mpl_utils import load_pyplot
+from utils.parse_utils import parse_closes, parse_ohlcv
+from tests.stubs import make_historical
+
+
+def sample_chart_data():
+    df = parse_ohlcv(make_historical('BENCH')['historical'])
+    spy_df = parse_closes(make_historical('SPY')['historical'], 'SPY Close')
+    frame = df.join(spy_df, how='inner')
+    indicators, _ = IndicatorEngine().run(frame)
+    return prepare_chart_data(frame, indicators)
+
+
+def render_mpf(chart_data):
+    fig = render_with_mplfinance(chart_data)
+    fig.savefig(BytesIO(), format='png')
+    load_pyplot().close(fig)
+
+
+def make_render_template():
+    pool = ChartTemplatePool()
+
+    def render_template(chart_data):
+        with pool.acquire() as template:
+            template.render(chart_data).savefig(BytesIO(), format='png')
+    return render_template
+
+
+def time_runs(fn, chart_data, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(chart_data)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    chart_data = sample_chart_data()
+
+    print(f'{"renderer":<10}{"first ms":>10}{"p50 ms":>10}{"min ms":>10}')
+    for name, fn in (('mpf.plot', render_mpf), ('template', make_render_template())):
+        first = time_runs(fn, chart_data, 1)[0]
+        samples = time_runs(fn, chart_data, args.runs)
+        print(f'{name:<10}{first:>10.1f}{statistics.median(samples):>10.1f}'
+              f'{min(samples):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
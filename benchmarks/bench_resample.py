@@ -0,0 +1,45 @@
+"""Weekly/monthly bars: reduceat resample vs pandas resample().agg().
+
+Both start from the joined daily frame (ticker OHLCV plus the SPY close)
+the handler builds; the full chart_frame path (join, trim, resample) is
+timed too.
+
+    python -m benchmarks.bench_resample --years 1 5 20
+"""
+import argparse
+import timeit
+
+from utils.parse_utils import parse_closes, parse_ohlcv
+from utils.timeframes import AGGREGATIONS, chart_frame, resample
+from tests.stubs import make_historical
+
+RULES = {'week': 'W-SUN', 'month': 'ME'}
+TIMEFRAME = {'week': 'weekly', 'month': 'monthly'}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+
+    def best_ms(fn):
+        return min(timeit.repeat(fn, number=args.number, repeat=5)) / args.number * 1000
+
+    print(f'{"years":>6}{"period":>8}{"bars":>7}{"pandas ms":>11}{"reduceat ms":>13}'
+          f'{"speedup":>9}{"chart_frame ms":>16}')
+    for years in args.years:
+        df = parse_ohlcv(make_historical('BENCH', days=365 * years)['historical'])
+        spy_df = parse_closes(make_historical('SPY', days=365 * years)['historical'], 'SPY Close')
+        frame = df.join(spy_df, how='inner')
+        for period, rule in RULES.items():
+            bars = len(resample(frame, period))
+            pandas_ms = best_ms(lambda: frame.resample(rule).agg(AGGREGATIONS).dropna())
+            reduceat_ms = best_ms(lambda: resample(frame, period))
+            chart_ms = best_ms(lambda: chart_frame(df, spy_df, TIMEFRAME[period]))
+            print(f'{years:>6}{period:>8}{bars:>7}{pandas_ms:>11.3f}{reduceat_ms:>13.3f}'
+                  f'{pandas_ms / reduceat_ms:>8.1f}x{chart_ms:>16.3f}')
+
+
+if __name__ == '__main__':
+    main()
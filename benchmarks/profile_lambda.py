@@ -0,0 +1,207 @@
+"""Chart handler latency and peak RSS per Lambda memory size, and the profile
+the stack deploys from.
+
+Lambda allocates CPU in proportion to memory: one vCPU at 1769 MB, up to six
+at 10240 MB. For each candidate size, the bench_handler child (a fresh
+interpreter running the handler's fetch, render, encode and upload path
+against local stubs) runs under that CPU share:
+  - It is pinned to as many cores as the share rounds up to.
+  - It is duty-cycled with SIGSTOP/SIGCONT down to the exact share, the way
+    a CFS quota throttles a container.
+The memory limit is simulated by checking the child's peak RSS against the
+size, with headroom. No rlimit is set, because address-space limits do not
+track RSS for numpy and matplotlib.
+
+Per size it reports
+  - cold, and warm p50/p95 for invocations that render (chart cache cleared)
+  - peak RSS
+  - the compute cost of a million warm renders
+The chosen configuration is written to lambda_profile.json. The choice is
+the cheapest size whose warm p95 meets --target-p95-ms, or the fastest if
+none does, among sizes whose peak RSS fits.
+SsChartingBotStack reads lambda_profile.json for the chart handler's memory
+size and timeout, its provisioned concurrency, and every function's runtime
+and architecture.
+
+    python -m benchmarks.profile_lambda --runs 10
+    python -m benchmarks.profile_lambda --memory 1024 1769 3008 --target-p95-ms 800 \\
+        --runtime python3.12 --arm64 --provisioned-concurrency 2
+
+The child runs on this machine's CPU and Python; results carry the platform,
+so an arm64 choice should be confirmed on arm64 hardware.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.metrics_utils import percentile
+from benchmarks.bench_handler import (BATCH, FIXTURES, ROOT, SCENARIOS, child_process, child_result,
+                                      git_commit, load_fixtures)
+
+PROFILE = os.path.join(ROOT, 'lambda_profile.json')
+
+MEMORY_SIZES = (512, 1024, 1769, 2048, 3008)
+# Memory at which Lambda allocates one full vCPU, and the most it allocates
+FULL_VCPU_MB = 1769
+MAX_VCPUS = 6
+# Peak RSS may use this much of the memory size; the rest covers the
+# runtime and allocation spikes the samples missed
+MEMORY_HEADROOM = 0.85
+# USD per GB-second (us-east-1)
+GB_SECOND_PRICE = {'x86_64': 0.0000166667, 'arm64': 0.0000133334}
+RUNTIMES = ('python3.8', 'python3.9', 'python3.10', 'python3.11', 'python3.12')
+DEFAULT_TIMEOUT_S = 30
+
+
+def cpu_share(memory_mb):
+    return min(memory_mb / FULL_VCPU_MB, MAX_VCPUS)
+
+
+@contextmanager
+def throttled(pid, duty, period=0.02):
+    # Lets `pid` run for `duty` of every `period` seconds
+    if duty >= 0.999:
+        yield
+        return
+    done = threading.Event()
+
+    def cycle():
+        while not done.is_set():
+            try:
+                time.sleep(period * duty)
+                os.kill(pid, signal.SIGSTOP)
+                time.sleep(period * (1 - duty))
+                os.kill(pid, signal.SIGCONT)
+            except ProcessLookupError:
+                return
+
+    thread = threading.Thread(target=cycle, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+        try:
+            os.kill(pid, signal.SIGCONT)
+        except ProcessLookupError:
+            pass
+
+
+def profile_size(memory_mb, config, fmp_url, discord_url):
+    share = cpu_share(memory_mb)
+    cpus = min(math.ceil(share), os.cpu_count() or 1)
+    duty = min(share / cpus, 1.0)
+    pin = (lambda: os.sched_setaffinity(0, range(cpus))) \
+        if hasattr(os, 'sched_setaffinity') else None
+
+    process = child_process(config, fmp_url, discord_url, preexec_fn=pin)
+    with throttled(process.pid, duty):
+        child = child_result(process)
+
+    warm = [run['ms'] for run in child['runs']['warm_miss']]
+    return {
+        'memory_mb': memory_mb,
+        'cpu_share': round(share, 3),
+        'init_ms': round(child['init_ms'], 1),
+        'cold_ms': round(child['runs']['cold'][0]['ms'], 1),
+        'warm_p50_ms': round(percentile(warm, 50), 1),
+        'warm_p95_ms': round(percentile(warm, 95), 1),
+        'peak_rss_mib': round(child['peak_rss_mib'], 1),
+        'fits': child['peak_rss_mib'] <= memory_mb * MEMORY_HEADROOM,
+    }
+
+
+def choose(candidates, target_p95_ms, architecture):
+    # Cheapest fitting size meeting the target, else the fastest fitting one
+    price = GB_SECOND_PRICE[architecture]
+    for candidate in candidates:
+        candidate['usd_per_1m'] = round(
+            candidate['memory_mb'] / 1024 * candidate['warm_p50_ms'] / 1000 * price * 1e6, 2)
+    fitting = [candidate for candidate in candidates if candidate['fits']]
+    if not fitting:
+        raise RuntimeError('no candidate memory size fits the peak RSS')
+    meeting = [candidate for candidate in fitting if candidate['warm_p95_ms'] <= target_p95_ms]
+    if meeting:
+        return min(meeting, key=lambda candidate: (candidate['usd_per_1m'], candidate['memory_mb']))
+    return min(fitting, key=lambda candidate: candidate['warm_p95_ms'])
+
+
+def print_candidates(candidates, chosen):
+    print(f'{"memory":>7}{"vcpu":>7}{"init ms":>9}{"cold ms":>9}{"p50 ms":>9}{"p95 ms":>9}'
+          f'{"rss MiB":>9}{"$/1M":>8}')
+    for candidate in candidates:
+        note = ' <- chosen' if candidate is chosen else '' if candidate['fits'] else ' (too small)'
+        print(f'{candidate["memory_mb"]:>7}{candidate["cpu_share"]:>7.2f}'
+              f'{candidate["init_ms"]:>9.1f}{candidate["cold_ms"]:>9.1f}'
+              f'{candidate["warm_p50_ms"]:>9.1f}{candidate["warm_p95_ms"]:>9.1f}'
+              f'{candidate["peak_rss_mib"]:>9.1f}{candidate["usd_per_1m"]:>8.2f}{note}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--memory', type=int, nargs='+', default=list(MEMORY_SIZES))
+    parser.add_argument('--runs', type=int, default=10, help='warm invocations per size')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='single')
+    parser.add_argument('--target-p95-ms', type=float, default=1000.0)
+    parser.add_argument('--runtime', choices=RUNTIMES, default='python3.8')
+    parser.add_argument('--arm64', action='store_true')
+    parser.add_argument('--provisioned-concurrency', type=int, default=0)
+    parser.add_argument('--fixtures', default=FIXTURES)
+    parser.add_argument('--output', default=PROFILE)
+    args = parser.parse_args()
+    architecture = 'arm64' if args.arm64 else 'x86_64'
+
+    from tests.stubs import DiscordStub, FmpStub
+    payloads = load_fixtures(args.fixtures, sorted(set(BATCH + ['SPY'])))
+    last_date = max(row['date'] for row in payloads['SPY']['historical'])
+    config = {'symbols': SCENARIOS[args.scenario], 'runs': args.runs,
+              'from_date': (datetime.date.fromisoformat(last_date) -
+                            datetime.timedelta(days=365)).isoformat()}
+
+    candidates = []
+    with FmpStub(payloads) as fmp, DiscordStub() as discord:
+        for memory_mb in sorted(args.memory):
+            print(f'profiling {memory_mb} MB ...', flush=True)
+            if cpu_share(memory_mb) > (os.cpu_count() or 1):
+                print(f'  only {os.cpu_count()} cpus here, {memory_mb} MB gets '
+                      f'{cpu_share(memory_mb):.2f} on Lambda; its latency is overstated')
+            candidates.append(profile_size(memory_mb, config, fmp.url, discord.url))
+    chosen = choose(candidates, args.target_p95_ms, architecture)
+
+    profile = {
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'commit': git_commit(),
+        'measured_on': {'python': platform.python_version(), 'machine': platform.machine(),
+                        'cpus': os.cpu_count()},
+        'scenario': args.scenario,
+        'runs': args.runs,
+        'target_p95_ms': args.target_p95_ms,
+        'candidates': candidates,
+        'chart_handler': {
+            'memory_size': chosen['memory_mb'],
+            # Three times the cold invocation at this size,
+            # never below the old fixed timeout
+            'timeout_s': max(DEFAULT_TIMEOUT_S, math.ceil(chosen['cold_ms'] * 3 / 1000)),
+            'runtime': args.runtime,
+            'architecture': architecture,
+            'provisioned_concurrency': args.provisioned_concurrency,
+        },
+    }
+    with open(args.output, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+    print_candidates(candidates, chosen)
+    print('chart handler:', json.dumps(profile['chart_handler']))
+    print('profile written to', os.path.relpath(args.output, ROOT))
+
+
+if __name__ == '__main__':
+    main()
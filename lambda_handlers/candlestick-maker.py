@@ -1,227 +1,475 @@
 
-import boto3
-import matplotlib.pyplot as plt
 import os
-import requests
-import pandas as pd
-import mplfinance as mpf
 import json
-from io import BytesIO
-import uuid
-import matplotlib
-import datetime
-
-from utils.indicator_utils import calculate_adrp, calculate_change_last_two_prices
-matplotlib.use('Agg')
-
-
-base_url = 'https://financialmodelingprep.com/api/v3'
-api_key = os.environ.get('FMP_API_KEY')
-bucket_name = os.environ.get('CHART_BUCKET')
-s3 = boto3.client('s3')
-
-
-def make_candlestick_chart(ticker_df, spy_df, ema_10_df, ema_21_df, sma_50_df):
-
-    # Merge ticker DataFrame with SPY DataFrame on Date
-    merged_df = ticker_df.merge(spy_df, on='Date', how='inner')
-    merged_df['RS Ratio'] = merged_df['Close'] / merged_df['SPY Close']
-
-    # Slice the DataFrame for the last 120 days
-    df_last_120_days = merged_df.iloc[-120:]
-
-    # Calculate ylim with padding
-    ylim_min = df_last_120_days[['Low', 'Close']].min(
-    ).min() * 0.95  # 5% below the lowest low or close
-    ylim_max = df_last_120_days[['High', 'Close']].max(
-    ).max() * 1.05  # 5% above the highest high or close
-
-    mystyle = mpf.make_mpf_style(
-        base_mpf_style='yahoo', rc={'font.size': 8, 'figure.facecolor': '#fafafa', "axes.edgecolor": "#a1a1aa", },
-        gridcolor="#e4e4e7"
-    )
-
-    mc = mpf.make_marketcolors(up='#FFFFFF', down='#000000',
-                               edge={'up': '#000000', 'down': '#000000'},
-                               wick={'up': '#000000', 'down': '#000000'},
-                               volume={'up': '#a1a1aa', 'down': '#d4d4d8'},
-                               ohlc='black')
-
-    s = mpf.make_mpf_style(marketcolors=mc)
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.indicator_utils import (IndicatorEngine, IndicatorStates, calculate_adrp,
+                                   calculate_change_from_previous_session, calculate_change_last_two_prices)
+from utils.fetch_utils import fetch_concurrently, default_from_date, pool_size
+from utils.fmp_client import make_fmp_client
+from utils.benchmark_cache import make_benchmark_cache
+from utils.ohlcv_store import make_ohlcv_store
+from utils.chart_cache import make_chart_cache, chart_cache_key, compare_cache_key
+from utils.blob_store import get_s3_client
+from utils.parse_utils import parse_benchmark, parse_closes, parse_ohlcv
+from utils.timeframes import DAILY_TIMEFRAMES, TIMEFRAMES, make_chart_frame, timeframe_name
+from utils.mpl_utils import load_pyplot
+from utils.chart_template import ChartTemplatePool, prepare_chart_data, render_with_mplfinance
+from utils.compare_grid import MAX_PANELS, CompareTemplate, prepare_compare_data
+from utils.image_utils import encode_figure, output_config_from_env
+from utils.request_stats import make_request_stats
+from utils.metrics_utils import count, current, mark, stage, start_invocation
+from utils.discord_utils import (MAX_EMBEDS, edit_message, message_id, post_message,
+                                 send_embeds_to_discord)
+
+
+# Rate limited, batching FMP client shared by every fetch in the container
+fmp_client = make_fmp_client()
+# Module level so the in-process tier survives warm invocations. SPY is
+# parsed once per close and kept as a compact frame.
+benchmark_cache = make_benchmark_cache(fmp_client.historical, transform=parse_benchmark)
+ohlcv_store = make_ohlcv_store(fmp_client.historical)
+chart_cache = make_chart_cache()
+# One engine per timeframe; states are kept per (symbol, timeframe), for
+# the CHART_INDICATOR_STATES most recently charted
+indicator_engines = {name: IndicatorEngine(spec['indicators']) for name, spec in TIMEFRAMES.items()}
+indicator_states = IndicatorStates(int(os.environ.get('CHART_INDICATOR_STATES', '1000')))
+# Feeds the pre-render job's most-requested list
+request_stats = make_request_stats()
+
+# Creating a boto3 client loads the service model; do it once, during the
+# init phase, instead of on the first request
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') and not os.environ.get('CHART_STORE_DIR'):
+    get_s3_client()
+
+# Batch mode: most symbols per invocation and concurrent chart renders
+batch_limit = int(os.environ.get('CHART_BATCH_LIMIT', '25'))
+render_workers = int(os.environ.get('CHART_RENDER_WORKERS', '2'))
+render_lock = threading.Lock()
+
+# 'template' redraws reusable figures; 'mpf' is the original full mpf.plot
+chart_renderer = os.environ.get('CHART_RENDERER', 'template')
+chart_templates = ChartTemplatePool()
+# /compare grids, one template per panel count
+compare_templates = ChartTemplatePool(CompareTemplate)
+
+# CHART_FORMAT / CHART_QUALITY / CHART_PNG_* select the image encoding
+output_config = output_config_from_env()
+
+# Seconds a chart needs to render, upload and reach Discord; waiting on
+# another invocation's render stops early enough to leave this much
+render_reserve = float(os.environ.get('CHART_RENDER_RESERVE', '8'))
+# Monotonic time the current invocation times out, when Lambda says
+invocation_deadline = None
+
+# Post the price fields first and edit the chart in once it is uploaded;
+# 0 sends each message once, after every chart is ready
+deferred_response = os.environ.get('CHART_DEFERRED_RESPONSE', '1') != '0'
+
+
+def make_candlestick_chart(frame, indicators, chart_key, timeframe='daily'):
+
+    spec = TIMEFRAMES[timeframe]
+    chart_data = prepare_chart_data(frame, indicators, moving_averages=spec['moving_averages'],
+                                    date_format=spec['date_format'])
     print('plotting')
 
-    fig, axlist = mpf.plot(df_last_120_days, type='candle', volume=True, ylabel_lower='Volume', style=mystyle,
-                           addplot=[
-                               mpf.make_addplot(
-                                   sma_50_df[-120:], color='#cb4b16', label='50 SMA',  width=.5, panel=1),
-                               mpf.make_addplot(
-                                   ema_10_df[-120:], color='#839496', label='10 EMA', width=.5, panel=1),
-                               mpf.make_addplot(
-                                   ema_21_df[-120:], color='#268bd2', label='21 EMA',  width=.5, panel=1),
-                               mpf.make_addplot(
-                                   df_last_120_days['RS Ratio'], color='#000', label='RS Line', width=1, panel=0),
-                           ],
-                           # figscale=1.10,
-                           xlim=(df_last_120_days.index.min(
-                           ), df_last_120_days.index.max() + datetime.timedelta(days=5)),
-                           ylim=(ylim_min, ylim_max),
-                           figsize=(15, 10),
-                           panel_ratios=(.2, 1, .2),
-                           scale_padding={
-                               'left': 0.5, 'top': 4, 'right': 3, 'bottom': 1},
-                           xrotation=32,
-                           returnfig=True,
-                           scale_width_adjustment=dict(volume=0.75),
-                           tight_layout=True,
-                           volume_panel=2,
-                           main_panel=1)
-
-    # axlist[0].legend(bbox_to_anchor=(0., 1.02, 1., .102), loc='lower left',
-    #                 ncols=3, mode="expand", borderaxespad=0.)
-    axlist[0].legend(loc='upper left', borderaxespad=1)
-    axlist[2].legend(loc='upper left', borderaxespad=1)
-    # fig.savefig('fig.png', bbox_inches='tight')
-
-    return upload_to_s3_and_return_link(fig)
-
-
-def upload_to_s3_and_return_link(fig):
-    # Convert the figure to a bytes buffer
-    print('saving figure')
-    buf = BytesIO()
-    fig.savefig(buf, format='png')
-    buf.seek(0)
-
-    filename = 'charts/' + str(uuid.uuid4()) + '.png'
-
+    if chart_renderer == 'mpf':
+        # pyplot's figure registry is global, so figures are built one at a time
+        with render_lock, stage('render'):
+            fig = render_with_mplfinance(chart_data)
+        try:
+            with stage('encode'):
+                buf, content_type = encode_figure(fig, **output_config)
+        finally:
+            # Release the figure, warm containers would otherwise keep every one
+            with render_lock:
+                load_pyplot().close(fig)
+    else:
+        # Reuses a pre-laid-out figure; held until the image has been encoded
+        with chart_templates.acquire(spec['moving_averages']) as template:
+            # 'render' only swaps artist data; the Agg draw itself happens
+            # while saving, so it is counted under 'encode'
+            with stage('render'):
+                fig = template.render(chart_data)
+            with stage('encode'):
+                buf, content_type = encode_figure(fig, **output_config)
+
+    return upload_to_s3_and_return_link(buf, chart_key, content_type)
+
+
+def make_compare_chart(compare_data, chart_key):
+    # Every panel in one figure: one render, one encode, one upload
+    with compare_templates.acquire(len(compare_data['panels'])) as template:
+        with stage('render'):
+            fig = template.render(compare_data)
+        with stage('encode'):
+            buf, content_type = encode_figure(fig, **output_config)
+        panel_ms = template.panel_ms()
+
+    # Each panel's data swap plus its share of the Agg draw
+    for ms in panel_ms.values():
+        current().record('compare_panel', ms)
+    current().set('panel_render_ms', panel_ms)
+    print('compare panels (ms):', panel_ms)
+    return upload_to_s3_and_return_link(buf, chart_key, content_type)
+
+
+def upload_to_s3_and_return_link(buf, filename, content_type):
     print(filename)
 
-    bucket = boto3.resource('s3').Bucket(bucket_name)
-    bucket.put_object(Body=buf, ContentType='image/png', Key=filename)
-
-    # generate presigned url
-    url = s3.generate_presigned_url('get_object',
-                                    Params={'Bucket': bucket_name,
-                                            'Key': filename},
-                                    ExpiresIn=86400)
-
-    # Generate the HTTP link to the uploaded image
-    # s3_link = s3.generate_presigned_url(
-    #    'get_object', Params={'Bucket': bucket_name, 'Key': filename}, ExpiresIn=3600)
+    # The encoded buffer is streamed to the shared S3 client as is. Stored
+    # under its cache key, so the next request for the same chart only needs
+    # a presign
+    url = chart_cache.put(filename, buf, content_type=content_type)
 
     print(url)
     return url
 
 
-def fetch_data_from_api(ticker):
-    try:
-        one_year_ago_date = (datetime.datetime.now() -
-                             datetime.timedelta(days=365)).strftime('%Y-%m-%d')
-        url = f'{base_url}/historical-price-full/{ticker}?apikey={api_key}&from={one_year_ago_date}'
-        response = requests.get(url)
-        if response.status_code == 200:
-            # If the request was successful (status code 200),
-            # return the JSON data from the response
-            return response.json()
-        else:
-            # If the request was unsuccessful, raise an exception
-            response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        # Handle any errors that occurred during the request
-        print("Error fetching data:", e)
-        return None
-
-
-def handler(event, context):
-
-    discord_payload = event['Records'][0]['Sns']['Message']
-    payload_data = json.loads(discord_payload)
-
-    command_name = payload_data['data']['name']
-
-    # Extract the options
-    options = payload_data['data']['options']
-    appId = payload_data['application_id']
-    token = payload_data['token']
-
-    symbol_value = None
-
+def get_symbols(options):
+    # `symbol` holds one ticker, `symbols` a comma or space separated list
+    symbols = []
     for option in options:
-        if option['name'] == 'symbol':
-            symbol_value = option.get('value', None)
-            break  # Stop iterating if 'symbol' option is found
+        if option['name'] in ('symbol', 'symbols'):
+            value = option.get('value', None) or ''
+            symbols.extend(symbol.strip().upper()
+                           for symbol in value.replace(',', ' ').split())
+    return list(dict.fromkeys(symbols))[:batch_limit]
 
-    if symbol_value:
 
-        data = fetch_data_from_api(symbol_value)
-        spy_data = fetch_data_from_api('SPY')
+def get_timeframe(options):
+    for option in options:
+        if option['name'] == 'timeframe':
+            return timeframe_name(option.get('value'))
+    return timeframe_name(None)
+
+
+def parse_chart_requests(event):
+    # Every record in the SNS batch is its own Discord interaction
+    chart_requests = []
+    for record in event['Records']:
+        payload_data = json.loads(record['Sns']['Message'])
+        options = payload_data['data'].get('options', [])
+        symbols = get_symbols(options)
+        if not symbols:
+            continue
+        chart_request = {'app_id': payload_data['application_id'],
+                         'token': payload_data['token'],
+                         'symbols': symbols,
+                         'timeframe': get_timeframe(options)}
+        # /compare puts its symbols in one grid image instead of a chart each
+        if payload_data['data'].get('name') == 'compare':
+            chart_request['compare'] = True
+            chart_request['symbols'] = symbols[:MAX_PANELS]
+        chart_requests.append(chart_request)
+    return chart_requests
+
+
+def chart_keys(chart_request):
+    return [(symbol, chart_request['timeframe']) for symbol in chart_request['symbols']]
+
+
+def fetch_intraday_series(ticker, benchmark=False):
+    # Intraday bars change all session, so they are neither stored nor cached
+    spec = TIMEFRAMES['intraday']
+    payload = fmp_client.intraday(ticker, spec['interval'], default_from_date(spec['history_days']))
+    if payload is None:
+        return None
+    with stage('parse'):
+        if benchmark:
+            return parse_closes(payload['historical'], 'SPY Close')
+        return parse_ohlcv(payload['historical'])
+
+
+def fetch_chart_data(keys):
+    # `keys` are (symbol, timeframe) pairs. Weekly and monthly bars are
+    # resampled from the daily series, so each ticker's daily bars are
+    # fetched once, with the longest history any of its charts needs.
+    # Returns the series by (kind, ticker).
+    timeframes = {timeframe for _, timeframe in keys}
+    daily_days = max([TIMEFRAMES[timeframe]['history_days']
+                      for timeframe in timeframes if timeframe in DAILY_TIMEFRAMES] or [0])
+    from_date = default_from_date(daily_days) if daily_days else None
+
+    series = list(dict.fromkeys(
+        ('intraday' if timeframe == 'intraday' else 'ticker', symbol) for symbol, timeframe in keys))
+    if from_date is not None:
+        series.append(('benchmark', 'SPY'))
+    if 'intraday' in timeframes:
+        series.append(('intraday_benchmark', 'SPY'))
+
+    def fetch_series(key):
+        # SPY is the same for every chart, so it comes from the cache;
+        # the tickers' bars come from the store, topped up from FMP. SPY can
+        # also be charted itself, so the benchmark has its own key.
+        kind, ticker = key
+        if kind == 'benchmark':
+            with stage('fetch_spy'):
+                return benchmark_cache.get(ticker, from_date)
+        if kind == 'intraday_benchmark':
+            with stage('fetch_spy'):
+                return fetch_intraday_series(ticker, benchmark=True)
+        with stage('fetch_ticker'):
+            if kind == 'intraday':
+                return fetch_intraday_series(ticker)
+            return ohlcv_store.update(ticker, from_date)
+
+    # All tickers and SPY are fetched in parallel over the shared session
+    results = fetch_concurrently(fetch_series, series,
+                                 max_workers=min(len(series), pool_size))
+    return dict(zip(series, results))
+
+
+def compute_indicators(key, frame):
+    # Picks up from this container's last run for the symbol and timeframe,
+    # so only bars that arrived since are computed
+    with stage('indicators'):
+        indicators, state = indicator_engines[key[1]].run(frame, indicator_states.get(key))
+        indicator_states.put(key, state)
+    return indicators
+
+
+def chart_series(series, symbol, timeframe):
+    # (ticker bars, SPY close) a chart of `symbol` is drawn from
+    if timeframe == 'intraday':
+        return series[('intraday', symbol)], series[('intraday_benchmark', 'SPY')]
+    return series[('ticker', symbol)], series[('benchmark', 'SPY')]
+
+
+def summarize_chart(symbol, timeframe, df, spy_df):
+    # Everything an embed needs except the image, plus a cached chart if
+    # one exists. Cheap next to rendering, so it is sent to Discord first.
+
+    # Everything below reads from `frame`. History is counted with this
+    # module's clock, which the benchmarks pin to their fixtures' last date.
+    frame = make_chart_frame(df, spy_df, timeframe, from_date_fn=default_from_date)
+    indicators = compute_indicators((symbol, timeframe), frame)
+
+    # Same ticker, bars and style means the chart already exists:
+    # skip plotting and uploading
+    chart_key = chart_cache_key(symbol, frame, spy_df, timeframe=timeframe, output=output_config)
+
+    # The embed fields are quotes: the day's change and the daily ADR%,
+    # whichever bars are charted
+    if timeframe == 'intraday':
+        abs_change, percent_change = calculate_change_from_previous_session(frame)
+        adr_p = None
+    elif timeframe == 'daily':
+        abs_change, percent_change = calculate_change_last_two_prices(frame)
+        adr_p = indicators['adrp_20'].iloc[-1]
+    else:
+        abs_change, percent_change = calculate_change_last_two_prices(df)
+        adr_p = calculate_adrp(df, 20)
 
-        if data:
-            ohlc_data = [(row['date'], row['open'], row['high'],
-                          row['low'], row['close']) for row in data['historical']]
-            volume_data = [row['volume'] for row in data['historical']]
+    return {
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'frame': frame,
+        'indicators': indicators,
+        'chart_key': chart_key,
+        'link': chart_cache.lookup(chart_key),
+        'fields': (frame['Close'].iloc[-1], abs_change, percent_change, adr_p),
+    }
 
-            spy_ohlc_data = [(row['date'], row['close'])
-                             for row in spy_data['historical']]
 
-            ohlc_data_reversed = ohlc_data[::-1]
-            volume_data_reversed = volume_data[::-1]
+def summarize_charts(keys, series):
+    charts = {}
+    inputs = {}
+    for symbol, timeframe in keys:
+        df, spy_df = chart_series(series, symbol, timeframe)
+        if df is not None and len(df) and spy_df is not None:
+            inputs[(symbol, timeframe)] = (df, spy_df)
+    summaries = fetch_concurrently(
+        lambda key: summarize_chart(key[0], key[1], *inputs[key]), inputs,
+        max_workers=pool_size)
+    for summary in summaries:
+        charts[(summary['symbol'], summary['timeframe'])] = summary
+    return charts
+
+
+def chart_embed(chart):
+    label = TIMEFRAMES[chart['timeframe']]['label']
+    if chart['link'] is None:
+        return create_embed(chart['symbol'], *chart['fields'], label=label)
+    return create_embed_with_svg(chart['link'], chart['symbol'], *chart['fields'], label=label)
+
+
+def coalesce_budget():
+    # Seconds a chart may wait on another invocation's render and still be
+    # rendered here before the function times out; None outside Lambda
+    if invocation_deadline is None:
+        return None
+    return invocation_deadline - time.monotonic() - render_reserve
+
+
+def render_chart(chart):
+    # Another invocation rendering the same chart right now is waited for
+    # instead of repeated; the cache key covers symbol, timeframe and bars
+    if chart['link'] is None:
+        chart['link'] = chart_cache.render_once(chart['chart_key'], lambda: make_candlestick_chart(
+            chart['frame'], chart['indicators'], chart['chart_key'], chart['timeframe']),
+            max_wait=coalesce_budget())
+    return chart['link']
+
+
+def render_charts(charts, on_rendered=None):
+    # Bounded pool: uploads overlap with rendering, and a watchlist does not
+    # hold dozens of figures in memory at once. on_rendered(key) runs as
+    # each chart finishes, whether or not it succeeded.
+    pending = [key for key, chart in charts.items() if chart['link'] is None]
+    if not pending:
+        return
+    with ThreadPoolExecutor(max_workers=render_workers) as executor:
+        futures = {executor.submit(render_chart, charts[key]): key for key in pending}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print('Error charting', *key, e)
+            if on_rendered is not None:
+                on_rendered(key)
+
+
+def respond_deferred(chart_requests, charts):
+    # Each message goes out as soon as its fields are known, and is edited
+    # once the last of its charts has been uploaded. Cached charts are
+    # included in the first post, so a fully cached message is never edited.
+    waiting = {}
+    for chart_request in chart_requests:
+        keys = [key for key in chart_keys(chart_request) if key in charts]
+        for i in range(0, len(keys), MAX_EMBEDS):
+            message = {'request': chart_request,
+                       'keys': keys[i:i + MAX_EMBEDS]}
+            message['pending'] = {key for key in message['keys']
+                                  if charts[key]['link'] is None}
+            response = post_message(
+                {'embeds': [chart_embed(charts[key]) for key in message['keys']]},
+                chart_request['app_id'], chart_request['token'],
+                wait=bool(message['pending']))
+            mark('first_response')
+            message['id'] = message_id(response) if message['pending'] else None
+            if message['id'] is not None:
+                for key in message['pending']:
+                    waiting.setdefault(key, []).append(message)
+
+    def on_rendered(key):
+        for message in waiting.get(key, []):
+            message['pending'].discard(key)
+            if not message['pending']:
+                edit_message(
+                    {'embeds': [chart_embed(charts[k]) for k in message['keys']]},
+                    message['request']['app_id'], message['request']['token'],
+                    message['id'])
+
+    render_charts(charts, on_rendered)
+
+
+def respond_when_rendered(chart_requests, charts):
+    render_charts(charts)
+    for chart_request in chart_requests:
+        request_embeds = [chart_embed(charts[key]) for key in chart_keys(chart_request)
+                          if key in charts]
+        if request_embeds:
+            send_embeds_to_discord(
+                request_embeds, chart_request['app_id'], chart_request['token'])
+            mark('first_response')
+
+
+def compare_frames(chart_request, series):
+    # symbol -> chart frame for the /compare symbols with bars, built as
+    # the single charts build theirs
+    frames = {}
+    for symbol in chart_request['symbols']:
+        df, spy_df = chart_series(series, symbol, chart_request['timeframe'])
+        if df is not None and len(df) and spy_df is not None:
+            frame = make_chart_frame(df, spy_df, chart_request['timeframe'],
+                                     from_date_fn=default_from_date)
+            if len(frame):
+                frames[symbol] = frame
+    return frames
+
+
+def respond_compare(chart_request, series):
+    # One grid image in one embed for all of a /compare's symbols
+    frames = compare_frames(chart_request, series)
+    if not frames:
+        return
+    count('compare_charts')
+    spec = TIMEFRAMES[chart_request['timeframe']]
+    compare_data = prepare_compare_data(frames, date_format=spec['date_format'])
+    chart_key = compare_cache_key(frames, timeframe=chart_request['timeframe'], output=output_config)
+    link = chart_cache.lookup(chart_key)
+    if link is None:
+        try:
+            link = chart_cache.render_once(
+                chart_key, lambda: make_compare_chart(compare_data, chart_key),
+                max_wait=coalesce_budget())
+        except Exception as e:
+            print('Error charting compare', *frames, e)
+    post_message({'embeds': [create_compare_embed(link, compare_data, spec['label'])]},
+                 chart_request['app_id'], chart_request['token'])
+    mark('first_response')
 
-            # Create a DataFrame from the OHLC and volume data
-            df = pd.DataFrame(ohlc_data_reversed, columns=[
-                'Date', 'Open', 'High', 'Low', 'Close'])
 
-            # Convert date column to datetime format
-            df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
-            df.set_index('Date', inplace=True)  # Set Date column as index
-            # Add volume data as a new column in the DataFrame
-            df['Volume'] = volume_data_reversed
+def handler(event, context):
 
-            spy_df = pd.DataFrame(spy_ohlc_data, columns=['Date', 'SPY Close'])
-            # Convert date column to datetime format
-            spy_df['Date'] = pd.to_datetime(spy_df['Date'], format='%Y-%m-%d')
-            spy_df.set_index('Date', inplace=True)  # Set Date column as index
+    # One structured metrics line per invocation, however it ends
+    global invocation_deadline
+    metrics = start_invocation()
+    invocation_deadline = (time.monotonic() + context.get_remaining_time_in_millis() / 1000
+                           if context is not None else None)
+    try:
+        return handle_chart_requests(event)
+    finally:
+        metrics.emit()
 
-            # Merge ticker DataFrame with SPY DataFrame on Date
-            merged_df = df.merge(spy_df, on='Date', how='inner')
-            merged_df['RS Ratio'] = merged_df['Close'] / merged_df['SPY Close']
 
-            # Calculate moving averages using only the last 120 days of data
-            sma_50 = df['Close'].rolling(window=50).mean()
-            ema_10 = df['Close'].ewm(span=10, adjust=False).mean()
-            ema_21 = df['Close'].ewm(span=21, adjust=False).mean()
+def handle_chart_requests(event):
 
-            s3_link = make_candlestick_chart(
-                df, spy_df, ema_10, ema_21, sma_50)
+    chart_requests = parse_chart_requests(event)
+    single_requests = [chart_request for chart_request in chart_requests
+                       if not chart_request.get('compare')]
+    compare_requests = [chart_request for chart_request in chart_requests
+                        if chart_request.get('compare')]
+    keys = list(dict.fromkeys(
+        key for chart_request in single_requests for key in chart_keys(chart_request)))
+    # /compare symbols are fetched along with the single charts' symbols
+    fetch_keys = list(dict.fromkeys(keys + [
+        key for chart_request in compare_requests for key in chart_keys(chart_request)]))
+    current().set('symbols', list(dict.fromkeys(symbol for symbol, _ in fetch_keys)))
+    count('charts', len(keys))
 
-            adr = calculate_adrp(df, 20)
-            abs_change, percent_change = calculate_change_last_two_prices(df)
+    if fetch_keys:
 
-            embeds = create_embed_with_svg(
-                s3_link,
-                symbol_value,
-                df['Close'].iloc[-1],
-                abs_change,
-                percent_change,
-                adr)
+        series = fetch_chart_data(fetch_keys)
 
-            markdown_message = f"""
-            ### {symbol_value} Daily Chart
+        if all(series.get(kind) is None
+               for kind in (('benchmark', 'SPY'), ('intraday_benchmark', 'SPY'))):
+            print('Error fetching benchmark data, no charts rendered')
+            return ({'statusCode': 200, 'body': 'success'})
 
-            | Price     | Change               | ADRP     |
-            |-----------|----------------------|----------|
-            | ${ df['Close'].iloc[-1]:.2f} | ${abs_change:.2f} ({percent_change:.2f}%) | {adr:.2f}% |
+        charts = summarize_charts(keys, series)
 
-            ![Chart](<{s3_link}>)
-            """
+        if deferred_response:
+            respond_deferred(single_requests, charts)
+        else:
+            respond_when_rendered(single_requests, charts)
+        for chart_request in compare_requests:
+            respond_compare(chart_request, series)
 
-            send_embed_to_discord(embeds, appId, token)
-            # send_markdown_to_discord(markdown_message, appId, token)
+        # After responding, so it never delays a chart
+        if request_stats is not None:
+            request_stats.record(
+                symbol for chart_request in chart_requests for symbol in chart_request['symbols'])
 
     return ({'statusCode': 200, 'body': 'success'})
 
 
-def create_embed_with_svg(s3_link, ticker, last_price, absolute_change, percent_change, adr_p):
+def create_embed(ticker, last_price, absolute_change, percent_change, adr_p, label='Daily'):
 
     positive_color = "#0d9488"  # Green
     negative_color = "#dc2626"  # Red
@@ -230,7 +478,7 @@ def create_embed_with_svg(s3_link, ticker, last_price, absolute_change, percent_
     change_color = positive_color if absolute_change >= 0 else negative_color
 
     embed = {
-        "title": f"{ticker} Daily Chart",
+        "title": f"{ticker} {label} Chart",
         # "description": "Daily Chart",
         "fields": [
             {
@@ -243,46 +491,46 @@ def create_embed_with_svg(s3_link, ticker, last_price, absolute_change, percent_
                 "value": f"${absolute_change:.2f} ({percent_change:.2f})%",
                 "inline": True,
                 "color": change_color
-            },
-            {
-                "name": "ADRP",
-                "value": f"{adr_p:.2f}%",
-                "inline": True
             }
-        ],
-        "image": {
-            "url": s3_link
-        }
+        ]
     }
+    # Intraday charts have no ADR%
+    if adr_p is not None:
+        embed["fields"].append({
+            "name": "ADRP",
+            "value": f"{adr_p:.2f}%",
+            "inline": True
+        })
     return embed
 
 
-def send_embed_to_discord(embed, appid, token):
-    discord_webhook_url = f'https://discord.com/api/v10/webhooks/{appid}/{token}'
-    headers = {"Content-Type": "application/json"}
-    payload = {"embeds": [embed]}
-    response = requests.post(
-        discord_webhook_url, headers=headers, json=payload)
-    print(response.text)  # Print the response from Discord API
-
-    return {
-        'statusCode': response.status_code,
-        'body': response.text
+def create_embed_with_svg(s3_link, ticker, last_price, absolute_change, percent_change, adr_p,
+                          label='Daily'):
+    embed = create_embed(ticker, last_price, absolute_change, percent_change, adr_p, label)
+    embed["image"] = {
+        "url": s3_link
     }
+    return embed
 
 
-def send_markdown_to_discord(markdown_str, appid, token):
-    discord_webhook_url = f'https://discord.com/api/v10/webhooks/{appid}/{token}'
-    headers = {"Content-Type": "application/json"}
-    payload = markdown_str
-    response = requests.post(
-        discord_webhook_url, headers=headers, json=payload)
-    print(response.text)  # Print the response from Discord API
-
-    return {
-        'statusCode': response.status_code,
-        'body': response.text
+def create_compare_embed(s3_link, compare_data, label='Daily'):
+    panels = compare_data['panels']
+    embed = {
+        "title": f"{' vs '.join(panel['symbol'] for panel in panels)} {label} Comparison",
+        "fields": [
+            {
+                "name": panel['symbol'],
+                "value": f"${panel['close']:.2f} ({panel['relative_pct']:+.2f}% vs SPY)",
+                "inline": True
+            }
+            for panel in panels
+        ]
     }
+    if s3_link is not None:
+        embed["image"] = {
+            "url": s3_link
+        }
+    return embed
 
 
 # make_candlestick_chart('NVDL')
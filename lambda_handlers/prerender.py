@@ -0,0 +1,217 @@
+import argparse
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from utils.indicator_utils import IndicatorEngine
+from utils.timeframes import DAILY_TIMEFRAMES, TIMEFRAMES, make_chart_frame
+from utils.fetch_utils import fetch_concurrently, default_from_date, pool_size
+from utils.fmp_client import make_fmp_client
+from utils.benchmark_cache import make_benchmark_cache
+from utils.ohlcv_store import make_ohlcv_store
+from utils.chart_cache import make_chart_cache, chart_cache_key
+from utils.parse_utils import parse_benchmark
+from utils.chart_template import ChartTemplatePool, prepare_chart_data
+from utils.image_utils import encode_figure, output_config_from_env
+from utils.request_stats import make_request_stats
+from utils.rs_ranking import rank_from_date, universe_from_env
+
+# Scheduled after the close: renders the day's charts for a watchlist, or
+# the most requested tickers, into the chart cache so interactive /chart
+# requests for them only need a lookup and a presign. Uses the same stores,
+# cache keys and output settings as candlestick-maker.
+
+
+fmp_client = make_fmp_client()
+benchmark_cache = make_benchmark_cache(fmp_client.historical, transform=parse_benchmark)
+ohlcv_store = make_ohlcv_store(fmp_client.historical)
+chart_cache = make_chart_cache()
+request_stats = make_request_stats()
+indicator_engines = {name: IndicatorEngine(TIMEFRAMES[name]['indicators'])
+                     for name in DAILY_TIMEFRAMES}
+output_config = output_config_from_env()
+
+# PRERENDER_SYMBOLS is a fixed watchlist; without one the PRERENDER_TOP most
+# requested tickers of the last PRERENDER_DAYS days are rendered
+watchlist = [symbol.strip().upper() for symbol in
+             os.environ.get('PRERENDER_SYMBOLS', '').replace(',', ' ').split()]
+top_n = int(os.environ.get('PRERENDER_TOP', '50'))
+stats_days = int(os.environ.get('PRERENDER_DAYS', '5'))
+# Lambda scales CPU with memory: one full vCPU at 1769 MB, more above
+render_workers = int(os.environ.get('PRERENDER_WORKERS', '0')) or os.cpu_count() or 1
+# Comma separated; intraday charts go stale within minutes, so only
+# timeframes resampled from daily bars are pre-rendered
+timeframes = [name.strip() for name in os.environ.get('PRERENDER_TIMEFRAMES', 'daily').split(',')
+              if name.strip() in DAILY_TIMEFRAMES]
+
+# After the charts, the /rank universe (RANK_UNIVERSE, or every stored
+# ticker) is topped up, so /rank covers more than the tickers charted
+# since the last session; 0 skips it
+refresh_rank = os.environ.get('PRERENDER_RANK_REFRESH', '1') != '0'
+rank_universe = universe_from_env()
+
+# One pool per worker process (or shared by the threads of the fallback)
+chart_templates = ChartTemplatePool()
+
+
+def render_image(chart_data):
+    # Runs in the worker; returns the encoded bytes so the parent uploads
+    with chart_templates.acquire(chart_data['moving_average_specs']) as template:
+        buf, content_type = encode_figure(template.render(chart_data), **output_config)
+    return buf.getvalue(), content_type
+
+
+def make_executor(workers, kind='process'):
+    # Lambda has no /dev/shm, which multiprocessing needs for its locks, so
+    # creating a process pool fails there; threads still overlap encoding
+    # and uploads
+    if kind == 'process' and workers > 1:
+        try:
+            return ProcessPoolExecutor(max_workers=workers), 'process'
+        except (OSError, ImportError, NotImplementedError) as e:
+            print('process pool unavailable, using threads:', e)
+    return ThreadPoolExecutor(max_workers=workers), 'thread'
+
+
+def prerender_symbols(event=None):
+    symbols = (event or {}).get('symbols') or watchlist
+    if not symbols and request_stats is not None:
+        symbols = request_stats.most_requested(top_n, days=stats_days)
+    return list(dict.fromkeys(symbol.upper() for symbol in symbols))
+
+
+def fetch_frames(symbols, from_date):
+
+    def fetch_series(key):
+        kind, ticker = key
+        if kind == 'benchmark':
+            return benchmark_cache.get(ticker, from_date)
+        return ohlcv_store.update(ticker, from_date)
+
+    results = fetch_concurrently(fetch_series,
+                                 [('ticker', symbol) for symbol in symbols] + [('benchmark', 'SPY')],
+                                 max_workers=min(len(symbols) + 1, pool_size))
+    return dict(zip(symbols, results[:-1])), results[-1]
+
+
+def chart_name(symbol, timeframe):
+    # How a chart is listed in the report
+    return symbol if timeframe == 'daily' else f'{symbol} {timeframe}'
+
+
+def prerender(symbols, workers=None, executor_kind='process', chart_timeframes=None):
+    # Returns the run report
+    started = time.perf_counter()
+    chart_timeframes = chart_timeframes or timeframes or ['daily']
+    report = {'started': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+              'symbols': len(symbols), 'timeframes': chart_timeframes,
+              'rendered': [], 'cached': [], 'no_data': [], 'failed': []}
+    if not symbols:
+        return report
+
+    # Weekly and monthly bars are resampled from the same daily series
+    history_days = max(TIMEFRAMES[timeframe]['history_days'] for timeframe in chart_timeframes)
+    frames, spy_df = fetch_frames(symbols, default_from_date(history_days))
+    report['fetch_s'] = round(time.perf_counter() - started, 3)
+    if spy_df is None:
+        report['error'] = 'benchmark fetch failed'
+        return report
+
+    # Charts whose key already exists were rendered by an earlier run or an
+    # interactive request
+    jobs = {}
+    for symbol in symbols:
+        df = frames[symbol]
+        if df is None or not len(df):
+            report['no_data'].append(symbol)
+            continue
+        for timeframe in chart_timeframes:
+            spec = TIMEFRAMES[timeframe]
+            # Built with the handler's helpers, so the keys match
+            frame = make_chart_frame(df, spy_df, timeframe, from_date_fn=default_from_date)
+            chart_key = chart_cache_key(symbol, frame, spy_df, timeframe=timeframe, output=output_config)
+            name = chart_name(symbol, timeframe)
+            if chart_cache.store.exists(chart_key):
+                report['cached'].append(name)
+                continue
+            indicators, _ = indicator_engines[timeframe].run(frame)
+            jobs[name] = (prepare_chart_data(frame, indicators,
+                                             moving_averages=spec['moving_averages'],
+                                             date_format=spec['date_format']), chart_key)
+    prepared = time.perf_counter()
+    report['prepare_s'] = round(prepared - started - report['fetch_s'], 3)
+
+    if jobs:
+        workers = min(workers or render_workers, len(jobs))
+        executor, report['executor'] = make_executor(workers, executor_kind)
+        report['workers'] = workers
+        with executor:
+            futures = {executor.submit(render_image, chart_data): name
+                       for name, (chart_data, _) in jobs.items()}
+            # Uploads happen here while the workers render the next charts
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    body, content_type = future.result()
+                    chart_cache.put(jobs[name][1], body, content_type=content_type)
+                    report['rendered'].append(name)
+                except Exception as e:
+                    print('Error prerendering', name, e)
+                    report['failed'].append(name)
+    report['render_s'] = round(time.perf_counter() - prepared, 3)
+    report['total_s'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def refresh_rank_universe(symbols=None):
+    # Brings every universe ticker's bars up to the last session. The FMP
+    # client batches the calls, which all share one start date.
+    symbols = symbols or rank_universe or ohlcv_store.tickers()
+    from_date = rank_from_date()
+    started = time.perf_counter()
+    frames = fetch_concurrently(lambda symbol: ohlcv_store.update(symbol, from_date), symbols,
+                                max_workers=min(len(symbols), pool_size) or 1)
+    return {'universe': len(symbols),
+            'failed': [symbol for symbol, df in zip(symbols, frames) if df is None],
+            'refresh_s': round(time.perf_counter() - started, 3)}
+
+
+def save_report(report):
+    key = 'reports/prerender/%s.json' % report['started'].replace(':', '')
+    try:
+        chart_cache.store.put(key, json.dumps(report).encode(),
+                              content_type='application/json')
+    except Exception as e:
+        print('Error saving prerender report:', e)
+    return key
+
+
+def handler(event, context):
+    # EventBridge schedule; {"symbols": [...]} in the event overrides the list
+    symbols = prerender_symbols(event)
+    print('prerendering', len(symbols), 'symbols')
+    report = prerender(symbols)
+    if refresh_rank:
+        report['rank_universe'] = refresh_rank_universe()
+    save_report(report)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == '__main__':
+    # Local run against a filesystem stand-in for the bucket:
+    #   CHART_STORE_DIR=/tmp/charts FMP_API_KEY=... python lambda_handlers/prerender.py AAPL MSFT
+    parser = argparse.ArgumentParser()
+    parser.add_argument('symbols', nargs='*')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--executor', choices=('process', 'thread'), default='process')
+    parser.add_argument('--timeframe', action='append', choices=DAILY_TIMEFRAMES)
+    args = parser.parse_args()
+
+    symbols = prerender_symbols({'symbols': args.symbols})
+    report = prerender(symbols, workers=args.workers, executor_kind=args.executor,
+                       chart_timeframes=args.timeframe)
+    save_report(report)
+    print(json.dumps(report, indent=2))
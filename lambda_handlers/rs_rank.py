@@ -0,0 +1,107 @@
+import argparse
+import datetime
+import json
+import os
+import time
+
+from utils.fmp_client import make_fmp_client
+from utils.benchmark_cache import make_benchmark_cache
+from utils.ohlcv_store import make_ohlcv_store
+from utils.parse_utils import parse_benchmark
+from utils.discord_utils import post_message
+from utils.rs_ranking import (align_universe, format_rank_table, load_universe, rank_from_date,
+                              rank_universe, rank_window, universe_from_env)
+
+# /rank: ranks a universe of tickers by how far their RS line against SPY
+# has risen and posts the top N as a table. The universe is RANK_UNIVERSE,
+# or every ticker in the OHLCV store. Bars are read from the store as they
+# are; the prerender job tops them up after each close. A ticker still not
+# updated since the last session has no bar on SPY's last date and is left
+# out rather than refetched, and the posted report counts it as stale.
+
+
+fmp_client = make_fmp_client()
+benchmark_cache = make_benchmark_cache(fmp_client.historical, transform=parse_benchmark)
+ohlcv_store = make_ohlcv_store(fmp_client.historical)
+
+universe_symbols = universe_from_env()
+default_top = int(os.environ.get('RANK_TOP', '25'))
+load_workers = int(os.environ.get('RANK_LOAD_WORKERS', '32'))
+# Keeps the table inside Discord's 2000 character message limit
+MAX_TOP = 30
+
+
+def rank(symbols=None, top=None):
+    # Returns the run report, the ranked rows included
+    started = time.perf_counter()
+    top = min(top or default_top, MAX_TOP)
+    symbols = symbols or universe_symbols or ohlcv_store.tickers()
+    report = {'started': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+              'universe': len(symbols), 'rows': []}
+
+    window = rank_window()
+    spy_df = benchmark_cache.get('SPY', rank_from_date())
+    if spy_df is None or len(spy_df) < window:
+        report['error'] = 'benchmark fetch failed'
+        return report
+    spy_df = spy_df.iloc[-window:]
+    report['as_of'] = spy_df.index[-1].strftime('%Y-%m-%d')
+
+    universe = load_universe(ohlcv_store, symbols, load_workers)
+    loaded = time.perf_counter()
+    report['loaded'] = len(universe)
+    report['missing'] = len(symbols) - len(universe)
+    report['load_s'] = round(loaded - started, 3)
+
+    ranked = rank_universe(*align_universe(universe, spy_df.index.values),
+                           spy_df['SPY Close'].to_numpy(), top=top)
+    report.update(ranked)
+    report['short_history'] = report['loaded'] - report['ranked'] - report['stale']
+    report['rank_s'] = round(time.perf_counter() - loaded, 3)
+    report['total_s'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def format_report(report):
+    if 'error' in report:
+        return f'Could not rank: {report["error"]}'
+    # What was left out, so a partial ranking does not pass for the universe
+    return (f'Top {len(report["rows"])} of {report["ranked"]} by RS vs SPY, '
+            f'as of {report["as_of"]}\n'
+            f'Universe {report["universe"]}: {report["ranked"]} ranked, '
+            f'{report["stale"]} skipped as stale, {report["short_history"]} with too little '
+            f'history, {report["missing"]} never fetched\n' + format_rank_table(report['rows']))
+
+
+def rank_top(options):
+    # /rank takes no `symbols` option: the chart handler shares the topic
+    # and would chart them
+    for option in options:
+        if option['name'] == 'top' and option.get('value'):
+            return int(option['value'])
+    return None
+
+
+def handler(event, context):
+    # SNS, filtered to /rank interactions; each record is answered on its
+    # own interaction webhook
+    for record in event.get('Records', []):
+        payload_data = json.loads(record['Sns']['Message'])
+        report = rank(top=rank_top(payload_data['data'].get('options', [])))
+        print(json.dumps(dict(report, rows=len(report['rows']))))
+        post_message({'content': format_report(report)},
+                     payload_data['application_id'], payload_data['token'])
+    return {'statusCode': 200, 'body': 'success'}
+
+
+if __name__ == '__main__':
+    # Local run against a filesystem stand-in for the bucket:
+    #   CHART_STORE_DIR=/tmp/charts FMP_API_KEY=... python lambda_handlers/rs_rank.py --top 20
+    parser = argparse.ArgumentParser()
+    parser.add_argument('symbols', nargs='*')
+    parser.add_argument('--top', type=int, default=None)
+    args = parser.parse_args()
+
+    report = rank(args.symbols or None, args.top)
+    print(format_report(report))
+    print(json.dumps(dict(report, rows=len(report['rows'])), indent=2))
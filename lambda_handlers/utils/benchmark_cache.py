@@ -0,0 +1,182 @@
+import datetime
+import json
+import os
+import threading
+
+from dateutil import tz
+
+from utils.blob_store import make_blob_store
+from utils.metrics_utils import count
+
+MARKET_TZ = tz.gettz('America/New_York')
+MARKET_CLOSE = datetime.time(16, 0)
+# FMP publishes the day's bar some time after the close: entries live until
+# this long past it, and one fetched after the close without the day's bar
+# is fetched again after LAGGING_RETRY instead of being kept a whole session
+CLOSE_GRACE = datetime.timedelta(minutes=float(os.environ.get('BENCHMARK_CLOSE_GRACE_MIN', '30')))
+LAGGING_RETRY = datetime.timedelta(minutes=float(os.environ.get('BENCHMARK_LAGGING_RETRY_MIN', '10')))
+
+
+def next_market_close(now=None, grace=datetime.timedelta(0)):
+    # Benchmark bars only change once per session, so entries live until the
+    # next 16:00 ET close (plus `grace`) on a weekday (exchange holidays are
+    # not modelled)
+    now = (now or datetime.datetime.now(tz=MARKET_TZ)).astimezone(MARKET_TZ)
+    close = datetime.datetime.combine(now.date(), MARKET_CLOSE, tzinfo=MARKET_TZ) + grace
+    if now >= close:
+        close += datetime.timedelta(days=1)
+    while close.weekday() >= 5:
+        close += datetime.timedelta(days=1)
+    return close
+
+
+def missing_todays_bar(payload, now):
+    # True when `payload` (FMP historical rows) was fetched after a weekday
+    # close but its newest bar is from an earlier session
+    now = now.astimezone(MARKET_TZ)
+    if now.weekday() >= 5 or now.time() < MARKET_CLOSE:
+        return False
+    rows = payload.get('historical') if isinstance(payload, dict) else None
+    if not rows:
+        return False
+    return max(row['date'][:10] for row in rows) < now.date().isoformat()
+
+
+class BenchmarkCache:
+    # Two tier cache for benchmark series (SPY) that are the same for every
+    # chart: an in-process dict that survives warm invocations, backed by an
+    # optional blob store shared between containers.
+
+    def __init__(self, fetch_fn, store=None, prefix='cache/benchmark/', transform=None):
+        self.fetch_fn = fetch_fn
+        self.store = store
+        # Applied once per entry, e.g. parsing the payload into a compact
+        # frame, so the memory tier holds that instead of the JSON rows. The
+        # store tier keeps the raw payload.
+        self.transform = transform or (lambda payload: payload)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _store_key(self, key):
+        symbol, from_date, to_date = key
+        return f'{self.prefix}{symbol}/{from_date}_{to_date}.json'
+
+    def _load_persistent(self, key, now):
+        if self.store is None:
+            return None
+        try:
+            body = self.store.get(self._store_key(key))
+        except Exception as e:
+            print('benchmark cache store read failed:', e)
+            return None
+        if body is None:
+            return None
+        entry = json.loads(body)
+        expires_at = datetime.datetime.fromisoformat(entry['expires_at'])
+        if now >= expires_at:
+            return None
+        return expires_at, entry['payload']
+
+    def _load_stale(self, symbol):
+        # The newest entry for the symbol, however old and whatever its start
+        # date (the longest history among equally new ones): what is served
+        # when FMP cannot be reached or the quota is spent
+        def newest(keys):
+            # max keeps the first of equal elements: the earliest start date
+            return max(sorted(keys, key=lambda key: key[1]), key=lambda key: key[2])
+
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == symbol]
+            if keys:
+                return self._entries[newest(keys)][1]
+        if self.store is None:
+            return None
+        try:
+            keys = [tuple([symbol] + path.rsplit('/', 1)[-1][:-len('.json')].split('_'))
+                    for path in self.store.list(f'{self.prefix}{symbol}/')]
+            body = self.store.get(self._store_key(newest(keys))) if keys else None
+        except Exception as e:
+            print('benchmark cache store read failed:', e)
+            return None
+        return None if body is None else self.transform(json.loads(body)['payload'])
+
+    def _save_persistent(self, key, expires_at, payload):
+        if self.store is None:
+            return
+        body = json.dumps({'expires_at': expires_at.isoformat(),
+                           'payload': payload})
+        try:
+            self.store.put(self._store_key(key), body.encode(),
+                           content_type='application/json')
+        except Exception as e:
+            print('benchmark cache store write failed:', e)
+
+    def get(self, symbol, from_date, now=None):
+        now = now or datetime.datetime.now(tz=MARKET_TZ)
+        expires_at = next_market_close(now, CLOSE_GRACE)
+        # Everything fetched before the same close shares one entry
+        key = (symbol, from_date, expires_at.date().isoformat())
+
+        # One upstream call per key even when several threads ask at once
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and now < entry[0]:
+                self.hits += 1
+                count('benchmark_cache_hits')
+                self.log(symbol, 'hit (memory)')
+                return entry[1]
+
+            entry = self._load_persistent(key, now)
+            if entry is not None:
+                entry = (entry[0], self.transform(entry[1]))
+                with self._lock:
+                    self._entries[key] = entry
+                self.hits += 1
+                count('benchmark_cache_hits')
+                self.log(symbol, 'hit (store)')
+                return entry[1]
+
+            self.misses += 1
+            count('benchmark_cache_misses')
+            payload = self.fetch_fn(symbol, from_date)
+            if payload is None:
+                stale = self._load_stale(symbol)
+                if stale is not None:
+                    count('benchmark_cache_stale')
+                    self.log(symbol, 'miss (fetch failed, serving stale)')
+                    return stale
+                self.log(symbol, 'miss (fetch failed)')
+                return None
+
+            if missing_todays_bar(payload, now):
+                # Served now, but not kept until the next close
+                count('benchmark_cache_lagging')
+                expires_at = min(expires_at, now + LAGGING_RETRY)
+            value = self.transform(payload)
+            with self._lock:
+                for stale in [k for k, v in self._entries.items() if now >= v[0]]:
+                    del self._entries[stale]
+                self._entries[key] = (expires_at, value)
+            self._save_persistent(key, expires_at, payload)
+            self.log(symbol, 'miss')
+            return value
+
+    def log(self, symbol, outcome):
+        print(f'benchmark cache {symbol}: {outcome} '
+              f'hits={self.hits} misses={self.misses}')
+
+
+def make_benchmark_cache(fetch_fn, transform=None):
+    store = None
+    if os.environ.get('BENCHMARK_CACHE_PERSIST', '1') != '0':
+        store = make_blob_store()
+    return BenchmarkCache(fetch_fn, store=store, transform=transform)
@@ -0,0 +1,175 @@
+import os
+import threading
+
+import boto3
+from botocore.exceptions import ClientError
+
+_s3_client = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_client():
+    # boto3 clients are thread safe, so one per container is enough
+    global _s3_client
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+class S3BlobStore:
+
+    def __init__(self, bucket, client=None):
+        self.bucket = bucket
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_s3_client()
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read()
+
+    def put(self, key, body, content_type='application/octet-stream'):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body,
+                               ContentType=content_type)
+
+    def put_if_absent(self, key, body, content_type='application/octet-stream'):
+        # S3 conditional write: exactly one concurrent caller creates the key
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=body,
+                                   ContentType=content_type, IfNoneMatch='*')
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+        return True
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return False
+            raise
+        return True
+
+    def list(self, prefix):
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(item['Key'] for item in page.get('Contents', []))
+        return keys
+
+    def presign(self, key, expires=86400):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=expires)
+
+
+class LocalBlobStore:
+    # Filesystem stand-in for the chart bucket, for local runs and tests
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, body, content_type='application/octet-stream'):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not isinstance(body, (bytes, bytearray, memoryview)):
+            body = body.read()
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def put_if_absent(self, key, body, content_type='application/octet-stream'):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        return True
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def list(self, prefix):
+        keys = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                key = key.replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def presign(self, key, expires=86400):
+        return 'file://' + self._path(key)
+
+
+class MemoryBlobStore:
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.objects.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key, body, content_type='application/octet-stream'):
+        if not isinstance(body, (bytes, bytearray, memoryview)):
+            body = body.read()
+        with self._lock:
+            self.objects[key] = (bytes(body), content_type)
+
+    def put_if_absent(self, key, body, content_type='application/octet-stream'):
+        with self._lock:
+            if key in self.objects:
+                return False
+            self.objects[key] = (bytes(body), content_type)
+            return True
+
+    def exists(self, key):
+        with self._lock:
+            return key in self.objects
+
+    def list(self, prefix):
+        with self._lock:
+            return sorted(key for key in self.objects if key.startswith(prefix))
+
+    def presign(self, key, expires=86400):
+        return 'memory://' + key
+
+
+def make_blob_store():
+    # CHART_STORE_DIR points the bot at a local directory instead of S3
+    store_dir = os.environ.get('CHART_STORE_DIR')
+    if store_dir:
+        return LocalBlobStore(store_dir)
+    return S3BlobStore(os.environ.get('CHART_BUCKET'))
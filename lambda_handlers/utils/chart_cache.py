@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from utils.blob_store import make_blob_store
+from utils.chart_template import WINDOW
+from utils.image_utils import file_extension
+from utils.metrics_utils import count, stage
+
+# Bump whenever the rendered chart changes look, so old objects stop matching
+STYLE_VERSION = 2
+
+# How long a render lease holds off other invocations. Waiters check for
+# the leased chart with one HEAD per poll, starting LEASE_POLL apart and
+# backing off to LEASE_POLL_MAX, and re-read the lease (to notice a failed
+# render) every LEASE_CHECK seconds.
+LEASE_TTL = float(os.environ.get('CHART_LEASE_TTL', '20'))
+LEASE_POLL = float(os.environ.get('CHART_LEASE_POLL', '0.25'))
+LEASE_POLL_MAX = float(os.environ.get('CHART_LEASE_POLL_MAX', '2'))
+LEASE_CHECK = float(os.environ.get('CHART_LEASE_CHECK', '3'))
+
+
+def _extension(extension, output):
+    if extension is None:
+        return file_extension(output['fmt']) if output else 'png'
+    return extension
+
+
+def chart_cache_key(ticker, df, spy_df, window=WINDOW, style_version=STYLE_VERSION,
+                    extension=None, output=None, timeframe='daily'):
+    # Content addressed: the last bar (which may still be moving intraday)
+    # and the last SPY close feed the digest, so a chart is only reused when
+    # it would render identically. `output` holds the image encoding settings
+    # and, unless `extension` is given, picks the file extension.
+    last_date = df.index[-1].strftime('%Y-%m-%d')
+    content = repr((ticker.upper(), df.index[-1].isoformat(), timeframe, style_version, window,
+                    tuple(float(v) for v in df.iloc[-1]),
+                    float(spy_df.iloc[-1, 0]),
+                    sorted((output or {}).items())))
+    digest = hashlib.sha1(content.encode()).hexdigest()[:16]
+    return (f'charts/cache/{ticker.upper()}/{last_date}/'
+            f'{timeframe}-w{window}-v{style_version}-{digest}.{_extension(extension, output)}')
+
+
+def compare_cache_key(frames, window=WINDOW, style_version=STYLE_VERSION, extension=None,
+                      output=None, timeframe='daily'):
+    # Same idea for a /compare grid: `frames` maps each symbol to its chart
+    # frame (SPY close included), and every panel's last bar feeds the digest
+    last_date = max(frame.index[-1] for frame in frames.values()).strftime('%Y-%m-%d')
+    content = repr((tuple(frames), timeframe, style_version, window,
+                    tuple((frame.index[-1].isoformat(), tuple(float(v) for v in frame.iloc[-1]))
+                          for frame in frames.values()),
+                    sorted((output or {}).items())))
+    digest = hashlib.sha1(content.encode()).hexdigest()[:16]
+    return (f'charts/cache/compare/{last_date}/'
+            f'{timeframe}-{len(frames)}x-w{window}-v{style_version}-{digest}.'
+            f'{_extension(extension, output)}')
+
+
+class ChartCache:
+
+    def __init__(self, store, lease_ttl=LEASE_TTL, poll_interval=LEASE_POLL,
+                 max_poll_interval=LEASE_POLL_MAX, lease_check=LEASE_CHECK):
+        self.store = store
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.lease_check = lease_check
+        self.owner = uuid.uuid4().hex[:12]
+
+    def lookup(self, key):
+        # Presigned URL for an already rendered chart, or None
+        with stage('cache_lookup'):
+            found = self.store.exists(key)
+        if not found:
+            count('chart_cache_misses')
+            return None
+        print('chart cache hit:', key)
+        count('chart_cache_hits')
+        with stage('presign'):
+            return self.store.presign(key)
+
+    def put(self, key, body, content_type='image/png'):
+        count('chart_bytes', body.getbuffer().nbytes if hasattr(body, 'getbuffer') else len(body))
+        with stage('upload'):
+            self.store.put(key, body, content_type=content_type)
+        with stage('presign'):
+            return self.store.presign(key)
+
+    def _lease_key(self, key):
+        return key.replace('charts/cache/', 'charts/leases/', 1) + '.json'
+
+    def _lease_expires_at(self, key):
+        # Epoch seconds, or None while the lease is just created and not
+        # readable yet
+        body = self.store.get(self._lease_key(key))
+        try:
+            return json.loads(body)['expires_at']
+        except (TypeError, ValueError, KeyError):
+            return None
+
+    def _lease_expired(self, key, now=None):
+        expires_at = self._lease_expires_at(key)
+        return expires_at is not None and (time.time() if now is None else now) >= expires_at
+
+    def acquire(self, key, now=None):
+        # True when this invocation should render `key`: it created the
+        # lease, or the one it found has expired or was released. False
+        # while another invocation holds a live lease.
+        now = time.time() if now is None else now
+        lease = json.dumps({'owner': self.owner, 'expires_at': now + self.lease_ttl})
+        with stage('lease'):
+            if self.store.put_if_absent(self._lease_key(key), lease.encode(),
+                                        content_type='application/json'):
+                return True
+            return self._lease_expired(key, now)
+
+    def release(self, key):
+        # Ends a lease early, after a failed render, so waiters stop waiting
+        lease = json.dumps({'owner': self.owner, 'expires_at': 0})
+        self.store.put(self._lease_key(key), lease.encode(), content_type='application/json')
+
+    def wait(self, key, timeout=None):
+        # Presigned URL once the leased chart is uploaded, or None when the
+        # lease ends without one or `timeout` seconds pass
+        started = time.monotonic()
+        limit = self.lease_ttl if timeout is None else min(self.lease_ttl, max(timeout, 0))
+        deadline = started + limit
+        next_check = started + self.lease_check
+        interval = self.poll_interval
+        while True:
+            if self.store.exists(key):
+                with stage('presign'):
+                    return self.store.presign(key)
+            now = time.monotonic()
+            if now >= deadline:
+                return None
+            if now >= next_check:
+                if self._lease_expired(key):
+                    return None
+                next_check = now + self.lease_check
+            time.sleep(min(interval, deadline - now))
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def render_once(self, key, render_fn, max_wait=None):
+        # Coalesces simultaneous requests for the same chart across
+        # invocations: the first to lease the key renders and uploads, the
+        # others wait for the object and reuse it. If the holder does not
+        # finish within the lease, or `max_wait` seconds (what the caller
+        # can spare and still render in time), the waiter renders after all.
+        if not self.acquire(key):
+            count('chart_renders_coalesced')
+            with stage('coalesce_wait'):
+                url = self.wait(key, max_wait)
+            if url is not None:
+                return url
+            count('chart_coalesce_timeouts')
+            count('chart_renders')
+            return render_fn()
+        count('chart_renders')
+        try:
+            return render_fn()
+        except Exception:
+            self.release(key)
+            raise
+
+
+def make_chart_cache():
+    return ChartCache(make_blob_store())
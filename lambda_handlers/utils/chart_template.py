@@ -0,0 +1,268 @@
+import datetime
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.mpl_utils import load_matplotlib, load_mplfinance
+
+WINDOW = 120
+
+# mplfinance's candle/volume widths for ~120 bars (its `_widths` table), with
+# the handler's 0.75 volume width adjustment applied
+CANDLE_WIDTH = 0.445
+CANDLE_LINEWIDTH = 0.625
+VOLUME_WIDTH = 0.925 * 0.75
+VOLUME_LINEWIDTH = 0.65
+
+# (indicator column, label, colour, width) of the moving averages drawn on
+# the price panel
+MOVING_AVERAGES = (('sma_50', '50 SMA', '#cb4b16', .5),
+                   ('ema_10', '10 EMA', '#839496', .5),
+                   ('ema_21', '21 EMA', '#268bd2', .5))
+
+_style = None
+_style_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+def chart_style():
+    # Built once per container and shared by every render
+    global _style
+    if _style is None:
+        with _style_lock:
+            if _style is None:
+                mpf = load_mplfinance()
+                _style = mpf.make_mpf_style(
+                    base_mpf_style='yahoo', rc={'font.size': 8, 'figure.facecolor': '#fafafa', "axes.edgecolor": "#a1a1aa", },
+                    gridcolor="#e4e4e7"
+                )
+    return _style
+
+
+def prepare_chart_data(frame, indicators, window=WINDOW, moving_averages=MOVING_AVERAGES,
+                       date_format='%b %d'):
+    # `frame` is the ticker joined with the SPY close, `indicators` the
+    # IndicatorEngine output for it; nothing is merged or recomputed here.
+    # `moving_averages` picks the indicator columns drawn on the price panel.
+
+    # Slice the DataFrame for the last `window` days
+    df_window = frame.iloc[-window:].assign(
+        **{'RS Ratio': indicators['rs'].iloc[-window:]})
+
+    # Calculate ylim with padding
+    ylim_min = df_window[['Low', 'Close']].min(
+    ).min() * 0.95  # 5% below the lowest low or close
+    ylim_max = df_window[['High', 'Close']].max(
+    ).max() * 1.05  # 5% above the highest high or close
+
+    return {
+        'df': df_window,
+        'moving_averages': [indicators[name].iloc[-window:]
+                            for name, _, _, _ in moving_averages],
+        'moving_average_specs': tuple(moving_averages),
+        'date_format': date_format,
+        # Plain floats: mplfinance rejects numpy float32 scalars
+        'ylim': (float(ylim_min), float(ylim_max)),
+    }
+
+
+def render_with_mplfinance(chart_data):
+    # The original full mpf.plot render. Goes through pyplot, so callers must
+    # serialise it and close the figure afterwards.
+    mpf = load_mplfinance()
+    df_window = chart_data['df']
+    averages = [mpf.make_addplot(series, color=color, label=label, width=width, panel=1)
+                for series, (_, label, color, width) in zip(
+                    chart_data['moving_averages'], chart_data['moving_average_specs'])]
+
+    fig, axlist = mpf.plot(df_window, type='candle', volume=True, ylabel_lower='Volume', style=chart_style(),
+                           addplot=averages + [
+                               mpf.make_addplot(
+                                   df_window['RS Ratio'], color='#000', label='RS Line', width=1, panel=0),
+                           ],
+                           xlim=(df_window.index.min(
+                           ), df_window.index.max() + datetime.timedelta(days=5)),
+                           ylim=chart_data['ylim'],
+                           figsize=(15, 10),
+                           panel_ratios=(.2, 1, .2),
+                           scale_padding={
+                               'left': 0.5, 'top': 4, 'right': 3, 'bottom': 1},
+                           xrotation=32,
+                           returnfig=True,
+                           scale_width_adjustment=dict(volume=0.75),
+                           tight_layout=True,
+                           volume_panel=2,
+                           main_panel=1)
+
+    axlist[0].legend(loc='upper left', borderaxespad=1)
+    axlist[2].legend(loc='upper left', borderaxespad=1)
+    return fig
+
+
+class ChartTemplate:
+    # A pre-laid-out RS / price / volume figure built once and reused. Each
+    # render only swaps the data of the candle, volume, moving-average and RS
+    # artists, skipping mpf.plot's figure, axes, legend and layout work. It
+    # uses Figure and the Agg canvas directly, never pyplot, so templates can
+    # render on several threads as long as each thread holds its own.
+
+    def __init__(self, moving_averages=MOVING_AVERAGES):
+        matplotlib = load_matplotlib()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection, PolyCollection
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+        style = chart_style()
+        colors = style['marketcolors']
+        self.alpha = colors['alpha']
+        self.candle_colors = (colors['candle']['down'], colors['candle']['up'])
+        self.volume_colors = (colors['volume']['down'], colors['volume']['up'])
+
+        with matplotlib.rc_context(style['rc']):
+            fig = Figure(figsize=(15, 10), facecolor=style['facecolor'])
+            FigureCanvasAgg(fig)
+            grid = fig.add_gridspec(3, 1, height_ratios=(.2, 1, .2), hspace=0)
+            ax_rs = fig.add_subplot(grid[0])
+            ax_main = fig.add_subplot(grid[1], sharex=ax_rs)
+            ax_volume = fig.add_subplot(grid[2], sharex=ax_rs)
+
+            for ax in (ax_rs, ax_main, ax_volume):
+                ax.set_facecolor(style['facecolor'])
+                ax.grid(True, color=style['gridcolor'], linestyle=style['gridstyle'])
+                ax.set_axisbelow(True)
+                ax.yaxis.tick_right()
+                ax.yaxis.set_label_position('right')
+                # Ticks are created at draw time, outside the rc_context, so
+                # pin their look here
+                ax.tick_params(labelsize=style['rc']['font.size'],
+                               colors=style['rc']['xtick.color'])
+                ax.yaxis.get_offset_text().set_fontsize(style['rc']['font.size'])
+            for ax in (ax_rs, ax_volume):
+                ax.yaxis.set_major_locator(MaxNLocator(nbins=3))
+            ax_main.set_ylabel('Price')
+            ax_volume.set_ylabel('Volume')
+            for ax in (ax_rs, ax_main):
+                ax.tick_params(axis='x', labelbottom=False)
+
+            self.wicks = LineCollection([], colors=colors['wick']['up'],
+                                        linewidths=CANDLE_LINEWIDTH)
+            self.bodies = PolyCollection([], linewidths=CANDLE_LINEWIDTH)
+            ax_main.add_collection(self.wicks)
+            ax_main.add_collection(self.bodies)
+            self.volume = PolyCollection([], linewidths=VOLUME_LINEWIDTH)
+            ax_volume.add_collection(self.volume)
+
+            self.ma_lines = [ax_main.plot([], [], color=color, label=label, linewidth=width)[0]
+                             for _, label, color, width in moving_averages]
+            self.rs_line = ax_rs.plot([], [], color='#000', label='RS Line', linewidth=1)[0]
+            ax_rs.legend(loc='upper left', borderaxespad=1)
+            ax_main.legend(loc='upper left', borderaxespad=1)
+
+            # Bars sit at integer positions (no gaps for non-trading days);
+            # tick labels look the dates up from the current render
+            self.dates = []
+            self.date_format = '%b %d'
+            ax_volume.xaxis.set_major_locator(MaxNLocator(nbins=8, integer=True))
+            ax_volume.xaxis.set_major_formatter(FuncFormatter(self._format_date))
+            ax_volume.tick_params(axis='x', labelrotation=32)
+            for label in ax_volume.get_xticklabels():
+                label.set_horizontalalignment('right')
+
+            # Fixed margins in place of a tight_layout pass on every render
+            fig.subplots_adjust(left=0.05, right=0.93, top=0.89, bottom=0.11)
+
+        self.fig = fig
+        self.ax_rs, self.ax_main, self.ax_volume = ax_rs, ax_main, ax_volume
+
+    def _format_date(self, x, pos=None):
+        i = int(round(x))
+        if 0 <= i < len(self.dates):
+            return self.dates[i].strftime(self.date_format)
+        return ''
+
+    def render(self, chart_data):
+        df = chart_data['df']
+        n = len(df)
+        x = np.arange(n, dtype=float)
+        opens = df['Open'].to_numpy(dtype=float)
+        highs = df['High'].to_numpy(dtype=float)
+        lows = df['Low'].to_numpy(dtype=float)
+        closes = df['Close'].to_numpy(dtype=float)
+        volumes = df['Volume'].to_numpy(dtype=float)
+        self.dates = df.index
+        self.date_format = chart_data.get('date_format', '%b %d')
+
+        # Candles: one wick segment and one body rectangle per bar
+        self.wicks.set_segments(np.stack(
+            [np.column_stack([x, lows]), np.column_stack([x, highs])], axis=1))
+        self.bodies.set_verts(_bars(x, opens, closes, CANDLE_WIDTH))
+        up = closes >= opens
+        body_colors = np.where(up, self.candle_colors[1], self.candle_colors[0])
+        self.bodies.set_facecolors(body_colors)
+        self.bodies.set_edgecolors(body_colors)
+        self.bodies.set_alpha(self.alpha)
+
+        # Volume is coloured by close against the previous close, like
+        # mplfinance's yahoo style
+        self.volume.set_verts(_bars(x, np.zeros(n), volumes, VOLUME_WIDTH))
+        volume_up = np.concatenate([[True], closes[1:] >= closes[:-1]])
+        volume_colors = np.where(volume_up, self.volume_colors[1], self.volume_colors[0])
+        self.volume.set_facecolors(volume_colors)
+        self.volume.set_edgecolors(volume_colors)
+        self.volume.set_alpha(self.alpha)
+
+        for line, series in zip(self.ma_lines, chart_data['moving_averages']):
+            line.set_data(x, series.to_numpy(dtype=float))
+        rs = df['RS Ratio'].to_numpy(dtype=float)
+        self.rs_line.set_data(x, rs)
+
+        # Same padding as the mpf.plot call: five calendar days past the last bar
+        self.ax_main.set_xlim(-1, n + 3)
+        self.ax_main.set_ylim(*chart_data['ylim'])
+        self.ax_rs.set_ylim(*_padded(np.nanmin(rs), np.nanmax(rs)))
+        self.ax_volume.set_ylim(0, np.nanmax(volumes) * 1.05 if n else 1)
+        return self.fig
+
+
+def _bars(x, bottoms, tops, width):
+    # (n, 4, 2) rectangle vertices centred on x
+    left, right = x - width / 2, x + width / 2
+    return np.stack([np.column_stack([left, bottoms]), np.column_stack([left, tops]),
+                     np.column_stack([right, tops]), np.column_stack([right, bottoms])],
+                    axis=1)
+
+
+def _padded(low, high, pad=0.05):
+    span = (high - low) or abs(high) or 1.0
+    return low - span * pad, high + span * pad
+
+
+class ChartTemplatePool:
+    # Hands each concurrent render its own template; templates are returned
+    # to the pool and reused by later requests in the same container. The
+    # layout a template was built for is part of its key: for chart templates
+    # that is the set of moving-average labels (one per timeframe), for other
+    # factories whatever they take (e.g. a compare grid's panel count).
+
+    def __init__(self, factory=None):
+        self.factory = factory or ChartTemplate
+        self._free = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, layout=MOVING_AVERAGES):
+        key = tuple(layout) if isinstance(layout, list) else layout
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            template = free.pop() if free else None
+        if template is None:
+            # rc_context mutates global rcParams, so build one at a time
+            with _build_lock:
+                template = self.factory(key)
+        try:
+            yield template
+        finally:
+            with self._lock:
+                self._free[key].append(template)
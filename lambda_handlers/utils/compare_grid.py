@@ -0,0 +1,195 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.chart_template import CANDLE_LINEWIDTH, CANDLE_WIDTH, WINDOW, _bars, _padded, chart_style
+from utils.mpl_utils import load_matplotlib
+
+# /compare: several tickers in one image. Each panel holds a ticker's
+# candles and its performance relative to SPY, rebased to 0% at the start
+# of the window. All panels share the x axis and the relative scale, so the
+# lines can be compared across panels at a glance.
+
+# A 3x3 grid is as dense as a 15x10 image stays readable
+MAX_PANELS = 9
+
+
+def grid_shape(panels):
+    # (rows, columns) for a number of panels
+    cols = 1 if panels == 1 else 2 if panels <= 4 else 3
+    return -(-panels // cols), cols
+
+
+def prepare_compare_data(frames, window=WINDOW, date_format='%b %d'):
+    # `frames` maps each symbol to its chart frame (bars joined with the SPY
+    # close). Panels are placed on the last `window` dates of all the frames
+    # together; a ticker without a bar on one of them has a gap there.
+    # Tickers with no bar inside the window are left out.
+    dates = pd.DatetimeIndex(np.unique(np.concatenate(
+        [frame.index.values for frame in frames.values()])))[-window:]
+
+    panels = []
+    for symbol, frame in frames.items():
+        rows = frame.reindex(dates)
+        closes = rows['Close'].to_numpy(dtype=float)
+        rs = closes / rows['SPY Close'].to_numpy(dtype=float)
+        valid = np.flatnonzero(np.isfinite(rs))
+        if not len(valid):
+            continue
+        first, last = valid[0], valid[-1]
+        relative = (rs / rs[first] - 1) * 100
+        panels.append({
+            'symbol': symbol,
+            'opens': rows['Open'].to_numpy(dtype=float),
+            'highs': rows['High'].to_numpy(dtype=float),
+            'lows': rows['Low'].to_numpy(dtype=float),
+            'closes': closes,
+            'relative': relative,
+            'close': closes[last],
+            'change_pct': (closes[last] / closes[first] - 1) * 100,
+            'relative_pct': relative[last],
+            # Same padding as the single charts
+            'ylim': (np.nanmin(rows[['Low', 'Close']].to_numpy(dtype=float)) * 0.95,
+                     np.nanmax(rows[['High', 'Close']].to_numpy(dtype=float)) * 1.05),
+        })
+
+    relative = np.concatenate([panel['relative'] for panel in panels]) if panels else np.zeros(1)
+    return {
+        'dates': dates,
+        'panels': panels,
+        'date_format': date_format,
+        'relative_ylim': _padded(np.nanmin(relative), np.nanmax(relative)),
+    }
+
+
+class CompareTemplate:
+    # A pre-laid-out grid of `panels` price panels, reused like ChartTemplate:
+    # each render only swaps artist data. Every panel's axes time their own
+    # Agg draw, so the cost of each panel is known after the figure is
+    # encoded (see panel_ms).
+
+    def __init__(self, panels):
+        matplotlib = load_matplotlib()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection, PolyCollection
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+        style = chart_style()
+        colors = style['marketcolors']
+        self.alpha = colors['alpha']
+        self.candle_colors = (colors['candle']['down'], colors['candle']['up'])
+        rows, cols = grid_shape(panels)
+
+        self.axes, self.twins, self.wicks, self.bodies = [], [], [], []
+        self.relative_lines, self.labels = [], []
+        with matplotlib.rc_context(style['rc']):
+            fig = Figure(figsize=(15, 10), facecolor=style['facecolor'])
+            FigureCanvasAgg(fig)
+            grid = fig.add_gridspec(rows, cols, hspace=0.12, wspace=0.16)
+            for i in range(panels):
+                ax = fig.add_subplot(grid[i // cols, i % cols],
+                                     sharex=self.axes[0] if self.axes else None)
+                ax.set_facecolor(style['facecolor'])
+                ax.grid(True, color=style['gridcolor'], linestyle=style['gridstyle'])
+                ax.set_axisbelow(True)
+                ax.tick_params(labelsize=style['rc']['font.size'],
+                               colors=style['rc']['xtick.color'])
+                # Only the bottom panel of each column labels the dates
+                if i + cols < panels:
+                    ax.tick_params(axis='x', labelbottom=False)
+
+                # Relative performance on the left, price on the right;
+                # twinx moves the host's ticks to the left, so set both after
+                twin = ax.twinx()
+                ax.yaxis.tick_right()
+                twin.yaxis.tick_left()
+                twin.tick_params(labelsize=style['rc']['font.size'],
+                                 colors=style['rc']['xtick.color'])
+                twin.yaxis.set_major_locator(MaxNLocator(nbins=4))
+                twin.yaxis.set_major_formatter(FuncFormatter(lambda v, pos: f'{v:+.0f}%'))
+                twin.axhline(0, color=style['gridcolor'], linewidth=1, linestyle='--')
+
+                wicks = LineCollection([], colors=colors['wick']['up'], linewidths=CANDLE_LINEWIDTH)
+                bodies = PolyCollection([], linewidths=CANDLE_LINEWIDTH)
+                ax.add_collection(wicks)
+                ax.add_collection(bodies)
+                self.relative_lines.append(
+                    twin.plot([], [], color='#000', linewidth=1, label='vs SPY')[0])
+                self.labels.append(ax.text(0.01, 0.97, '', transform=ax.transAxes,
+                                           ha='left', va='top', fontsize=10,
+                                           fontweight='bold'))
+
+                for artist in (ax, twin):
+                    artist.draw = self._timed_draw(i, artist.draw)
+                self.axes.append(ax)
+                self.twins.append(twin)
+                self.wicks.append(wicks)
+                self.bodies.append(bodies)
+
+            # Shared by every panel through sharex
+            self.dates = []
+            self.date_format = '%b %d'
+            self.axes[0].xaxis.set_major_locator(MaxNLocator(nbins=6, integer=True))
+            self.axes[0].xaxis.set_major_formatter(FuncFormatter(self._format_date))
+
+            fig.subplots_adjust(left=0.05, right=0.95, top=0.95, bottom=0.06)
+
+        self.fig = fig
+        self.symbols = [''] * panels
+        self.update_ms = [0.0] * panels
+        self.draw_ms = [0.0] * panels
+
+    def _timed_draw(self, i, draw):
+        def timed(renderer, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return draw(renderer, *args, **kwargs)
+            finally:
+                self.draw_ms[i] += (time.perf_counter() - start) * 1000
+        return timed
+
+    def _format_date(self, x, pos=None):
+        i = int(round(x))
+        if 0 <= i < len(self.dates):
+            return self.dates[i].strftime(self.date_format)
+        return ''
+
+    def render(self, compare_data):
+        n = len(compare_data['dates'])
+        x = np.arange(n, dtype=float)
+        self.dates = compare_data['dates']
+        self.date_format = compare_data['date_format']
+
+        for i, panel in enumerate(compare_data['panels']):
+            start = time.perf_counter()
+            bar = np.isfinite(panel['closes'])
+            bar_x, opens, closes = x[bar], panel['opens'][bar], panel['closes'][bar]
+            self.wicks[i].set_segments(np.stack(
+                [np.column_stack([bar_x, panel['lows'][bar]]),
+                 np.column_stack([bar_x, panel['highs'][bar]])], axis=1))
+            self.bodies[i].set_verts(_bars(bar_x, opens, closes, CANDLE_WIDTH))
+            body_colors = np.where(closes >= opens, self.candle_colors[1], self.candle_colors[0])
+            self.bodies[i].set_facecolors(body_colors)
+            self.bodies[i].set_edgecolors(body_colors)
+            self.bodies[i].set_alpha(self.alpha)
+
+            self.relative_lines[i].set_data(x, panel['relative'])
+            self.labels[i].set_text(f'{panel["symbol"]}  ${panel["close"]:.2f}  '
+                                    f'{panel["change_pct"]:+.1f}%  '
+                                    f'({panel["relative_pct"]:+.1f}% vs SPY)')
+            self.axes[i].set_ylim(*panel['ylim'])
+            self.twins[i].set_ylim(*compare_data['relative_ylim'])
+            self.symbols[i] = panel['symbol']
+            self.update_ms[i] = (time.perf_counter() - start) * 1000
+
+        self.axes[0].set_xlim(-1, n + 3)
+        self.draw_ms = [0.0] * len(self.axes)
+        return self.fig
+
+    def panel_ms(self):
+        # Per panel time of the last render: swapping its data plus drawing
+        # its axes. Complete once the figure has been drawn (encoded).
+        return {symbol: round(update + draw, 3)
+                for symbol, update, draw in zip(self.symbols, self.update_ms, self.draw_ms)}
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+import requests
+
+from utils.fetch_utils import make_session, connect_timeout, read_timeout
+from utils.metrics_utils import stage
+
+api_base = os.environ.get('DISCORD_API_BASE', 'https://discord.com/api/v10')
+
+# Discord allows up to 10 embeds per message
+MAX_EMBEDS = 10
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def make_discord_session():
+    # Webhook posts are not idempotent: a 5xx or a read timeout can come
+    # after Discord created the message, and a retry would post it again.
+    # Only 429s, which Discord answers before creating anything, and
+    # failed connections are retried.
+    return make_session(methods=('POST', 'PATCH'), statuses=(429,), read_retries=0)
+
+
+def get_session():
+    # Kept apart from the FMP session, whose retries are for GETs
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = make_discord_session()
+    return _session
+
+
+def webhook_url(appid, token):
+    return f'{api_base}/webhooks/{appid}/{token}'
+
+
+def _response(response):
+    print(response.text)  # Print the response from Discord API
+    return {
+        'statusCode': response.status_code,
+        'body': response.text
+    }
+
+
+def post_message(payload, appid, token, wait=False, session=None):
+    # With wait=True Discord returns the created message, whose id is needed
+    # to edit it later
+    try:
+        with stage('discord_post'):
+            response = (session or get_session()).post(
+                webhook_url(appid, token),
+                params={'wait': 'true'} if wait else None,
+                json=payload,
+                timeout=(connect_timeout, read_timeout))
+    except requests.exceptions.RequestException as e:
+        print('Error posting to Discord:', e)
+        return {'statusCode': None, 'body': str(e)}
+    return _response(response)
+
+
+def edit_message(payload, appid, token, message_id, session=None):
+    try:
+        with stage('discord_edit'):
+            response = (session or get_session()).patch(
+                f'{webhook_url(appid, token)}/messages/{message_id}',
+                json=payload,
+                timeout=(connect_timeout, read_timeout))
+    except requests.exceptions.RequestException as e:
+        print('Error editing Discord message:', e)
+        return {'statusCode': None, 'body': str(e)}
+    return _response(response)
+
+
+def message_id(response):
+    # Id of the message created by a post_message(..., wait=True) call
+    if response['statusCode'] != 200:
+        return None
+    try:
+        return json.loads(response['body']).get('id')
+    except ValueError:
+        return None
+
+
+def send_embeds_to_discord(embeds, appid, token, wait=False, session=None):
+    return [post_message({'embeds': embeds[i:i + MAX_EMBEDS]}, appid, token,
+                         wait=wait, session=session)
+            for i in range(0, len(embeds), MAX_EMBEDS)]
+
+
+def send_embed_to_discord(embed, appid, token):
+    return send_embeds_to_discord([embed], appid, token)[0]
+
+
+def send_markdown_to_discord(markdown_str, appid, token):
+    return post_message(markdown_str, appid, token)
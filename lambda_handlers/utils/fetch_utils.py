@@ -0,0 +1,98 @@
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.metrics_utils import count, stage
+
+base_url = os.environ.get('FMP_BASE_URL', 'https://financialmodelingprep.com/api/v3')
+api_key = os.environ.get('FMP_API_KEY')
+
+# (connect, read) timeouts in seconds, kept well inside the 30s Lambda budget
+connect_timeout = float(os.environ.get('FMP_CONNECT_TIMEOUT', '3.05'))
+read_timeout = float(os.environ.get('FMP_READ_TIMEOUT', '10'))
+max_retries = int(os.environ.get('FMP_MAX_RETRIES', '2'))
+backoff_factor = float(os.environ.get('FMP_BACKOFF_FACTOR', '0.3'))
+pool_size = int(os.environ.get('FMP_POOL_SIZE', '10'))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def make_session(retries=None, backoff=None, pool_maxsize=None, methods=('GET',),
+                 statuses=(429, 500, 502, 503, 504), read_retries=None):
+    # Retries `methods` on `statuses` and on connection errors; FMP's GETs
+    # are safe to repeat on anything
+    retry = Retry(total=max_retries if retries is None else retries,
+                  read=read_retries,
+                  backoff_factor=backoff_factor if backoff is None else backoff,
+                  status_forcelist=statuses,
+                  allowed_methods=frozenset(methods),
+                  raise_on_status=False)
+    size = pool_size if pool_maxsize is None else pool_maxsize
+    adapter = HTTPAdapter(max_retries=retry,
+                          pool_connections=size, pool_maxsize=size)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    # One keep-alive session per container, so warm invocations skip the
+    # TLS handshake
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def reset_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def default_from_date(days=365):
+    return (datetime.datetime.now() -
+            datetime.timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def fetch_data_from_api(ticker, from_date=None, session=None, timeout=None):
+    try:
+        if from_date is None:
+            from_date = default_from_date()
+        url = f'{base_url}/historical-price-full/{ticker}'
+        with stage('fmp_http'):
+            response = (session or get_session()).get(
+                url,
+                params={'apikey': api_key, 'from': from_date},
+                timeout=timeout or (connect_timeout, read_timeout))
+        count('fmp_requests')
+        count('fmp_bytes', len(response.content))
+        if response.status_code == 200:
+            return response.json()
+        else:
+            response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print("Error fetching data:", ticker, e)
+        return None
+
+
+def fetch_concurrently(fetch_fn, keys, max_workers=None):
+    # Runs fetch_fn(key) for every key in parallel and returns the results in
+    # the same order as keys
+    keys = list(keys)
+    if not keys:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers or len(keys)) as executor:
+        return list(executor.map(fetch_fn, keys))
@@ -0,0 +1,206 @@
+import os
+import random
+import threading
+import time
+
+import requests
+
+from utils import fetch_utils
+from utils.metrics_utils import count, stage
+
+# FMP client for the handlers: a token bucket keeps bursts under the plan's
+# rate limit, 429/5xx are retried with jittered backoff, concurrent
+# /historical-price-full calls for the same start date share one
+# comma-separated request, and once the quota is exhausted calls fail fast
+# so callers serve what they have on file. Failures return None, like
+# fetch_data_from_api.
+#
+# The bucket is per container; with several containers running, set
+# FMP_RATE_LIMIT to the plan's limit divided by the expected concurrency.
+
+rate_limit = float(os.environ.get('FMP_RATE_LIMIT', '5'))
+burst = int(os.environ.get('FMP_BURST', '10'))
+batch_size = int(os.environ.get('FMP_BATCH_SIZE', '5'))
+# Seconds calls fail fast after FMP keeps answering 429
+quota_cooldown = float(os.environ.get('FMP_QUOTA_COOLDOWN', '60'))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    # `rate` tokens per second, at most `capacity` saved up
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        # Takes a token, waiting for one if needed; False if that would take
+        # longer than `timeout` seconds
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if timeout is not None:
+                if wait > timeout:
+                    return False
+                timeout -= wait
+            self.sleep(wait)
+
+
+class _Batcher:
+    # Gathers concurrent calls with the same key for `window` seconds (or
+    # until `size` of them) and makes one fetch_many call for all of them
+
+    def __init__(self, fetch_many, size, window):
+        self.fetch_many = fetch_many
+        self.size = size
+        self.window = window
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def submit(self, symbol, key):
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None or len(batch['symbols']) >= self.size
+            if leader:
+                batch = self._open[key] = {'symbols': [], 'results': {},
+                                           'done': threading.Event()}
+            batch['symbols'].append(symbol)
+        if not leader:
+            batch['done'].wait()
+            return batch['results'].get(symbol)
+
+        time.sleep(self.window)
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+        try:
+            batch['results'] = self.fetch_many(batch['symbols'], key)
+        finally:
+            batch['done'].set()
+        return batch['results'].get(symbol)
+
+
+class FmpClient:
+
+    def __init__(self, rate=None, capacity=None, max_retries=3, backoff=0.5, max_backoff=8.0,
+                 acquire_timeout=5.0, batch=None, batch_window=0.01, cooldown=None,
+                 session=None, sleep=time.sleep):
+        self.bucket = TokenBucket(rate or rate_limit, capacity or burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.acquire_timeout = acquire_timeout
+        self.cooldown = quota_cooldown if cooldown is None else cooldown
+        self.sleep = sleep
+        self.exhausted_until = 0.0
+        self._session = session
+        batch = batch_size if batch is None else batch
+        self._batcher = _Batcher(self._historical_many, batch, batch_window) if batch > 1 else None
+
+    @property
+    def session(self):
+        # Retries are done here, with jitter, so the session does none
+        if self._session is None:
+            self._session = fetch_utils.make_session(retries=0)
+        return self._session
+
+    def _delay(self, attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # Full jitter, so throttled callers do not retry in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, path, params=None):
+        # JSON body of a GET on `path`, or None
+        if time.monotonic() < self.exhausted_until:
+            count('fmp_quota_skipped')
+            return None
+        params = dict(params or {}, apikey=fetch_utils.api_key)
+        url = f'{fetch_utils.base_url}/{path}'
+        for attempt in range(self.max_retries + 1):
+            with stage('fmp_rate_wait'):
+                acquired = self.bucket.acquire(self.acquire_timeout)
+            if not acquired:
+                count('fmp_rate_limited')
+                print('FMP rate limit, giving up on', path)
+                return None
+
+            response = None
+            try:
+                with stage('fmp_http'):
+                    response = self.session.get(
+                        url, params=params,
+                        timeout=(fetch_utils.connect_timeout, fetch_utils.read_timeout))
+                count('fmp_requests')
+                count('fmp_bytes', len(response.content))
+                if response.status_code == 200:
+                    return response.json()
+                status = response.status_code
+            except requests.exceptions.RequestException as e:
+                print('Error fetching data:', path, e)
+                status = None
+
+            if status == 429:
+                count('fmp_throttled')
+            if status is not None and status not in RETRY_STATUSES:
+                print('Error fetching data:', path, status)
+                return None
+            if attempt == self.max_retries:
+                break
+            count('fmp_retries')
+            self.sleep(self._delay(attempt, response))
+
+        if response is not None and response.status_code == 429:
+            # Still throttled after backing off: treat the quota as spent
+            # and let callers fall back to stale data for a while
+            self.exhausted_until = time.monotonic() + self.cooldown
+            count('fmp_quota_exhausted')
+            print(f'FMP quota exhausted, skipping calls for {self.cooldown:.0f}s')
+        return None
+
+    def _historical_many(self, symbols, from_date):
+        # symbol -> /historical-price-full payload (or None)
+        symbols = list(dict.fromkeys(symbols))
+        payload = self.get(f'historical-price-full/{",".join(symbols)}', {'from': from_date})
+        if payload is None:
+            return {}
+        if len(symbols) == 1:
+            return {symbols[0]: payload if 'historical' in payload else None}
+        count('fmp_batched_symbols', len(symbols))
+        return {item['symbol']: item for item in payload.get('historicalStockList', [])}
+
+    def historical(self, ticker, from_date=None):
+        # Same result as fetch_data_from_api
+        from_date = from_date or fetch_utils.default_from_date()
+        if self._batcher is None:
+            return self._historical_many([ticker], from_date).get(ticker)
+        return self._batcher.submit(ticker, from_date)
+
+    def intraday(self, ticker, interval, from_date, to_date=None):
+        # /historical-chart/<interval> returns a bare list of bars, newest
+        # first; wrapped like /historical-price-full so both parse the same way
+        params = {'from': from_date}
+        if to_date is not None:
+            params['to'] = to_date
+        rows = self.get(f'historical-chart/{interval}/{ticker}', params)
+        return None if rows is None else {'symbol': ticker, 'historical': rows}
+
+
+def make_fmp_client():
+    return FmpClient()
@@ -0,0 +1,72 @@
+import os
+from io import BytesIO
+
+# Formats Discord renders inline in an embed: (file extension, content type)
+FORMATS = {
+    'png': ('png', 'image/png'),
+    'webp': ('webp', 'image/webp'),
+    'jpeg': ('jpg', 'image/jpeg'),
+}
+# Other spellings accepted in CHART_FORMAT
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+
+def format_name(value):
+    # CHART_FORMAT value -> a FORMATS key; fails at init rather than on
+    # every request
+    fmt = value.strip().lower()
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported CHART_FORMAT {value!r}, use one of: {", ".join(FORMATS)}')
+    return fmt
+
+
+def output_config_from_env():
+    return {
+        'fmt': format_name(os.environ.get('CHART_FORMAT', 'png')),
+        # WebP/JPEG quality (100 means lossless for WebP)
+        'quality': int(os.environ.get('CHART_QUALITY', '85')),
+        # zlib level for PNG, 1 is fastest, 9 smallest
+        'compress_level': int(os.environ.get('CHART_PNG_COMPRESS_LEVEL', '6')),
+        # Quantize PNGs to this many palette colours, 0 keeps full RGBA
+        'colors': int(os.environ.get('CHART_PNG_COLORS', '0')),
+    }
+
+
+def file_extension(fmt):
+    return FORMATS[fmt][0]
+
+
+def _figure_image(fig):
+    # Draw once and wrap the canvas' RGBA buffer without copying it
+    from PIL import Image
+    fig.canvas.draw()
+    width, height = fig.canvas.get_width_height(physical=True)
+    return Image.frombuffer('RGBA', (width, height), fig.canvas.buffer_rgba(),
+                            'raw', 'RGBA', 0, 1)
+
+
+def encode_figure(fig, fmt='png', quality=85, compress_level=6, colors=0):
+    # Returns (buffer positioned at 0, content type)
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported chart format: {fmt}')
+    buf = BytesIO()
+
+    if fmt == 'png' and not colors:
+        fig.savefig(buf, format='png',
+                    pil_kwargs={'compress_level': compress_level})
+    else:
+        image = _figure_image(fig)
+        if fmt == 'png':
+            # Charts use a handful of flat colours, so a palette loses little
+            image = image.convert('RGB').quantize(colors=colors)
+            image.save(buf, format='PNG', compress_level=compress_level)
+        elif fmt == 'webp':
+            image.save(buf, format='WEBP', quality=quality,
+                       lossless=quality >= 100, method=4)
+        else:
+            image.convert('RGB').save(buf, format='JPEG', quality=quality,
+                                      optimize=True)
+
+    buf.seek(0)
+    return buf, FORMATS[fmt][1]
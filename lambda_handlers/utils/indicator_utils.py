@@ -1,3 +1,9 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
 
 def calculate_adrp(df, n):
     last_n_rows = df.iloc[-n:]
@@ -25,3 +31,283 @@ def calculate_change_last_two_prices(df):
     percentage_change = (absolute_change / last_two_prices.iloc[0]) * 100
 
     return absolute_change, percentage_change
+
+
+def calculate_change_from_previous_session(df):
+    # Intraday bars: the last price against the previous session's last
+    # close, which is what a quote shows as the day's change
+    days = df.index.normalize()
+    previous = df['Close'][days < days[-1]]
+    if not len(previous):
+        return calculate_change_last_two_prices(df)
+    absolute_change = df['Close'].iloc[-1] - previous.iloc[-1]
+    return absolute_change, (absolute_change / previous.iloc[-1]) * 100
+
+
+# Incremental indicator engine
+#
+# Each indicator computes its values for rows [start, stop) of a date-indexed
+# frame (OHLCV plus the benchmark close), reading earlier rows for its
+# lookback and carrying any recursive value (EMA, ATR) in a small state. The
+# engine keeps the state as of the second to last bar, since the last bar may
+# still be revised intraday, so the next request only computes the bars that
+# arrived since. Indicators get the frame's columns as float arrays, taken
+# once per run, so a run that only adds a bar or two stays cheap.
+
+INDICATOR_TYPES = {}
+
+
+def register_indicator(kind):
+    def register(cls):
+        INDICATOR_TYPES[kind] = cls
+        return cls
+    return register
+
+
+def _ewm(values, alpha, seed=None):
+    # pandas' adjust=False recursion, optionally continuing from `seed`
+    if seed is not None and len(values) <= 32:
+        # A few new bars: a plain loop beats building a Series
+        out = np.empty(len(values))
+        prev = seed
+        for i, value in enumerate(values):
+            prev = prev if np.isnan(value) else prev + alpha * (value - prev)
+            out[i] = prev
+        return out
+    if seed is not None:
+        values = np.concatenate([[seed], values])
+    out = pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return out[1:] if seed is not None else out
+
+
+def _rolling(values, window, how, min_periods=None):
+    # pandas' rolling mean/max, NaN until `min_periods` (default: `window`)
+    # values are in
+    min_periods = window if min_periods is None else min_periods
+    if len(values) > 4 * window:
+        rolling = pd.Series(values).rolling(window=window, min_periods=min_periods)
+        return getattr(rolling, how)().to_numpy()
+    # Short slices, the common incremental case: skip building a Series
+    out = np.full(len(values), np.nan)
+    if len(values) < min_periods:
+        return out
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    counts = np.arange(1, len(values) + 1).clip(max=window)
+    ready = counts >= min_periods
+    reduce = np.nanmean if how == 'mean' else np.nanmax
+    out[ready] = reduce(windows[ready], axis=1)
+    return out
+
+
+@register_indicator('sma')
+class SMA:
+
+    def __init__(self, window, column='Close'):
+        self.window = window
+        self.column = column
+
+    def compute(self, columns, start, stop, state):
+        lo = max(0, start - self.window + 1)
+        means = _rolling(columns[self.column][lo:stop], self.window, 'mean')
+        return means[start - lo:], None
+
+
+@register_indicator('ema')
+class EMA:
+
+    def __init__(self, span, column='Close'):
+        self.alpha = 2.0 / (span + 1)
+        self.column = column
+
+    def compute(self, columns, start, stop, state):
+        values = columns[self.column][start:stop]
+        if len(values) == 0:
+            return values, state
+        ema = _ewm(values, self.alpha, seed=state)
+        return ema, float(ema[-1])
+
+
+@register_indicator('rs')
+class RSRatio:
+
+    def __init__(self, benchmark='SPY Close'):
+        self.benchmark = benchmark
+
+    def compute(self, columns, start, stop, state):
+        return columns['Close'][start:stop] / columns[self.benchmark][start:stop], None
+
+
+@register_indicator('rs_new_high')
+class RSNewHigh:
+    # 1.0 where the RS line makes a new `lookback`-bar high
+
+    def __init__(self, lookback=252, benchmark='SPY Close'):
+        self.lookback = lookback
+        self.benchmark = benchmark
+
+    def compute(self, columns, start, stop, state):
+        lo = max(0, start - self.lookback + 1)
+        rs = columns['Close'][lo:stop] / columns[self.benchmark][lo:stop]
+        highs = _rolling(rs, self.lookback, 'max', min_periods=1)
+        return (rs >= highs).astype(float)[start - lo:], None
+
+
+@register_indicator('adrp')
+class ADRP:
+    # Series form of calculate_adrp: mean high-low range of the last n bars
+    # as a percentage of the close
+
+    def __init__(self, n=20):
+        self.n = n
+
+    def compute(self, columns, start, stop, state):
+        lo = max(0, start - self.n + 1)
+        ranges = columns['High'][lo:stop] - columns['Low'][lo:stop]
+        mean_range = _rolling(ranges, self.n, 'mean', min_periods=1)
+        return mean_range[start - lo:] / columns['Close'][start:stop] * 100, None
+
+
+@register_indicator('atr')
+class ATR:
+    # Wilder's average true range
+
+    def __init__(self, n=14):
+        self.alpha = 1.0 / n
+
+    def compute(self, columns, start, stop, state):
+        if stop <= start:
+            return np.empty(0), state
+        lo = max(0, start - 1)
+        highs = columns['High'][start:stop]
+        lows = columns['Low'][start:stop]
+        prev_close = columns['Close'][lo:stop - 1]
+        if start == 0:
+            prev_close = np.concatenate([[np.nan], prev_close])
+        true_range = np.fmax(highs - lows, np.fmax(np.abs(highs - prev_close),
+                                                  np.abs(lows - prev_close)))
+        atr = _ewm(true_range, self.alpha, seed=state)
+        return atr, float(atr[-1])
+
+
+# Indicators computed for every chart: output column -> (kind, parameters).
+# Adding one here is all it takes to have the engine maintain it.
+CHART_INDICATORS = {
+    'sma_50': ('sma', {'window': 50}),
+    'ema_10': ('ema', {'span': 10}),
+    'ema_21': ('ema', {'span': 21}),
+    'rs': ('rs', {}),
+    'rs_new_high': ('rs_new_high', {'lookback': 252}),
+    'adrp_20': ('adrp', {'n': 20}),
+    'atr_14': ('atr', {'n': 14}),
+}
+
+
+class _Columns(dict):
+    # Frame columns as float64 arrays, converted the first time an
+    # indicator asks for one, so unused (e.g. Open) columns are never copied
+
+    def __init__(self, frame):
+        super().__init__()
+        self.frame = frame
+
+    def __missing__(self, name):
+        values = self[name] = self.frame[name].to_numpy(dtype=float)
+        return values
+
+
+class IndicatorEngine:
+
+    def __init__(self, specs=None, keep=260):
+        specs = CHART_INDICATORS if specs is None else specs
+        self.indicators = {name: INDICATOR_TYPES[kind](**params)
+                           for name, (kind, params) in specs.items()}
+        self.signature = repr(sorted(specs.items()))
+        # Values kept per indicator, enough for any chart window
+        self.keep = keep
+
+    def _resume(self, frame, state):
+        # (first row to compute, prior values, prior states) from a saved state
+        if not state or state.get('signature') != self.signature:
+            return 0, {}, {}
+        as_of = pd.Timestamp(state['as_of'])
+        pos = frame.index.searchsorted(as_of)
+        if pos >= len(frame) or frame.index[pos] != as_of:
+            return 0, {}, {}
+        # A different bar at as_of means the history was revised (e.g. a
+        # split), so the saved values no longer apply
+        if not np.allclose(frame.iloc[pos].to_numpy(dtype=float), state['bar'], equal_nan=True):
+            return 0, {}, {}
+        prior = {name: np.asarray(values, dtype=float)[-(pos + 1):]
+                 for name, values in state['values'].items()}
+        return pos + 1, prior, state['states']
+
+    def run(self, frame, state=None):
+        # Returns (indicator frame for the last rows of `frame`, new state)
+        n = len(frame)
+        start, prior, states = self._resume(frame, state)
+        # Rows before `split` are final; the last bar is recomputed each run
+        split = max(start, n - 1)
+
+        columns = _Columns(frame)
+        values, new_states = {}, {}
+        for name, indicator in self.indicators.items():
+            final, new_states[name] = indicator.compute(
+                columns, start, split, states.get(name))
+            last, _ = indicator.compute(columns, split, n, new_states[name])
+            values[name] = np.concatenate(
+                [prior.get(name, np.empty(0)), final, last])[-self.keep:]
+
+        rows = min((len(v) for v in values.values()), default=0)
+        result = pd.DataFrame({name: v[len(v) - rows:] for name, v in values.items()},
+                              index=frame.index[n - rows:])
+
+        new_state = None
+        if split > 0:
+            new_state = {
+                'signature': self.signature,
+                # Full timestamp, so intraday bars resume too
+                'as_of': frame.index[split - 1].isoformat(),
+                'bar': frame.iloc[split - 1].to_numpy(dtype=float),
+                # float64 arrays (a Python float list is about four times
+                # the size); copies, so the slices do not pin the full runs
+                'values': {name: v[:len(v) - (n - split)].copy() for name, v in values.items()},
+                'states': new_states,
+            }
+        return result, new_state
+
+
+class IndicatorStates:
+    # IndicatorEngine states per (symbol, timeframe) for a warm container,
+    # least recently used first out once `max_entries` are held. An entry
+    # is about 15 KiB with the chart indicators.
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None:
+                self._entries.move_to_end(key)
+            return state
+
+    def put(self, key, state):
+        with self._lock:
+            if state is None:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
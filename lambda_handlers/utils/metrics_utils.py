@@ -0,0 +1,188 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-invocation timing. Stages record into the active Metrics from any
+# thread; the handler starts a fresh one per invocation and emits it as a
+# single CloudWatch Embedded Metric Format (EMF) log line, which CloudWatch
+# turns into metrics without any API calls.
+
+namespace = os.environ.get('METRICS_NAMESPACE', 'SsChartingBot')
+function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+
+def _unit(name):
+    if name.endswith('_ms'):
+        return 'Milliseconds'
+    if name.endswith('_bytes'):
+        return 'Bytes'
+    return 'Count'
+
+
+class Metrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # stage -> [total ms, calls]
+        self.stages = {}
+        self.counters = {}
+        self.properties = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def record(self, name, ms):
+        with self._lock:
+            entry = self.stages.setdefault(name, [0.0, 0])
+            entry[0] += ms
+            entry[1] += 1
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def mark(self, name):
+        # Time from the start of the invocation to the first call
+        with self._lock:
+            self.counters.setdefault(name + '_ms', (time.perf_counter() - self.started) * 1000)
+
+    def set(self, name, value):
+        # Searchable in the log line, but not a metric
+        with self._lock:
+            self.properties[name] = value
+
+    def values(self):
+        # Flat {metric name: value}; stage times are summed over threads, so
+        # parallel fetches can add up to more than the wall time
+        with self._lock:
+            values = {f'{name}_ms': round(total, 3)
+                      for name, (total, _) in self.stages.items()}
+            values.update((name, round(value, 3) if isinstance(value, float) else value)
+                          for name, value in self.counters.items())
+        values['total_ms'] = round((time.perf_counter() - self.started) * 1000, 3)
+        return values
+
+    def emf(self):
+        values = self.values()
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [['Function']],
+                    'Metrics': [{'Name': name, 'Unit': _unit(name)} for name in values],
+                }],
+            },
+            'Function': function_name,
+        }
+        with self._lock:
+            record.update(self.properties)
+            record['stage_calls'] = {name: calls for name, (_, calls) in self.stages.items()}
+        record.update(values)
+        return record
+
+    def emit(self):
+        print(json.dumps(self.emf()))
+
+
+_current = Metrics()
+
+
+def start_invocation():
+    global _current
+    _current = Metrics()
+    return _current
+
+
+def current():
+    return _current
+
+
+def stage(name):
+    return _current.stage(name)
+
+
+def count(name, n=1):
+    _current.count(name, n)
+
+
+def mark(name):
+    _current.mark(name)
+
+
+# Aggregation of EMF lines from a log file (a CloudWatch export or a local
+# run's output):
+#   python lambda_handlers/utils/metrics_utils.py chart.log
+
+def read_records(lines):
+    for line in lines:
+        start = line.find('{')
+        if start < 0 or '"_aws"' not in line:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and '_aws' in record:
+            yield record
+
+
+def percentile(values, q):
+    # Nearest rank
+    ordered = sorted(values)
+    rank = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def aggregate(records):
+    # {metric: {'n', 'p50', 'p95', 'p99', 'max'}} over every record
+    samples = {}
+    for record in records:
+        for metric in record['_aws']['CloudWatchMetrics'][0]['Metrics']:
+            value = record.get(metric['Name'])
+            if isinstance(value, (int, float)):
+                samples.setdefault(metric['Name'], []).append(value)
+    return {name: {'n': len(values),
+                   'p50': percentile(values, 50),
+                   'p95': percentile(values, 95),
+                   'p99': percentile(values, 99),
+                   'max': max(values)}
+            for name, values in sorted(samples.items())}
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='p50/p95/p99 per stage from EMF log lines')
+    parser.add_argument('paths', nargs='*', help='log files, stdin when omitted')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    records = []
+    for path in args.paths or ['-']:
+        f = sys.stdin if path == '-' else open(path)
+        with f:
+            records.extend(read_records(f))
+    summary = aggregate(records)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f'{len(records)} invocations')
+    print(f'{"metric":<28}{"n":>6}{"p50":>12}{"p95":>12}{"p99":>12}{"max":>12}')
+    for name, row in summary.items():
+        print(f'{name:<28}{row["n"]:>6}' +
+              ''.join(f'{row[k]:>12.1f}' for k in ('p50', 'p95', 'p99', 'max')))
+
+
+if __name__ == '__main__':
+    main()
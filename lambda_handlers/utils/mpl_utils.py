@@ -0,0 +1,22 @@
+# matplotlib and mplfinance make up most of the handler's import time, so
+# they are only loaded by the first render in a container. Invocations served
+# from the chart cache never import them.
+
+
+def load_matplotlib():
+    import matplotlib
+    # Select Agg before anything imports pyplot, so no GUI backend is probed
+    matplotlib.use('Agg')
+    return matplotlib
+
+
+def load_mplfinance():
+    load_matplotlib()
+    import mplfinance
+    return mplfinance
+
+
+def load_pyplot():
+    load_matplotlib()
+    import matplotlib.pyplot
+    return matplotlib.pyplot
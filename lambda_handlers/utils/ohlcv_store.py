@@ -0,0 +1,133 @@
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from utils.blob_store import LocalBlobStore, make_blob_store
+from utils.parse_utils import PRICE_DTYPE, VOLUME_DTYPE, parse_ohlcv
+from utils.metrics_utils import count, stage
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class OhlcvStore:
+    # Daily bars per ticker, kept as compressed NumPy archives in a blob store
+    # so each request only asks FMP for the bars after the last stored one.
+    # Any object with get(key) and put(key, body, content_type) works as the
+    # backend; LocalBlobStore covers tests and offline runs.
+
+    def __init__(self, store, fetch_fn, prefix='ohlcv/'):
+        self.store = store
+        self.fetch_fn = fetch_fn
+        self.prefix = prefix
+
+    def _key(self, ticker):
+        return f'{self.prefix}{ticker.upper()}.npz'
+
+    def tickers(self):
+        # Every ticker with bars on file
+        return sorted(key[len(self.prefix):-len('.npz')]
+                      for key in self.store.list(self.prefix) if key.endswith('.npz'))
+
+    def load_columns(self, ticker, columns=COLUMNS):
+        # Returns (dates as datetime64[ns], {column: array}, first requested
+        # date) or None, without building a frame
+        with stage('ohlcv_load'):
+            body = self.store.get(self._key(ticker))
+        if body is None:
+            return None
+        archive = np.load(BytesIO(body))
+        # Seconds since the epoch, so intraday bars fit too; older files
+        # hold days
+        unit = str(archive['date_unit']) if 'date_unit' in archive.files else 'D'
+        dates = archive['date'].astype(f'datetime64[{unit}]').astype('datetime64[ns]')
+        # float32 prices were rounded when written (see PRICE_DTYPE): treat
+        # the file as missing so the bars are fetched again
+        if archive['close'].dtype == np.float32:
+            return None
+        values = {name: archive[name.lower()].astype(
+                      VOLUME_DTYPE if name == 'Volume' else PRICE_DTYPE, copy=False)
+                  for name in columns}
+        return dates, values, str(archive['start'])
+
+    def load(self, ticker):
+        # Returns (frame, first requested date) or (None, None)
+        loaded = self.load_columns(ticker)
+        if loaded is None:
+            return None, None
+        dates, values, start = loaded
+        return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name='Date')), start
+
+    def save(self, ticker, df, start):
+        buf = BytesIO()
+        np.savez_compressed(
+            buf,
+            date=df.index.values.astype('datetime64[s]').astype(np.int64),
+            date_unit=np.array('s'),
+            start=np.array(start),
+            **{name.lower(): df[name].to_numpy() for name in COLUMNS})
+        with stage('ohlcv_save'):
+            self.store.put(self._key(ticker), buf.getvalue())
+
+    def _stale(self, ticker, on_file, from_date):
+        # Whatever is on file, served rather than failing the chart when FMP
+        # cannot be reached or the quota is spent
+        if on_file is None:
+            return None
+        print(f'ohlcv store {ticker}: fetch failed, serving {len(on_file)} stored bars')
+        count('ohlcv_stale')
+        return on_file[on_file.index >= pd.Timestamp(from_date)]
+
+    def update(self, ticker, from_date):
+        on_file, start = self.load(ticker)
+        stored = on_file
+
+        check_date = None
+        if stored is None or len(stored) < 2 or start > from_date:
+            # Nothing usable on file, fetch the whole window
+            fetch_from, stored, start = from_date, None, from_date
+        else:
+            # Refetch from the second to last stored bar. The last one may
+            # have been written while the session was still open; the one
+            # before it is final, so a different value there means FMP has
+            # revised the history (e.g. a split) and the file is stale.
+            check_date = stored.index[-2]
+            fetch_from = check_date.strftime('%Y-%m-%d')
+
+        payload = self.fetch_fn(ticker, fetch_from)
+        if payload is None:
+            return self._stale(ticker, on_file, from_date)
+        with stage('parse'):
+            fresh = parse_ohlcv(payload.get('historical') or [])
+        print(f'ohlcv store {ticker}: fetched {len(fresh)} bars from {fetch_from}')
+
+        if check_date is not None and check_date in fresh.index and not np.isclose(
+                fresh.at[check_date, 'Close'], stored.at[check_date, 'Close'], rtol=1e-4):
+            print(f'ohlcv store {ticker}: history revised, refetching from {from_date}')
+            stored, start = None, from_date
+            payload = self.fetch_fn(ticker, from_date)
+            if payload is None:
+                return self._stale(ticker, on_file, from_date)
+            with stage('parse'):
+                fresh = parse_ohlcv(payload.get('historical') or [])
+
+        if stored is None:
+            df = fresh
+        else:
+            df = pd.concat([stored[stored.index < fresh.index[0]], fresh]) \
+                if len(fresh) else stored
+
+        # The file keeps everything since `start`, which may be further back
+        # than this request needs (weekly and monthly charts ask for years)
+        if len(fresh):
+            self.save(ticker, df, start)
+        return df[df.index >= pd.Timestamp(from_date)]
+
+
+def make_ohlcv_store(fetch_fn):
+    # OHLCV_STORE_DIR (e.g. /tmp/ohlcv) keeps bars on the container's disk;
+    # by default they are shared through the chart bucket
+    store_dir = os.environ.get('OHLCV_STORE_DIR')
+    store = LocalBlobStore(store_dir) if store_dir else make_blob_store()
+    return OhlcvStore(store, fetch_fn)
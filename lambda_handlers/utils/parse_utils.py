@@ -0,0 +1,52 @@
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics_utils import stage
+
+# FMP field -> DataFrame column
+OHLCV_FIELDS = (('open', 'Open'), ('high', 'High'), ('low', 'Low'),
+                ('close', 'Close'), ('volume', 'Volume'))
+
+# Column types. Prices stay float64: float32's ~7 significant digits misquote
+# six-figure prices (612345.67 comes back as 612345.69) for a few KiB per
+# year of bars. Volumes are whole numbers.
+PRICE_DTYPE = np.float64
+VOLUME_DTYPE = np.int64
+
+
+def _column(historical, field, dtype):
+    # map/itemgetter keeps the per-row work in C and np.fromiter writes
+    # straight into the array, so no intermediate tuples or lists are built
+    return np.fromiter(map(itemgetter(field), historical), dtype=dtype,
+                       count=len(historical))
+
+
+def _date_index(historical):
+    # FMP sends newest first; the reversed view is oldest first for free.
+    # Daily ('2024-05-10') and intraday ('2024-05-10 09:30:00') dates both
+    # parse.
+    dates = _column(historical, 'date', 'datetime64[ns]')[::-1]
+    return pd.DatetimeIndex(dates, name='Date')
+
+
+def parse_ohlcv(historical):
+    # FMP `historical` rows -> date-indexed Open/High/Low/Close/Volume frame
+    index = _date_index(historical)
+    return pd.DataFrame({name: _column(historical, field,
+                                       VOLUME_DTYPE if name == 'Volume' else PRICE_DTYPE)[::-1]
+                         for field, name in OHLCV_FIELDS}, index=index)
+
+
+def parse_closes(historical, name='Close'):
+    # Close-only frame, e.g. the SPY benchmark series
+    index = _date_index(historical)
+    return pd.DataFrame({name: _column(historical, 'close', PRICE_DTYPE)[::-1]},
+                        index=index)
+
+
+def parse_benchmark(payload):
+    # The SPY series every handler's benchmark cache holds
+    with stage('parse'):
+        return parse_closes(payload['historical'], 'SPY Close')
@@ -1,12 +1,13 @@
 from io import BytesIO
 import uuid
 import mplfinance as mpf
-import pandas as pd
 import requests
 import os
 import matplotlib.pyplot as plt
 import boto3
 
+from utils.parse_utils import parse_closes, parse_ohlcv
+
 base_url = 'https://financialmodelingprep.com/api/v3'
 api_key = os.environ.get('FMP_API_KEY')
 bucket_name = os.environ.get('CHART_BUCKET')
@@ -16,30 +17,8 @@ def make_candlestick_chart(ticker, include_volume=False):
     data = fetch_data_from_api(ticker)
     spy_data = fetch_data_from_api('SPY')
     if data:
-        ohlc_data = [(row['date'], row['open'], row['high'],
-                      row['low'], row['close']) for row in data['historical']]
-        volume_data = [row['volume'] for row in data['historical']]
-
-        spy_ohlc_data = [(row['date'], row['close'])
-                         for row in spy_data['historical']]
-
-        ohlc_data_reversed = ohlc_data[::-1]
-        volume_data_reversed = volume_data[::-1]
-
-        # Create a DataFrame from the OHLC and volume data
-        df = pd.DataFrame(ohlc_data_reversed, columns=[
-                          'Date', 'Open', 'High', 'Low', 'Close'])
-
-        # Convert date column to datetime format
-        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
-        df.set_index('Date', inplace=True)  # Set Date column as index
-        # Add volume data as a new column in the DataFrame
-        df['Volume'] = volume_data_reversed
-
-        spy_df = pd.DataFrame(spy_ohlc_data, columns=['Date', 'SPY Close'])
-        # Convert date column to datetime format
-        spy_df['Date'] = pd.to_datetime(spy_df['Date'], format='%Y-%m-%d')
-        spy_df.set_index('Date', inplace=True)  # Set Date column as index
+        df = parse_ohlcv(data['historical'])
+        spy_df = parse_closes(spy_data['historical'], 'SPY Close')
 
         # Merge ticker DataFrame with SPY DataFrame on Date
         merged_df = df.merge(spy_df, on='Date', how='inner')
@@ -0,0 +1,60 @@
+import datetime
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+
+from utils.benchmark_cache import MARKET_TZ
+from utils.blob_store import make_blob_store
+
+
+class RequestStats:
+    # Per-day chart request counts. Each container keeps its own counts and
+    # writes them to one object per container and day, so containers never
+    # overwrite each other and no read-modify-write is needed. Readers sum
+    # the objects under a day's prefix.
+
+    def __init__(self, store, prefix='stats/requests/'):
+        self.store = store
+        self.prefix = prefix
+        self.container = uuid.uuid4().hex[:12]
+        self._day = None
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, symbols, now=None):
+        day = (now or datetime.datetime.now(tz=MARKET_TZ)).astimezone(MARKET_TZ).date()
+        with self._lock:
+            if day != self._day:
+                self._day, self._counts = day, Counter()
+            self._counts.update(symbols)
+            body = json.dumps(dict(self._counts)).encode()
+        try:
+            self.store.put(f'{self.prefix}{day.isoformat()}/{self.container}.json',
+                           body, content_type='application/json')
+        except Exception as e:
+            # Stats are best effort, never fail a chart request over them
+            print('Error writing request stats:', e)
+
+    def counts(self, days=5, now=None):
+        # Summed counts over the last `days` calendar days
+        today = (now or datetime.datetime.now(tz=MARKET_TZ)).astimezone(MARKET_TZ).date()
+        totals = Counter()
+        for offset in range(days):
+            day = today - datetime.timedelta(days=offset)
+            for key in self.store.list(f'{self.prefix}{day.isoformat()}/'):
+                body = self.store.get(key)
+                if body:
+                    totals.update(json.loads(body))
+        return totals
+
+    def most_requested(self, n, days=5, now=None):
+        return [symbol for symbol, _ in self.counts(days, now).most_common(n)]
+
+
+def make_request_stats():
+    # REQUEST_STATS=0 turns recording off
+    if os.environ.get('REQUEST_STATS', '1') == '0':
+        return None
+    return RequestStats(make_blob_store())
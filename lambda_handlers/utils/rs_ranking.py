@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+
+from utils.fetch_utils import default_from_date, fetch_concurrently
+
+# Universe scan behind /rank: RS change, RS new highs, ADR% and the day's
+# change for every ticker at once. Each ticker's bars are scattered into
+# (date x ticker) matrices aligned to the benchmark's dates, so each measure
+# is one numpy reduction over the whole universe instead of a frame merge
+# per ticker.
+
+RS_LOOKBACK = 252
+# The RS line's change is measured over about three months
+RS_PERIOD = 63
+ADR_BARS = 20
+RANK_COLUMNS = ('High', 'Low', 'Close')
+
+
+def rank_window(period=RS_PERIOD, lookback=RS_LOOKBACK, adr_bars=ADR_BARS):
+    # Bars of history the measures read
+    return max(period + 1, lookback, adr_bars, 2)
+
+
+def rank_from_date():
+    # Two calendar days per trading day covers weekends and holidays
+    return default_from_date(rank_window() * 2)
+
+
+def universe_from_env():
+    # RANK_UNIVERSE, comma or space separated; empty means every stored ticker
+    return [symbol.strip().upper() for symbol in
+            os.environ.get('RANK_UNIVERSE', '').replace(',', ' ').split()]
+
+
+def load_universe(ohlcv_store, symbols, max_workers=32):
+    # symbol -> (dates, {column: array}) for every ticker with bars on file
+    symbols = list(symbols)
+    loaded = fetch_concurrently(lambda symbol: ohlcv_store.load_columns(symbol, RANK_COLUMNS),
+                                symbols, max_workers=min(len(symbols), max_workers) or 1)
+    return {symbol: item[:2] for symbol, item in zip(symbols, loaded) if item is not None}
+
+
+def align_universe(universe, dates, columns=RANK_COLUMNS):
+    # Returns (symbols, {column: (len(dates), len(symbols)) matrix}), NaN
+    # where a ticker has no bar on a date. All tickers' bars inside the
+    # window are concatenated and placed with one searchsorted, so a stale
+    # ticker simply ends in NaN rows.
+    symbols = list(universe)
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    matrices = {name: np.full((len(dates), len(symbols)), np.nan) for name in columns}
+    if not symbols or not len(dates):
+        return symbols, matrices
+
+    starts = [np.searchsorted(ticker_dates, dates[0]) for ticker_dates, _ in universe.values()]
+    bar_dates = np.concatenate([ticker_dates[start:] for (ticker_dates, _), start
+                                in zip(universe.values(), starts)])
+    lengths = [len(ticker_dates) - start for (ticker_dates, _), start
+               in zip(universe.values(), starts)]
+    cols = np.repeat(np.arange(len(symbols)), lengths)
+    rows = np.searchsorted(dates, bar_dates)
+    hit = rows < len(dates)
+    hit[hit] = dates[rows[hit]] == bar_dates[hit]
+
+    for name in columns:
+        values = np.concatenate([ticker_columns[name][start:] for (_, ticker_columns), start
+                                 in zip(universe.values(), starts)])
+        matrices[name][rows[hit], cols[hit]] = values[hit]
+    return symbols, matrices
+
+
+def rank_universe(symbols, matrices, benchmark, top=25, period=RS_PERIOD,
+                  lookback=RS_LOOKBACK, adr_bars=ADR_BARS):
+    # `benchmark` is the SPY close on the matrices' dates. Tickers are
+    # ranked by the RS line's change over `period` bars; ones without a bar
+    # on the last date (counted as stale), or `period` bars back, are left
+    # out.
+    close, high, low = matrices['Close'], matrices['High'], matrices['Low']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = close / np.asarray(benchmark, dtype=float)[:, None]
+        rs_change = (rs[-1] / rs[-1 - period] - 1) * 100
+        # fmax skips NaN, like the chart's rolling max with min_periods=1
+        rs_new_high = rs[-1] >= np.fmax.reduce(rs[-lookback:], axis=0)
+        ranges = high[-adr_bars:] - low[-adr_bars:]
+        adrp = (np.nansum(ranges, axis=0) / np.isfinite(ranges).sum(axis=0)) / close[-1] * 100
+        change = (close[-1] / close[-2] - 1) * 100
+
+    ranked = np.flatnonzero(np.isfinite(rs_change) & np.isfinite(change))
+    order = ranked[np.argsort(-rs_change[ranked], kind='stable')][:top]
+    rows = [{'symbol': symbols[i], 'close': float(close[-1, i]),
+             'change_pct': float(change[i]), 'adrp': float(adrp[i]),
+             'rs_change_pct': float(rs_change[i]), 'rs_new_high': bool(rs_new_high[i])}
+            for i in order]
+    return {'ranked': len(ranked), 'stale': int((~np.isfinite(close[-1])).sum()), 'rows': rows}
+
+
+def format_rank_table(rows):
+    # Monospaced table for a Discord message
+    lines = [f'{"#":>3} {"Ticker":<6} {"Close":>9} {"Chg%":>7} {"ADR%":>6} {"RS 3M%":>7} RS High']
+    for i, row in enumerate(rows, 1):
+        lines.append(f'{i:>3} {row["symbol"]:<6} {row["close"]:>9.2f} {row["change_pct"]:>7.2f} '
+                     f'{row["adrp"]:>6.2f} {row["rs_change_pct"]:>7.2f} '
+                     f'{"*" if row["rs_new_high"] else ""}'.rstrip())
+    return '```\n' + '\n'.join(lines) + '\n```'
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from utils.chart_template import MOVING_AVERAGES
+from utils.fetch_utils import default_from_date
+from utils.indicator_utils import CHART_INDICATORS
+
+# Chart timeframes. Weekly and monthly candles are resampled from the
+# stored daily series, so they cost no extra FMP calls; intraday bars have
+# their own fetch path. `history_days` is how much history a chart needs:
+# the chart window plus the longest moving average.
+TIMEFRAMES = {
+    'daily': {
+        'label': 'Daily',
+        'history_days': 365,
+        'period': None,
+        'indicators': CHART_INDICATORS,
+        'moving_averages': MOVING_AVERAGES,
+        'date_format': '%b %d',
+    },
+    'weekly': {
+        'label': 'Weekly',
+        # 120 weeks plus the 40 week average
+        'history_days': 4 * 365,
+        'period': 'week',
+        'indicators': {
+            'sma_10': ('sma', {'window': 10}),
+            'sma_30': ('sma', {'window': 30}),
+            'sma_40': ('sma', {'window': 40}),
+            'rs': ('rs', {}),
+            'rs_new_high': ('rs_new_high', {'lookback': 52}),
+        },
+        'moving_averages': (('sma_10', '10W SMA', '#839496', .5),
+                            ('sma_30', '30W SMA', '#268bd2', .5),
+                            ('sma_40', '40W SMA', '#cb4b16', .5)),
+        'date_format': '%b %d %y',
+    },
+    'monthly': {
+        'label': 'Monthly',
+        # 120 months plus the 20 month average
+        'history_days': 12 * 365,
+        'period': 'month',
+        'indicators': {
+            'sma_6': ('sma', {'window': 6}),
+            'sma_10': ('sma', {'window': 10}),
+            'sma_20': ('sma', {'window': 20}),
+            'rs': ('rs', {}),
+            'rs_new_high': ('rs_new_high', {'lookback': 12}),
+        },
+        'moving_averages': (('sma_6', '6M SMA', '#839496', .5),
+                            ('sma_10', '10M SMA', '#268bd2', .5),
+                            ('sma_20', '20M SMA', '#cb4b16', .5)),
+        'date_format': '%b %Y',
+    },
+    'intraday': {
+        'label': '5 Min',
+        # Enough sessions for 120 bars plus the 50 bar average over a long
+        # weekend
+        'history_days': 7,
+        'interval': '5min',
+        'period': None,
+        'indicators': CHART_INDICATORS,
+        'moving_averages': MOVING_AVERAGES,
+        'date_format': '%m/%d %H:%M',
+    },
+}
+
+DEFAULT_TIMEFRAME = 'daily'
+# Timeframes built from the stored daily bars
+DAILY_TIMEFRAMES = tuple(name for name in TIMEFRAMES if name != 'intraday')
+
+# How each column folds into a coarser bar
+AGGREGATIONS = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last',
+                'Volume': 'sum', 'SPY Close': 'last'}
+
+_REDUCERS = {'max': np.maximum, 'min': np.minimum, 'sum': np.add}
+
+
+def timeframe_name(value):
+    # Discord option value -> a TIMEFRAMES key, daily for anything unknown
+    value = (value or '').strip().lower()
+    return value if value in TIMEFRAMES else DEFAULT_TIMEFRAME
+
+
+def _period_ids(index, period):
+    days = index.values.astype('datetime64[D]')
+    if period == 'week':
+        # 1970-01-01 was a Thursday; shifting by 3 days starts weeks on Monday
+        return (days.astype(np.int64) + 3) // 7
+    if period == 'month':
+        return days.astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f'Unknown period: {period}')
+
+
+def resample(frame, period):
+    # Daily bars -> weekly/monthly bars in one pass per column: bars are
+    # split where the period id changes and each column is folded with
+    # ufunc.reduceat. Each bar is dated by its last trading day, so the
+    # current week or month is the last, still moving, bar.
+    n = len(frame)
+    if n == 0:
+        return frame
+    ids = _period_ids(frame.index, period)
+    starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+    ends = np.concatenate([starts[1:] - 1, [n - 1]])
+
+    columns = {}
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        how = AGGREGATIONS.get(name, 'last')
+        if how == 'first':
+            columns[name] = values[starts]
+        elif how == 'last':
+            columns[name] = values[ends]
+        else:
+            columns[name] = _REDUCERS[how].reduceat(values, starts)
+    return pd.DataFrame(columns, index=frame.index[ends])
+
+
+def chart_frame(df, spy_df, timeframe, from_date=None):
+    # The one merge per chart: the ticker's bars joined with the SPY close,
+    # trimmed to the timeframe's history and resampled to its bars
+    frame = df.join(spy_df, how='inner')
+    if from_date is not None:
+        frame = frame[frame.index >= pd.Timestamp(from_date)]
+    period = TIMEFRAMES[timeframe]['period']
+    return resample(frame, period) if period else frame
+
+
+def make_chart_frame(df, spy_df, timeframe, from_date_fn=default_from_date):
+    # chart_frame with the timeframe's own history, as every chart of it is
+    # drawn (and cache keyed) by the handler and the pre-render job alike.
+    # `from_date_fn(days)` is the caller's clock, e.g. a fixed one for bars
+    # that end on a known date.
+    if timeframe == 'intraday':
+        return chart_frame(df, spy_df, timeframe)
+    return chart_frame(df, spy_df, timeframe,
+                       from_date_fn(TIMEFRAMES[timeframe]['history_days']))
@@ -9,13 +9,36 @@ from aws_cdk import (
     aws_logs as logs,
     aws_sns_subscriptions as subs,
     aws_s3 as s3,
+    aws_events as events,
+    aws_events_targets as targets,
 
 )
 from constructs import Construct
 from dotenv import load_dotenv
+import json
 import os
 load_dotenv()
 
+# Written by `python -m benchmarks.profile_lambda`; LAMBDA_PROFILE points
+# elsewhere. Without a profile the chart handler keeps the settings below.
+LAMBDA_PROFILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'lambda_profile.json')
+DEFAULT_PROFILE = {'memory_size': 512, 'timeout_s': 30, 'runtime': 'python3.8',
+                   'architecture': 'x86_64', 'provisioned_concurrency': 0}
+
+
+def load_lambda_profile(path=LAMBDA_PROFILE):
+    # The chart handler settings of a generated profile
+    if not os.path.exists(path):
+        return dict(DEFAULT_PROFILE)
+    with open(path) as f:
+        return dict(DEFAULT_PROFILE, **json.load(f).get('chart_handler', {}))
+
+
+def lambda_runtime(name):
+    # 'python3.12' -> Runtime.PYTHON_3_12
+    return getattr(_lambda.Runtime, name.upper().replace('PYTHON', 'PYTHON_').replace('.', '_'))
+
 
 class SsChartingBotStack(Stack):
 
@@ -29,35 +52,112 @@ class SsChartingBotStack(Stack):
         chart_bucket = s3.Bucket(self, "ss-chart-bucket",
                                  block_public_access=s3.BlockPublicAccess.BLOCK_ACLS,
                                  removal_policy=RemovalPolicy.DESTROY,  # Optional for development
-                                 public_read_access=True)
+                                 public_read_access=True,
+                                 # Rendered charts are cached by content, so
+                                 # only recent ones are ever reused
+                                 lifecycle_rules=[s3.LifecycleRule(
+                                     prefix='charts/',
+                                     expiration=Duration.days(7))])
 
         lambda_role = iam.Role(self, "SsChartDSBotRole",
                                assumed_by=iam.ServicePrincipal(
                                    "lambda.amazonaws.com"),
                                managed_policies=[iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")])
 
-        chart_bucket.grant_put(lambda_role)
+        # Read/write access for the chart cache and leases, stored bars,
+        # benchmark series and request stats
+        chart_bucket.grant_read_write(lambda_role)
 
         existing_topic_arn = 'arn:aws:sns:us-east-1:464570369687:SsDiscordBotStack-prod-ssdiscordchartcommandtopicB1E16849-jUtbEwxvxtbR'
 
+        # Shared by the command handler and the pre-render job, which must
+        # agree on output settings to produce the same chart cache keys
+        chart_environment = {
+            'FMP_API_KEY': os.getenv('FMP_API_KEY'),
+            'CHART_BUCKET': chart_bucket.bucket_name,
+            # Writable font cache dir for matplotlib
+            'MPLCONFIGDIR': '/tmp/matplotlib'}
+
+        # Memory (and with it CPU), timeout and provisioned concurrency of the
+        # chart handler come from the profile; runtime and architecture apply
+        # to every function, since they share one bundle
+        profile = load_lambda_profile(os.getenv('LAMBDA_PROFILE', LAMBDA_PROFILE))
+        runtime = lambda_runtime(profile['runtime'])
+        architecture = (_lambda.Architecture.ARM_64 if profile['architecture'] == 'arm64'
+                        else _lambda.Architecture.X86_64)
+
         # Create a Python Lambda function
         command_handler_lambda = _alambda.PythonFunction(self, 'SsChartDiscordBotCommandHandler',
                                                          entry='./lambda_handlers/',
                                                          index='candlestick-maker.py',
-                                                         runtime=_lambda.Runtime.PYTHON_3_8,
+                                                         runtime=runtime,
+                                                         architecture=architecture,
                                                          timeout=Duration.seconds(
-                                                             30),
+                                                             profile['timeout_s']),
                                                          log_group=log_group,
                                                          role=lambda_role,
-                                                         memory_size=512,
-                                                         environment={
-                                                             'FMP_API_KEY': os.getenv('FMP_API_KEY'),
-                                                             'CHART_BUCKET': chart_bucket.bucket_name}
+                                                         memory_size=profile['memory_size'],
+                                                         environment=chart_environment
                                                          )
 
+        # Provisioned concurrency is set on an alias, which SNS then invokes
+        command_handler_target = command_handler_lambda
+        if profile['provisioned_concurrency']:
+            command_handler_target = command_handler_lambda.add_alias(
+                'live', provisioned_concurrent_executions=profile['provisioned_concurrency'])
+
         # Get existing SNS topic
         existing_topic = sns.Topic.from_topic_arn(
             self, 'chart-command-topic', existing_topic_arn)
 
         existing_topic.add_subscription(
-            subs.LambdaSubscription(command_handler_lambda))
+            subs.LambdaSubscription(command_handler_target))
+
+        # Renders the watchlist / most requested charts into the chart cache
+        # after the close. More memory buys the CPU the render pool uses.
+        prerender_lambda = _alambda.PythonFunction(self, 'SsChartPrerender',
+                                                   entry='./lambda_handlers/',
+                                                   index='prerender.py',
+                                                   runtime=runtime,
+                                                   architecture=architecture,
+                                                   timeout=Duration.minutes(10),
+                                                   log_group=log_group,
+                                                   role=lambda_role,
+                                                   memory_size=3008,
+                                                   environment=dict(
+                                                       chart_environment,
+                                                       PRERENDER_SYMBOLS=os.getenv('PRERENDER_SYMBOLS', ''),
+                                                       PRERENDER_TOP=os.getenv('PRERENDER_TOP', '50'),
+                                                       # Topped up after the charts for /rank
+                                                       RANK_UNIVERSE=os.getenv('RANK_UNIVERSE', ''))
+                                                   )
+
+        # /rank scans every stored ticker, so it gets its own function with
+        # the time and memory for that. The topic carries every command;
+        # this subscription only receives /rank.
+        rank_lambda = _alambda.PythonFunction(self, 'SsChartRsRank',
+                                              entry='./lambda_handlers/',
+                                              index='rs_rank.py',
+                                              runtime=runtime,
+                                              architecture=architecture,
+                                              timeout=Duration.minutes(2),
+                                              log_group=log_group,
+                                              role=lambda_role,
+                                              memory_size=1769,
+                                              environment=dict(
+                                                  chart_environment,
+                                                  RANK_UNIVERSE=os.getenv('RANK_UNIVERSE', ''))
+                                              )
+
+        existing_topic.add_subscription(subs.LambdaSubscription(
+            rank_lambda,
+            filter_policy_with_message_body={
+                'data': sns.FilterOrPolicy.policy({
+                    'name': sns.FilterOrPolicy.filter(
+                        sns.SubscriptionFilter.string_filter(allowlist=['rank']))})}))
+
+        # 21:30 UTC is after the 16:00 ET close in both EST and EDT
+        events.Rule(self, 'SsChartPrerenderSchedule',
+                    schedule=events.Schedule.cron(
+                        minute='30', hour='21', week_day='MON-FRI'),
+                    targets=[targets.LambdaFunction(prerender_lambda)])
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The Lambda bundles lambda_handlers/ as its root, so handler code imports
+# `utils.*` directly
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))), 'lambda_handlers'))
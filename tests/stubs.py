@@ -0,0 +1,233 @@
+import datetime
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_historical(ticker, days=365, seed=None, end=None, start_price=100.0):
+    # Synthetic FMP /historical-price-full payload, newest bar first like the
+    # real API
+    rng = random.Random(seed if seed is not None else ticker)
+    end = end or datetime.date.today()
+    day = end - datetime.timedelta(days=days)
+    price = start_price
+    rows = []
+    while day <= end:
+        if day.weekday() < 5:
+            open_ = price * (1 + rng.uniform(-0.01, 0.01))
+            close = open_ * (1 + rng.uniform(-0.03, 0.03))
+            high = max(open_, close) * (1 + rng.uniform(0, 0.02))
+            low = min(open_, close) * (1 - rng.uniform(0, 0.02))
+            rows.append({'date': day.strftime('%Y-%m-%d'),
+                         'open': round(open_, 2), 'high': round(high, 2),
+                         'low': round(low, 2), 'close': round(close, 2),
+                         'adjClose': round(close, 2),
+                         'volume': rng.randint(1000000, 50000000),
+                         'changePercent': round((close / open_ - 1) * 100, 4)})
+            price = close
+        day += datetime.timedelta(days=1)
+    return {'symbol': ticker, 'historical': rows[::-1]}
+
+
+def make_intraday(ticker, days=5, interval=1, seed=None, end=None, start_price=100.0):
+    # Synthetic FMP /historical-chart/<interval>min rows for regular
+    # sessions (09:30-16:00), newest first
+    rng = random.Random(seed if seed is not None else ticker)
+    end = end or datetime.date.today()
+    day = end - datetime.timedelta(days=days)
+    price = start_price
+    rows = []
+    while day <= end:
+        if day.weekday() < 5:
+            bar = datetime.datetime.combine(day, datetime.time(9, 30))
+            close_time = datetime.datetime.combine(day, datetime.time(16, 0))
+            while bar < close_time:
+                open_ = price
+                close = open_ * (1 + rng.uniform(-0.002, 0.002))
+                rows.append({'date': bar.strftime('%Y-%m-%d %H:%M:%S'),
+                             'open': round(open_, 2),
+                             'high': round(max(open_, close) * (1 + rng.uniform(0, 0.001)), 2),
+                             'low': round(min(open_, close) * (1 - rng.uniform(0, 0.001)), 2),
+                             'close': round(close, 2),
+                             'volume': rng.randint(1000, 500000)})
+                price = close
+                bar += datetime.timedelta(minutes=interval)
+        day += datetime.timedelta(days=1)
+    return rows[::-1]
+
+
+def make_chart_event(symbols, app_id='app', token='tok', timeframe=None, command='chart'):
+    # SNS event carrying one /chart (or `command`) interaction, as published
+    # by the interactions endpoint
+    options = [{'name': 'symbols', 'value': symbols}]
+    if timeframe is not None:
+        options.append({'name': 'timeframe', 'value': timeframe})
+    message = {'application_id': app_id, 'token': token,
+               'data': {'name': command, 'options': options}}
+    return {'Records': [{'Sns': {'Message': json.dumps(message)}}]}
+
+
+class StubServer:
+    # Minimal threaded HTTP server on 127.0.0.1 for exercising the handler's
+    # network code offline. Subclasses implement respond().
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _dispatch(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                parsed = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                with stub._lock:
+                    stub.requests.append((self.command, parsed.path, query))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                status, headers, payload = stub.respond(
+                    self.command, parsed.path, query, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    def respond(self, method, path, query, body):
+        raise NotImplementedError
+
+    def json_response(self, status, obj, headers=None):
+        out = {'Content-Type': 'application/json'}
+        out.update(headers or {})
+        return status, out, json.dumps(obj).encode()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FmpStub(StubServer):
+    # Serves /historical-price-full/<ticker>[,<ticker>...] from a dict of
+    # payloads, and synthetic /historical-chart/<interval>/<ticker> bars.
+    # Status codes queued in `failures` are returned (in order) before real
+    # data. Throttles like FMP: more than `rate` requests in a second, or
+    # any after `quota` served, get a 429.
+
+    def __init__(self, payloads=None, delay=0.0, failures=None, rate=None, quota=None):
+        super().__init__(delay=delay)
+        self.payloads = payloads or {}
+        self.failures = list(failures or [])
+        self.rate = rate
+        self.quota = quota
+        self.served = 0
+        self.throttled = 0
+        self._recent = []
+
+    def throttle(self):
+        # Called under the lock; True when this request gets a 429
+        now = time.monotonic()
+        self._recent = [t for t in self._recent if now - t < 1]
+        if (self.quota is not None and self.served >= self.quota) or (
+                self.rate is not None and len(self._recent) >= self.rate):
+            self.throttled += 1
+            return True
+        self._recent.append(now)
+        self.served += 1
+        return False
+
+    def payload_for(self, ticker, query):
+        payload = self.payloads.get(ticker)
+        if payload is None:
+            payload = self.payloads[ticker] = make_historical(ticker)
+        start = query.get('from')
+        if start:
+            payload = dict(payload, historical=[
+                row for row in payload['historical'] if row['date'] >= start])
+        return payload
+
+    def respond(self, method, path, query, body):
+        with self._lock:
+            failure = self.failures.pop(0) if self.failures else None
+            if not failure and self.throttle():
+                failure = 429
+        if failure:
+            return self.json_response(failure, {'Error Message': 'stub'})
+        if path.startswith('/historical-price-full/'):
+            tickers = path.rsplit('/', 1)[-1].split(',')
+            if len(tickers) > 1:
+                return self.json_response(200, {'historicalStockList': [
+                    self.payload_for(ticker, query) for ticker in tickers]})
+            return self.json_response(200, self.payload_for(tickers[0], query))
+        if path.startswith('/historical-chart/'):
+            interval, ticker = path.strip('/').split('/')[-2:]
+            rows = make_intraday(ticker, interval=int(interval.rstrip('min')))
+            start = query.get('from')
+            return self.json_response(200, [row for row in rows
+                                            if not start or row['date'] >= start])
+        return self.json_response(404, {})
+
+
+class DiscordStub(StubServer):
+    # Fake interaction webhook: POST /webhooks/<app>/<token> creates a
+    # message (returned when ?wait=true), PATCH .../messages/<id> edits it.
+    # `events` records (monotonic time, method, message id, payload).
+    # Status codes queued in `failures` answer the next requests: a 429 is
+    # returned before anything is stored, like Discord's rate limit; any
+    # other status after the message was written, like a failing gateway.
+
+    def __init__(self, delay=0.0, failures=None):
+        super().__init__(delay=delay)
+        self.messages = {}
+        self.events = []
+        self.failures = list(failures or [])
+
+    def respond(self, method, path, query, body):
+        parts = path.strip('/').split('/')
+        if len(parts) < 3 or parts[0] != 'webhooks':
+            return self.json_response(404, {})
+        payload = json.loads(body or b'{}')
+        with self._lock:
+            failure = self.failures.pop(0) if self.failures else None
+            if failure == 429:
+                return self.json_response(429, {'message': 'You are being rate limited.',
+                                                'retry_after': 0})
+            if method == 'POST' and len(parts) == 3:
+                message_id = str(len(self.messages) + 1)
+                self.messages[message_id] = payload
+            elif method == 'PATCH' and len(parts) == 5 and parts[3] == 'messages':
+                message_id = parts[4]
+                if message_id not in self.messages:
+                    return self.json_response(404, {'message': 'Unknown Message'})
+                self.messages[message_id] = dict(self.messages[message_id], **payload)
+            else:
+                return self.json_response(405, {})
+            self.events.append((time.monotonic(), method, message_id, payload))
+            message = dict(self.messages[message_id], id=message_id)
+        if failure:
+            return self.json_response(failure, {'message': 'stub'})
+        if method == 'POST' and query.get('wait') != 'true':
+            return 204, {}, b''
+        return self.json_response(200, message)
@@ -0,0 +1,125 @@
+import datetime
+
+from utils.benchmark_cache import BenchmarkCache, CLOSE_GRACE, MARKET_TZ, next_market_close
+from utils.blob_store import LocalBlobStore
+
+
+def et(*args):
+    return datetime.datetime(*args, tzinfo=MARKET_TZ)
+
+
+class CountingFetch:
+
+    def __init__(self, payload=None):
+        self.calls = []
+        self.payload = payload
+
+    def __call__(self, symbol, from_date):
+        self.calls.append((symbol, from_date))
+        if self.payload is False:
+            return None
+        return self.payload or {'symbol': symbol, 'historical': [{'date': from_date}]}
+
+
+def test_next_market_close():
+    # Wednesday before and after the close, then Friday evening
+    assert next_market_close(et(2024, 5, 8, 10, 0)) == et(2024, 5, 8, 16, 0)
+    assert next_market_close(et(2024, 5, 8, 16, 0)) == et(2024, 5, 9, 16, 0)
+    assert next_market_close(et(2024, 5, 10, 18, 0)) == et(2024, 5, 13, 16, 0)
+    # Just after the close the grace period still counts as the same session
+    grace = datetime.timedelta(minutes=30)
+    assert next_market_close(et(2024, 5, 8, 16, 5), grace) == et(2024, 5, 8, 16, 30)
+    assert next_market_close(et(2024, 5, 8, 16, 30), grace) == et(2024, 5, 9, 16, 30)
+
+
+def test_memory_tier_serves_until_close():
+    fetch = CountingFetch()
+    cache = BenchmarkCache(fetch)
+
+    for hour in (10, 12, 15):
+        cache.get('SPY', '2023-05-08', now=et(2024, 5, 8, hour, 0))
+    assert len(fetch.calls) == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    after = et(2024, 5, 8, 16, 0) + CLOSE_GRACE
+    cache.get('SPY', '2023-05-08', now=after)
+    assert len(fetch.calls) == 2
+
+
+def test_fetch_without_todays_bar_is_retried(tmp_path):
+    # Fetched after the grace period, but FMP has not published the day's
+    # bar yet: kept for minutes, not until the next close, in either tier
+    store = LocalBlobStore(str(tmp_path))
+    fetch = CountingFetch({'symbol': 'SPY', 'historical': [{'date': '2024-05-07'}]})
+    cache = BenchmarkCache(fetch, store=store)
+    after = et(2024, 5, 8, 16, 0) + CLOSE_GRACE
+
+    cache.get('SPY', '2023-05-08', now=after)
+    cache.get('SPY', '2023-05-08', now=after + datetime.timedelta(minutes=1))
+    assert len(fetch.calls) == 1
+
+    fetch.payload = {'symbol': 'SPY', 'historical': [{'date': '2024-05-08'},
+                                                     {'date': '2024-05-07'}]}
+    later = after + datetime.timedelta(minutes=15)
+    assert cache.get('SPY', '2023-05-08', now=later)['historical'][0]['date'] == '2024-05-08'
+    assert len(fetch.calls) == 2
+
+    # With the day's bar the entry lasts until the next close again
+    cache.get('SPY', '2023-05-08', now=et(2024, 5, 9, 12, 0))
+    other = BenchmarkCache(CountingFetch(), store=store)
+    other.get('SPY', '2023-05-08', now=et(2024, 5, 9, 12, 0))
+    assert len(fetch.calls) == 2 and not other.fetch_fn.calls
+
+
+def test_store_tier_shared_between_containers(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    now = et(2024, 5, 8, 11, 0)
+    first = CountingFetch()
+    BenchmarkCache(first, store=store).get('SPY', '2023-05-08', now=now)
+
+    second = CountingFetch()
+    payload = BenchmarkCache(second, store=store).get(
+        'SPY', '2023-05-08', now=now)
+
+    assert payload['symbol'] == 'SPY'
+    assert first.calls and not second.calls
+
+
+def test_failed_fetch_is_not_cached():
+    fetch = CountingFetch(payload=False)
+    cache = BenchmarkCache(fetch)
+    now = et(2024, 5, 8, 11, 0)
+
+    assert cache.get('SPY', '2023-05-08', now=now) is None
+    assert cache.get('SPY', '2023-05-08', now=now) is None
+    assert len(fetch.calls) == 2
+
+
+def test_memory_tier_holds_transformed_value(tmp_path):
+    fetch = CountingFetch()
+    store = LocalBlobStore(str(tmp_path))
+    now = et(2024, 5, 8, 10, 0)
+    cache = BenchmarkCache(fetch, store=store, transform=lambda p: len(p['historical']))
+
+    assert cache.get('SPY', '2023-05-08', now=now) == 1
+    assert cache.get('SPY', '2023-05-08', now=now) == 1
+
+    # Another container reads the raw payload from the store and transforms it
+    other = BenchmarkCache(CountingFetch(False), store=store,
+                           transform=lambda p: p['historical'][0]['date'])
+    assert other.get('SPY', '2023-05-08', now=now) == '2023-05-08'
+    assert len(fetch.calls) == 1
+
+
+def test_failed_fetch_serves_the_last_entry(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    BenchmarkCache(CountingFetch(), store=store).get('SPY', '2023-05-08', now=et(2024, 5, 7, 11, 0))
+    cache = BenchmarkCache(CountingFetch(), store=store)
+    cache.get('SPY', '2023-05-08', now=et(2024, 5, 7, 12, 0))
+    cache.fetch_fn = CountingFetch(payload=False)
+
+    # The next session: memory entry from the day before
+    assert cache.get('SPY', '2023-05-08', now=et(2024, 5, 8, 11, 0))['symbol'] == 'SPY'
+    # A new container: yesterday's entry from the store
+    other = BenchmarkCache(CountingFetch(payload=False), store=store)
+    assert other.get('SPY', '2023-05-08', now=et(2024, 5, 8, 11, 0))['symbol'] == 'SPY'
@@ -0,0 +1,209 @@
+import importlib
+import json
+import threading
+import time
+
+import pytest
+
+from utils import discord_utils, fetch_utils
+from utils.benchmark_cache import BenchmarkCache
+from utils.blob_store import MemoryBlobStore
+from utils.chart_cache import ChartCache
+from utils.fmp_client import FmpClient
+from utils.indicator_utils import IndicatorStates
+from utils.ohlcv_store import OhlcvStore
+from utils.request_stats import RequestStats
+from tests.stubs import DiscordStub, FmpStub, make_chart_event
+
+
+@pytest.fixture
+def handler_module(monkeypatch):
+    # The handler with in-memory stores, FMP and Discord served locally
+    module = importlib.import_module('candlestick-maker')
+    store = MemoryBlobStore()
+    monkeypatch.setattr(module, 'fmp_client', FmpClient(sleep=lambda seconds: None))
+    fetch = module.fmp_client.historical
+    monkeypatch.setattr(module, 'benchmark_cache',
+                        BenchmarkCache(fetch, transform=module.parse_benchmark))
+    monkeypatch.setattr(module, 'ohlcv_store', OhlcvStore(store, fetch))
+    monkeypatch.setattr(module, 'chart_cache', ChartCache(store))
+    monkeypatch.setattr(module, 'indicator_states', IndicatorStates())
+    monkeypatch.setattr(module, 'request_stats', RequestStats(store))
+    with FmpStub() as fmp, DiscordStub() as discord:
+        monkeypatch.setattr(fetch_utils, 'base_url', fmp.url)
+        monkeypatch.setattr(discord_utils, 'api_base', discord.url)
+        module.fmp, module.discord = fmp, discord
+        yield module
+
+
+def test_handler_posts_fields_then_edits_in_charts(handler_module):
+    discord = handler_module.discord
+
+    handler_module.handler(make_chart_event('aapl, msft'), None)
+
+    (_, first, message_id, posted), (_, second, _, edited) = discord.events
+    assert (first, second) == ('POST', 'PATCH')
+    assert [embed['title'] for embed in posted['embeds']] == [
+        'AAPL Daily Chart', 'MSFT Daily Chart']
+    assert all('image' not in embed for embed in posted['embeds'])
+    assert all(embed['image']['url'].startswith('memory://')
+               for embed in edited['embeds'])
+    assert posted['embeds'][0]['fields'] == edited['embeds'][0]['fields']
+
+
+def test_handler_sends_cached_charts_in_one_post(handler_module):
+    discord = handler_module.discord
+    handler_module.handler(make_chart_event('NVDA'), None)
+    del discord.events[:]
+
+    handler_module.handler(make_chart_event('NVDA'), None)
+
+    [(_, method, _, posted)] = discord.events
+    assert method == 'POST'
+    assert posted['embeds'][0]['image']['url'].startswith('memory://')
+
+
+def test_handler_sends_once_when_not_deferred(handler_module, monkeypatch):
+    monkeypatch.setattr(handler_module, 'deferred_response', False)
+
+    handler_module.handler(make_chart_event('TSLA'), None)
+
+    [(_, method, _, posted)] = handler_module.discord.events
+    assert method == 'POST'
+    assert 'image' in posted['embeds'][0]
+
+
+def test_handler_serves_prerendered_chart_from_cache(handler_module, monkeypatch):
+    prerender = importlib.import_module('prerender')
+    for name in ('benchmark_cache', 'ohlcv_store', 'chart_cache'):
+        monkeypatch.setattr(prerender, name, getattr(handler_module, name))
+    report = prerender.prerender(['AMD'], executor_kind='thread')
+    assert report['rendered'] == ['AMD']
+
+    handler_module.handler(make_chart_event('AMD'), None)
+
+    [(_, method, _, posted)] = handler_module.discord.events
+    assert method == 'POST'
+    assert 'image' in posted['embeds'][0]
+    assert handler_module.request_stats.counts() == {'AMD': 1}
+
+
+def test_handler_emits_stage_metrics(handler_module, capsys):
+    handler_module.handler(make_chart_event('AAPL'), None)
+
+    [record] = [json.loads(line) for line in capsys.readouterr().out.splitlines()
+                if line.startswith('{"_aws"')]
+    for name in ('fetch_ticker_ms', 'fetch_spy_ms', 'fmp_http_ms', 'parse_ms',
+                 'indicators_ms', 'render_ms', 'encode_ms', 'upload_ms', 'presign_ms',
+                 'discord_post_ms', 'discord_edit_ms', 'first_response_ms', 'total_ms'):
+        assert name in record, name
+    assert record['chart_cache_misses'] == 1
+    assert record['chart_bytes'] > 0 and record['fmp_bytes'] > 0
+    assert record['symbols'] == ['AAPL']
+
+
+def test_handler_resamples_weekly_from_the_daily_series(handler_module):
+    fmp = handler_module.fmp
+
+    handler_module.handler(make_chart_event('AAPL', timeframe='weekly'), None)
+
+    # Daily series for AAPL and SPY (batched into one request), nothing weekly
+    symbols = sorted(symbol for _, path, _ in fmp.requests
+                     for symbol in path.rsplit('/', 1)[-1].split(','))
+    assert symbols == ['AAPL', 'SPY']
+    assert all(path.startswith('/historical-price-full/') for _, path, _ in fmp.requests)
+    (_, _, _, posted), (_, _, _, edited) = handler_module.discord.events
+    assert posted['embeds'][0]['title'] == 'AAPL Weekly Chart'
+    assert '/weekly-' in edited['embeds'][0]['image']['url']
+    assert ('AAPL', 'weekly') in handler_module.indicator_states
+
+
+def test_handler_fetches_intraday_bars_separately(handler_module):
+    handler_module.handler(make_chart_event('AAPL', timeframe='intraday'), None)
+
+    (_, _, _, posted), (_, method, _, edited) = handler_module.discord.events
+    assert posted['embeds'][0]['title'] == 'AAPL 5 Min Chart'
+    assert [field['name'] for field in posted['embeds'][0]['fields']] == ['Price', 'Change']
+    assert method == 'PATCH' and '/intraday-' in edited['embeds'][0]['image']['url']
+
+
+def test_handler_reuses_a_render_in_flight_elsewhere(handler_module, monkeypatch, capsys):
+    # Another invocation holds the lease and uploads the chart shortly after
+    cache = handler_module.chart_cache
+    monkeypatch.setattr(cache, 'poll_interval', 0.01)
+    uploads = []
+
+    def leased_elsewhere(key, now=None):
+        uploads.append(threading.Timer(0.1, cache.store.put, (key, b'png')))
+        uploads[-1].start()
+        return False
+    monkeypatch.setattr(cache, 'acquire', leased_elsewhere)
+
+    handler_module.handler(make_chart_event('NVDA'), None)
+
+    [record] = [json.loads(line) for line in capsys.readouterr().out.splitlines()
+                if line.startswith('{"_aws"')]
+    assert record['chart_renders_coalesced'] == 1
+    assert 'chart_renders' not in record and 'encode_ms' not in record
+    (_, _, _, posted), (_, method, _, edited) = handler_module.discord.events
+    assert method == 'PATCH' and edited['embeds'][0]['image']['url'].startswith('memory://')
+
+
+def test_handler_serves_stored_bars_once_the_quota_is_spent(handler_module, capsys):
+    handler_module.handler(make_chart_event('AAPL'), None)
+    del handler_module.discord.events[:]
+    handler_module.fmp.quota = 0
+
+    handler_module.handler(make_chart_event('AAPL', timeframe='weekly'), None)
+
+    record = json.loads([line for line in capsys.readouterr().out.splitlines()
+                         if line.startswith('{"_aws"')][-1])
+    assert record['fmp_quota_exhausted'] == 1
+    assert record['benchmark_cache_stale'] == 1 and record['ohlcv_stale'] == 1
+    (_, _, _, posted), _ = handler_module.discord.events
+    assert posted['embeds'][0]['title'] == 'AAPL Weekly Chart'
+
+
+def test_compare_posts_one_grid_for_all_symbols(handler_module, capsys):
+    handler_module.handler(make_chart_event('aapl msft nvda', command='compare'), None)
+
+    [(_, method, _, posted)] = handler_module.discord.events
+    assert method == 'POST'
+    [embed] = posted['embeds']
+    assert embed['title'] == 'AAPL vs MSFT vs NVDA Daily Comparison'
+    assert [field['name'] for field in embed['fields']] == ['AAPL', 'MSFT', 'NVDA']
+    assert '/compare/' in embed['image']['url'] and '-3x-' in embed['image']['url']
+    [record] = [json.loads(line) for line in capsys.readouterr().out.splitlines()
+                if line.startswith('{"_aws"')]
+    assert record['chart_renders'] == 1 and record['stage_calls']['upload'] == 1
+    assert record['stage_calls']['compare_panel'] == 3
+    assert sorted(record['panel_render_ms']) == ['AAPL', 'MSFT', 'NVDA']
+    assert record['charts'] == 0
+
+
+def test_compare_grid_is_reused_from_the_cache(handler_module):
+    event = make_chart_event('AMD, TSLA', command='compare')
+    handler_module.handler(event, None)
+    handler_module.handler(event, None)
+
+    (_, _, _, first), (_, _, _, second) = handler_module.discord.events
+    assert first['embeds'][0]['image'] == second['embeds'][0]['image']
+
+
+def test_handler_stops_waiting_in_time_to_render(handler_module, monkeypatch, capsys):
+    # Another invocation holds the lease and never finishes; with 9 s left
+    # and 8 s kept for rendering, this one waits about a second
+    cache = handler_module.chart_cache
+    monkeypatch.setattr(cache, 'acquire', lambda key, now=None: False)
+
+    class Context:
+        def get_remaining_time_in_millis(self):
+            return 9000
+
+    started = time.monotonic()
+    handler_module.handler(make_chart_event('NVDA'), Context())
+
+    assert time.monotonic() - started < 5
+    [record] = [json.loads(line) for line in capsys.readouterr().out.splitlines()
+                if line.startswith('{"_aws"')]
+    assert record['chart_coalesce_timeouts'] == 1 and record['chart_renders'] == 1
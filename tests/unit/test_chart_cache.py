@@ -0,0 +1,124 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from utils.blob_store import LocalBlobStore, MemoryBlobStore
+from utils.chart_cache import ChartCache, chart_cache_key
+
+
+def frames(last_close=101.0):
+    index = pd.to_datetime(['2024-05-09', '2024-05-10'])
+    df = pd.DataFrame({'Open': [100.0, 100.5], 'High': [102.0, 103.0],
+                       'Low': [99.0, 99.5], 'Close': [100.0, last_close],
+                       'Volume': [1000, 2000]}, index=index)
+    spy_df = pd.DataFrame({'SPY Close': [500.0, 502.0]}, index=index)
+    return df, spy_df
+
+
+def test_key_is_stable_for_identical_content():
+    key = chart_cache_key('nvda', *frames())
+
+    assert key == chart_cache_key('NVDA', *frames())
+    assert key.startswith('charts/cache/NVDA/2024-05-10/daily-w120-v2-')
+    assert key.endswith('.png')
+
+
+def test_key_changes_with_last_bar_style_window_and_timeframe():
+    key = chart_cache_key('NVDA', *frames())
+
+    assert key != chart_cache_key('NVDA', *frames(last_close=101.5))
+    assert key != chart_cache_key('NVDA', *frames(), style_version=3)
+    assert key != chart_cache_key('NVDA', *frames(), window=60)
+    assert key != chart_cache_key('NVDA', *frames(), timeframe='weekly')
+
+
+def test_key_extension_follows_output_format():
+    # The handler and the pre-render job pass only the output settings, so
+    # they cannot disagree on the extension
+    webp = {'fmt': 'webp', 'quality': 80}
+    assert chart_cache_key('NVDA', *frames(), output=webp).endswith('.webp')
+    assert chart_cache_key('NVDA', *frames(), output={'fmt': 'jpeg'}).endswith('.jpg')
+    assert chart_cache_key('NVDA', *frames(), extension='png', output=webp).endswith('.png')
+
+
+def test_lookup_after_put():
+    cache = ChartCache(MemoryBlobStore())
+    key = chart_cache_key('NVDA', *frames())
+
+    assert cache.lookup(key) is None
+    assert cache.put(key, b'png') == 'memory://' + key
+    assert cache.lookup(key) == 'memory://' + key
+
+
+def test_lease_goes_to_one_invocation_until_it_expires(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    first, second = ChartCache(store, lease_ttl=20), ChartCache(store, lease_ttl=20)
+    key = chart_cache_key('NVDA', *frames())
+
+    assert first.acquire(key, now=1000)
+    assert not second.acquire(key, now=1010)
+    assert second.acquire(key, now=1021)
+
+
+def test_render_once_coalesces_concurrent_renders():
+    store = MemoryBlobStore()
+    key = chart_cache_key('NVDA', *frames())
+    renders = []
+
+    def render(cache):
+        renders.append(cache)
+        time.sleep(0.2)
+        return cache.put(key, b'png')
+
+    caches = [ChartCache(store, poll_interval=0.01) for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        urls = list(executor.map(lambda cache: cache.render_once(key, lambda: render(cache)), caches))
+
+    assert len(renders) == 1
+    assert urls == ['memory://' + key] * 4
+
+
+def test_waiters_stop_when_the_render_fails():
+    store = MemoryBlobStore()
+    key = chart_cache_key('NVDA', *frames())
+    holder = ChartCache(store)
+    waiter = ChartCache(store, poll_interval=0.01, max_poll_interval=0.01, lease_check=0.05)
+
+    def fail():
+        time.sleep(0.1)
+        raise RuntimeError('render failed')
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        failed = executor.submit(holder.render_once, key, fail)
+        time.sleep(0.05)
+        started = time.monotonic()
+        url = waiter.render_once(key, lambda: waiter.put(key, b'png'))
+
+    assert url == 'memory://' + key
+    assert time.monotonic() - started < 1
+    with pytest.raises(RuntimeError):
+        failed.result()
+
+
+def test_wait_is_bounded_and_backs_off():
+    store = MemoryBlobStore()
+    key = chart_cache_key('NVDA', *frames())
+    holder = ChartCache(store, lease_ttl=20)
+    waiter = ChartCache(store, lease_ttl=20, poll_interval=0.01, max_poll_interval=0.08)
+    assert holder.acquire(key)
+    polls = []
+    exists = store.exists
+    store.exists = lambda k: polls.append(k) or exists(k)
+    rendered = []
+
+    started = time.monotonic()
+    url = waiter.render_once(key, lambda: rendered.append(1) or waiter.put(key, b'png'),
+                             max_wait=0.3)
+
+    # Gave up after max_wait, not the 20 s lease, and rendered itself
+    assert time.monotonic() - started < 1
+    assert rendered and url == 'memory://' + key
+    # Polls back off: 0.01, 0.02, 0.04, then 0.08 apart
+    assert set(polls) == {key} and len(polls) <= 8
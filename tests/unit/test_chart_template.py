@@ -0,0 +1,64 @@
+from io import BytesIO
+
+import numpy as np
+
+from utils.chart_template import ChartTemplatePool, prepare_chart_data, render_with_mplfinance
+from utils.indicator_utils import IndicatorEngine
+from utils.mpl_utils import load_pyplot
+from utils.parse_utils import parse_closes, parse_ohlcv
+from tests.stubs import make_historical
+
+
+def chart_data(ticker, window=120):
+    df = parse_ohlcv(make_historical(ticker)['historical'])
+    spy_df = parse_closes(make_historical('SPY')['historical'], 'SPY Close')
+    frame = df.join(spy_df, how='inner')
+    indicators, _ = IndicatorEngine().run(frame)
+    return prepare_chart_data(frame, indicators, window=window)
+
+
+def test_template_is_reused_and_updated_in_place():
+    pool = ChartTemplatePool()
+    first, second = chart_data('AAPL'), chart_data('MSFT', window=60)
+
+    with pool.acquire() as template:
+        fig = template.render(first)
+        assert len(template.bodies.get_paths()) == 120
+    with pool.acquire() as reused:
+        assert reused is template
+        assert reused.render(second) is fig
+
+    assert len(template.bodies.get_paths()) == 60
+    assert np.allclose(template.rs_line.get_ydata(),
+                       second['df']['RS Ratio'].to_numpy())
+    assert template.ax_main.get_ylim() == second['ylim']
+    assert template.dates[-1] == second['df'].index[-1]
+
+
+def test_concurrent_acquires_get_separate_templates():
+    pool = ChartTemplatePool()
+
+    with pool.acquire() as first, pool.acquire() as second:
+        assert first is not second
+
+
+def test_template_renders_png():
+    with ChartTemplatePool().acquire() as template:
+        buf = BytesIO()
+        template.render(chart_data('NVDA')).savefig(buf, format='png')
+
+    assert buf.getvalue()[:8] == b'\x89PNG\r\n\x1a\n'
+
+
+def test_mplfinance_renders_compact_columns():
+    data = chart_data('AMD')
+    assert all(type(limit) is float for limit in data['ylim'])
+
+    fig = render_with_mplfinance(data)
+    try:
+        buf = BytesIO()
+        fig.savefig(buf, format='png')
+    finally:
+        load_pyplot().close(fig)
+
+    assert buf.getvalue()[:8] == b'\x89PNG\r\n\x1a\n'
@@ -0,0 +1,65 @@
+from io import BytesIO
+
+import numpy as np
+
+from utils.chart_cache import compare_cache_key
+from utils.chart_template import ChartTemplatePool
+from utils.compare_grid import CompareTemplate, grid_shape, prepare_compare_data
+from utils.parse_utils import parse_closes, parse_ohlcv
+from tests.stubs import make_historical
+
+
+def compare_frames(*symbols):
+    spy_df = parse_closes(make_historical('SPY')['historical'], 'SPY Close')
+    return {symbol: parse_ohlcv(make_historical(symbol)['historical']).join(spy_df, how='inner')
+            for symbol in symbols}
+
+
+def test_grid_shape():
+    assert [grid_shape(n) for n in (1, 2, 4, 5, 9)] == [(1, 1), (1, 2), (2, 2), (2, 3), (3, 3)]
+
+
+def test_panels_share_dates_and_are_normalized_to_spy():
+    frames = compare_frames('AAPL', 'MSFT')
+    # MSFT is missing the last two sessions
+    frames['MSFT'] = frames['MSFT'].iloc[:-2]
+
+    data = prepare_compare_data(frames, window=60)
+
+    assert data['dates'].equals(frames['AAPL'].index[-60:])
+    aapl, msft = data['panels']
+    assert np.isnan(msft['closes'][-2:]).all()
+    assert msft['close'] == frames['MSFT']['Close'].iloc[-1]
+    closes = frames['AAPL'][['Close', 'SPY Close']].to_numpy(dtype=float)[-60:]
+    rs = closes[:, 0] / closes[:, 1]
+    assert np.allclose(aapl['relative'], (rs / rs[0] - 1) * 100)
+    assert aapl['relative'][0] == 0
+    low, high = data['relative_ylim']
+    assert low < np.nanmin(msft['relative']) and high > np.nanmax(aapl['relative'])
+
+
+def test_grid_renders_and_times_each_panel():
+    data = prepare_compare_data(compare_frames('AAPL', 'MSFT', 'NVDA'))
+    pool = ChartTemplatePool(CompareTemplate)
+
+    with pool.acquire(3) as template:
+        buf = BytesIO()
+        template.render(data).savefig(buf, format='png')
+        panel_ms = template.panel_ms()
+    with pool.acquire(3) as reused:
+        assert reused is template
+
+    assert buf.getvalue()[:8] == b'\x89PNG\r\n\x1a\n'
+    assert list(panel_ms) == ['AAPL', 'MSFT', 'NVDA']
+    assert all(ms > 0 for ms in panel_ms.values())
+    assert len(template.bodies[0].get_paths()) == 120
+
+
+def test_compare_cache_key_follows_every_panel():
+    frames = compare_frames('AAPL', 'MSFT')
+    key = compare_cache_key(frames)
+    assert key.startswith('charts/cache/compare/') and '-2x-' in key
+    assert compare_cache_key(dict(frames)) == key
+
+    frames['MSFT'] = frames['MSFT'].iloc[:-1]
+    assert compare_cache_key(frames) != key
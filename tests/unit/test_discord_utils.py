@@ -0,0 +1,58 @@
+from utils import discord_utils
+from tests.stubs import DiscordStub
+
+
+def test_post_then_edit_message(monkeypatch):
+    with DiscordStub() as stub:
+        monkeypatch.setattr(discord_utils, 'api_base', stub.url)
+        session = discord_utils.make_discord_session()
+
+        response = discord_utils.post_message(
+            {'embeds': [{'title': 'AAPL'}]}, 'app', 'tok', wait=True, session=session)
+        message_id = discord_utils.message_id(response)
+        discord_utils.edit_message(
+            {'embeds': [{'title': 'AAPL', 'image': {'url': 'x'}}]},
+            'app', 'tok', message_id, session=session)
+
+    assert message_id == '1'
+    assert [(method, path) for method, path, _ in stub.requests] == [
+        ('POST', '/webhooks/app/tok'), ('PATCH', '/webhooks/app/tok/messages/1')]
+    assert stub.requests[0][2] == {'wait': 'true'}
+    assert stub.messages['1']['embeds'][0]['image'] == {'url': 'x'}
+
+
+def test_send_embeds_chunks_messages(monkeypatch):
+    with DiscordStub() as stub:
+        monkeypatch.setattr(discord_utils, 'api_base', stub.url)
+
+        responses = discord_utils.send_embeds_to_discord(
+            [{'title': str(i)} for i in range(23)], 'app', 'tok', session=discord_utils.make_discord_session())
+
+    assert [r['statusCode'] for r in responses] == [204, 204, 204]
+    assert [len(m['embeds']) for m in stub.messages.values()] == [10, 10, 3]
+    # Without wait Discord returns no message, so there is nothing to edit
+    assert discord_utils.message_id(responses[0]) is None
+
+
+def test_post_is_not_repeated_after_a_server_error(monkeypatch):
+    # The message was created before the gateway failed; posting it again
+    # would show it twice
+    with DiscordStub(failures=[502]) as stub:
+        monkeypatch.setattr(discord_utils, 'api_base', stub.url)
+
+        response = discord_utils.post_message(
+            {'content': 'AAPL'}, 'app', 'tok', session=discord_utils.make_discord_session())
+
+    assert response['statusCode'] == 502
+    assert len(stub.requests) == 1 and len(stub.messages) == 1
+
+
+def test_post_is_retried_when_rate_limited(monkeypatch):
+    with DiscordStub(failures=[429]) as stub:
+        monkeypatch.setattr(discord_utils, 'api_base', stub.url)
+
+        response = discord_utils.post_message(
+            {'content': 'AAPL'}, 'app', 'tok', session=discord_utils.make_discord_session())
+
+    assert response['statusCode'] == 204
+    assert len(stub.requests) == 2 and len(stub.messages) == 1
@@ -0,0 +1,54 @@
+import time
+
+from utils import fetch_utils
+from tests.stubs import FmpStub
+
+
+def test_fetch_data_from_api_reads_stub(monkeypatch):
+    with FmpStub() as stub:
+        monkeypatch.setattr(fetch_utils, 'base_url', stub.url)
+        session = fetch_utils.make_session()
+
+        data = fetch_utils.fetch_data_from_api(
+            'AAPL', from_date='2000-01-01', session=session)
+
+    assert data['symbol'] == 'AAPL'
+    assert len(data['historical']) > 200
+    method, path, query = stub.requests[0]
+    assert path == '/historical-price-full/AAPL'
+    assert query['from'] == '2000-01-01'
+
+
+def test_fetch_data_from_api_retries_server_errors(monkeypatch):
+    with FmpStub(failures=[503, 502]) as stub:
+        monkeypatch.setattr(fetch_utils, 'base_url', stub.url)
+        session = fetch_utils.make_session(retries=2, backoff=0)
+
+        data = fetch_utils.fetch_data_from_api('SPY', session=session)
+
+    assert data['symbol'] == 'SPY'
+    assert len(stub.requests) == 3
+
+
+def test_fetch_data_from_api_returns_none_when_retries_exhausted(monkeypatch):
+    with FmpStub(failures=[500, 500]) as stub:
+        monkeypatch.setattr(fetch_utils, 'base_url', stub.url)
+        session = fetch_utils.make_session(retries=1, backoff=0)
+
+        assert fetch_utils.fetch_data_from_api('SPY', session=session) is None
+
+
+def test_fetch_concurrently_overlaps_requests(monkeypatch):
+    with FmpStub(delay=0.3) as stub:
+        monkeypatch.setattr(fetch_utils, 'base_url', stub.url)
+        session = fetch_utils.make_session()
+
+        start = time.perf_counter()
+        data, spy_data = fetch_utils.fetch_concurrently(
+            lambda t: fetch_utils.fetch_data_from_api(t, session=session),
+            ['NVDA', 'SPY'])
+        elapsed = time.perf_counter() - start
+
+    assert data['symbol'] == 'NVDA'
+    assert spy_data['symbol'] == 'SPY'
+    assert elapsed < 0.55
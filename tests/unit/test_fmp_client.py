@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import fetch_utils, metrics_utils
+from utils.fmp_client import FmpClient, TokenBucket
+from tests.stubs import FmpStub
+
+
+@pytest.fixture
+def fmp(monkeypatch):
+    with FmpStub() as stub:
+        monkeypatch.setattr(fetch_utils, 'base_url', stub.url)
+        yield stub
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_spends_burst_then_paces():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+
+    assert all(bucket.acquire() for _ in range(3))
+    assert clock.now == 0
+    assert bucket.acquire()
+    assert clock.now == pytest.approx(0.5)
+    assert not bucket.acquire(timeout=0.1)
+
+
+def test_retries_throttling_with_jitter(fmp):
+    fmp.failures = [429, 503]
+    sleeps = []
+    client = FmpClient(batch=1, backoff=0.5, sleep=sleeps.append)
+
+    payload = client.historical('AAPL', '2024-01-01')
+
+    assert payload['symbol'] == 'AAPL'
+    assert len(fmp.requests) == 3
+    assert 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+
+
+def test_concurrent_calls_share_one_batched_request(fmp):
+    client = FmpClient(batch=5, batch_window=0.05)
+    symbols = ['AAPL', 'MSFT', 'NVDA', 'AMD', 'SPY']
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        payloads = list(executor.map(lambda s: client.historical(s, '2024-01-01'), symbols))
+
+    assert [payload['symbol'] for payload in payloads] == symbols
+    [(_, path, query)] = fmp.requests
+    assert sorted(path.rsplit('/', 1)[-1].split(',')) == sorted(symbols)
+    assert query['from'] == '2024-01-01'
+
+
+def test_bucket_keeps_bursts_under_the_rate_limit(fmp):
+    fmp.rate = 25
+    client = FmpClient(rate=20, capacity=2, batch=1)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        payloads = list(executor.map(lambda i: client.historical(f'T{i}', '2024-01-01'), range(30)))
+
+    assert all(payload is not None for payload in payloads)
+    assert fmp.throttled == 0
+
+
+def test_spent_quota_fails_fast(fmp):
+    fmp.quota = 1
+    client = FmpClient(batch=1, max_retries=2, sleep=lambda seconds: None, cooldown=60)
+    metrics = metrics_utils.start_invocation()
+
+    assert client.historical('AAPL', '2024-01-01') is not None
+    assert client.historical('MSFT', '2024-01-01') is None
+    requests_made = len(fmp.requests)
+    assert client.historical('NVDA', '2024-01-01') is None
+
+    assert len(fmp.requests) == requests_made == 4
+    values = metrics.values()
+    assert values['fmp_throttled'] == 3
+    assert values['fmp_quota_exhausted'] == 1
+    assert values['fmp_quota_skipped'] == 1
+
+
+def test_intraday_wraps_bars_like_daily(fmp):
+    client = FmpClient(batch=1)
+
+    payload = client.intraday('AAPL', '5min', '2000-01-01')
+
+    assert payload['symbol'] == 'AAPL' and len(payload['historical']) > 100
+    assert fmp.requests[0][1] == '/historical-chart/5min/AAPL'
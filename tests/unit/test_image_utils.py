@@ -0,0 +1,61 @@
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from utils.image_utils import encode_figure, file_extension, output_config_from_env
+
+MAGIC = {'image/png': b'\x89PNG', 'image/jpeg': b'\xff\xd8\xff', 'image/webp': b'RIFF'}
+
+
+def sample_figure():
+    fig = Figure(figsize=(4, 3))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(range(50), [i % 7 for i in range(50)], color='#268bd2')
+    ax.bar(range(50), [i % 5 for i in range(50)], color='#4dc790')
+    return fig
+
+
+@pytest.mark.parametrize('options, content_type', [
+    ({'fmt': 'png'}, 'image/png'),
+    ({'fmt': 'png', 'colors': 64, 'compress_level': 9}, 'image/png'),
+    ({'fmt': 'webp', 'quality': 80}, 'image/webp'),
+    ({'fmt': 'webp', 'quality': 100}, 'image/webp'),
+    ({'fmt': 'jpeg', 'quality': 85}, 'image/jpeg'),
+])
+def test_encode_figure_formats(options, content_type):
+    buf, encoded_type = encode_figure(sample_figure(), **options)
+
+    assert encoded_type == content_type
+    assert buf.tell() == 0
+    assert buf.getvalue().startswith(MAGIC[content_type])
+
+
+def test_palette_png_is_smaller():
+    fig = sample_figure()
+    full, _ = encode_figure(fig, fmt='png')
+    palette, _ = encode_figure(fig, fmt='png', colors=64)
+
+    assert len(palette.getvalue()) < len(full.getvalue())
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        encode_figure(sample_figure(), fmt='svg')
+
+
+@pytest.mark.parametrize('value, fmt', [('PNG', 'png'), ('jpg', 'jpeg'), (' webp ', 'webp')])
+def test_chart_format_is_normalised(monkeypatch, value, fmt):
+    monkeypatch.setenv('CHART_FORMAT', value)
+
+    config = output_config_from_env()
+
+    assert config['fmt'] == fmt
+    file_extension(config['fmt'])
+
+
+def test_unknown_chart_format_fails_at_load(monkeypatch):
+    monkeypatch.setenv('CHART_FORMAT', 'gif')
+
+    with pytest.raises(ValueError, match='CHART_FORMAT'):
+        output_config_from_env()
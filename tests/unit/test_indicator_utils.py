@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from utils.indicator_utils import (IndicatorEngine, IndicatorStates, calculate_adrp,
+                                   calculate_change_last_two_prices)
+from utils.parse_utils import parse_closes, parse_ohlcv
+from tests.stubs import make_historical, make_intraday
+
+
+def sample_frame(days=800):
+    df = parse_ohlcv(make_historical('AAPL', days=days)['historical'])
+    spy_df = parse_closes(make_historical('SPY', days=days)['historical'], 'SPY Close')
+    return df.join(spy_df, how='inner')
+
+
+def test_full_run_matches_pandas():
+    frame = sample_frame()
+    close = frame['Close']
+
+    result, _ = IndicatorEngine(keep=len(frame)).run(frame)
+
+    assert np.allclose(result['sma_50'], close.rolling(window=50).mean(), equal_nan=True)
+    assert np.allclose(result['ema_10'], close.ewm(span=10, adjust=False).mean())
+    assert np.allclose(result['ema_21'], close.ewm(span=21, adjust=False).mean())
+    merged_df = frame[['Close']].merge(frame[['SPY Close']], on='Date', how='inner')
+    assert np.allclose(result['rs'], merged_df['Close'] / merged_df['SPY Close'])
+    assert np.isclose(result['adrp_20'].iloc[-1], calculate_adrp(frame, 20))
+
+    true_range = pd.concat([frame['High'] - frame['Low'],
+                            (frame['High'] - close.shift()).abs(),
+                            (frame['Low'] - close.shift()).abs()], axis=1).max(axis=1)
+    assert np.allclose(result['atr_14'], true_range.ewm(alpha=1 / 14, adjust=False).mean())
+
+    rs = result['rs']
+    expected_high = rs >= rs.rolling(window=252, min_periods=1).max()
+    assert (result['rs_new_high'].astype(bool) == expected_high).all()
+
+
+def test_incremental_run_matches_full_run():
+    frame = sample_frame()
+    engine = IndicatorEngine()
+
+    _, state = engine.run(frame.iloc[:-15])
+    incremental, _ = engine.run(frame, state)
+    full, _ = IndicatorEngine().run(frame)
+
+    assert state['as_of'] == frame.index[-17].isoformat()
+    pd.testing.assert_frame_equal(incremental, full, check_exact=False)
+
+
+def test_intraday_run_resumes_from_the_saved_bar():
+    df = parse_ohlcv(make_intraday('AAPL', days=3, interval=5))
+    spy_df = parse_closes(make_intraday('SPY', days=3, interval=5), 'SPY Close')
+    frame = df.join(spy_df, how='inner')
+    engine = IndicatorEngine()
+
+    _, state = engine.run(frame.iloc[:-10])
+    start, _, _ = engine._resume(frame, state)
+    incremental, _ = engine.run(frame, state)
+    full, _ = IndicatorEngine().run(frame)
+
+    # Several bars share a date, so only the full timestamp finds the bar
+    assert start == len(frame) - 11
+    pd.testing.assert_frame_equal(incremental, full, check_exact=False)
+
+
+def test_revised_last_bar_is_recomputed():
+    frame = sample_frame()
+    engine = IndicatorEngine()
+    _, state = engine.run(frame)
+
+    revised = frame.copy()
+    revised.iloc[-1, revised.columns.get_loc('Close')] *= 1.1
+    incremental, _ = engine.run(revised, state)
+    full, _ = IndicatorEngine().run(revised)
+
+    pd.testing.assert_frame_equal(incremental, full, check_exact=False)
+
+
+def test_state_is_dropped_when_history_is_revised():
+    frame = sample_frame()
+    engine = IndicatorEngine()
+    _, state = engine.run(frame.iloc[:-5])
+
+    # A 2:1 split adjusts every earlier bar
+    revised = frame.copy()
+    revised[['Open', 'High', 'Low', 'Close']] /= 2
+    incremental, _ = engine.run(revised, state)
+    full, _ = IndicatorEngine().run(revised)
+
+    pd.testing.assert_frame_equal(incremental, full, check_exact=False)
+
+
+def test_state_for_other_indicators_is_ignored():
+    frame = sample_frame(days=200)
+    _, state = IndicatorEngine({'ema_10': ('ema', {'span': 10})}).run(frame)
+
+    result, _ = IndicatorEngine().run(frame, state)
+
+    assert list(result.columns)[:3] == ['sma_50', 'ema_10', 'ema_21']
+    assert len(result) == len(frame)
+
+
+def test_calculate_change_last_two_prices():
+    frame = sample_frame(days=10)
+
+    abs_change, percent_change = calculate_change_last_two_prices(frame)
+
+    assert np.isclose(abs_change, frame['Close'].iloc[-1] - frame['Close'].iloc[-2])
+    assert np.isclose(percent_change, abs_change / frame['Close'].iloc[-2] * 100)
+
+
+def test_state_holds_compact_arrays():
+    _, state = IndicatorEngine().run(sample_frame())
+
+    for values in state['values'].values():
+        # Own float64 buffers of at most `keep` values, not views of the run
+        assert values.dtype == np.float64 and values.base is None and len(values) <= 260
+    assert sum(v.nbytes for v in state['values'].values()) < 16 * 1024
+
+
+def test_indicator_states_drop_the_least_recently_used():
+    states = IndicatorStates(max_entries=2)
+    states.put(('AAPL', 'daily'), {'as_of': 1})
+    states.put(('MSFT', 'daily'), {'as_of': 2})
+    assert states.get(('AAPL', 'daily')) == {'as_of': 1}
+
+    states.put(('NVDA', 'daily'), {'as_of': 3})
+
+    assert len(states) == 2
+    assert ('MSFT', 'daily') not in states
+    assert ('AAPL', 'daily') in states and ('NVDA', 'daily') in states
+    states.put(('AAPL', 'daily'), None)
+    assert ('AAPL', 'daily') not in states
+
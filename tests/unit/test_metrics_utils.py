@@ -0,0 +1,57 @@
+import json
+
+from utils import metrics_utils
+from utils.metrics_utils import Metrics, aggregate, percentile, read_records
+
+
+def test_stages_and_counters_end_up_in_one_emf_record():
+    metrics = Metrics()
+    with metrics.stage('fetch_ticker'):
+        pass
+    metrics.record('fetch_ticker', 5.0)
+    metrics.count('chart_bytes', 100)
+    metrics.count('chart_bytes', 50)
+    metrics.set('symbols', ['AAPL'])
+
+    record = metrics.emf()
+
+    directive = record['_aws']['CloudWatchMetrics'][0]
+    units = {m['Name']: m['Unit'] for m in directive['Metrics']}
+    assert units['fetch_ticker_ms'] == 'Milliseconds'
+    assert units['chart_bytes'] == 'Bytes'
+    assert directive['Dimensions'] == [['Function']]
+    assert record['fetch_ticker_ms'] >= 5.0
+    assert record['stage_calls'] == {'fetch_ticker': 2}
+    assert record['chart_bytes'] == 150
+    assert record['symbols'] == ['AAPL']
+    # Every listed metric has a value on the record, as EMF requires
+    assert all(name in record for name in units)
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+
+
+def test_aggregate_reads_prefixed_log_lines(tmp_path, capsys):
+    lines = []
+    for ms in (10, 20, 30, 40):
+        metrics = Metrics()
+        metrics.record('render', ms)
+        lines.append('2024-05-10T21:00:00Z\tabc\t' + json.dumps(metrics.emf()))
+    lines.insert(1, 'plotting')
+    log = tmp_path / 'chart.log'
+    log.write_text('\n'.join(lines))
+
+    summary = aggregate(read_records(log.read_text().splitlines()))
+    assert summary['render_ms']['n'] == 4
+    assert summary['render_ms']['p50'] == 20
+    assert summary['render_ms']['p99'] == 40
+
+    metrics_utils.main([str(log)])
+    out = capsys.readouterr().out
+    assert out.startswith('4 invocations')
+    assert 'render_ms' in out
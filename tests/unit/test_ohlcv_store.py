@@ -0,0 +1,132 @@
+import datetime
+
+import numpy as np
+
+from utils.blob_store import LocalBlobStore
+from utils.ohlcv_store import OhlcvStore
+from tests.stubs import make_historical
+
+
+class RecordedFetch:
+    # Serves a slice of one synthetic history, like FMP's `from` parameter
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, ticker, from_date):
+        self.calls.append(from_date)
+        if self.fail:
+            return None
+        return {'symbol': ticker, 'historical': [
+            row for row in self.payload['historical'] if row['date'] >= from_date]}
+
+
+def test_update_fetches_only_missing_bars(tmp_path):
+    end = datetime.date(2024, 5, 10)
+    payload = make_historical('AAPL', days=400, end=end)
+    fetch = RecordedFetch(payload)
+    store = OhlcvStore(LocalBlobStore(str(tmp_path)), fetch)
+
+    # First request sees the data up to 2024-05-03
+    fetch.payload = {'historical': [row for row in payload['historical']
+                                    if row['date'] <= '2024-05-03']}
+    first = store.update('AAPL', '2023-05-10')
+    assert fetch.calls == ['2023-05-10']
+    assert first.index[-1].strftime('%Y-%m-%d') == '2024-05-03'
+
+    # A week later only the bars from the last final stored one are requested
+    fetch.payload = payload
+    df = store.update('AAPL', '2023-05-17')
+    assert fetch.calls[-1] == '2024-05-02'
+    assert df.index[0] >= datetime.datetime(2023, 5, 17)
+    assert df.index[-1].strftime('%Y-%m-%d') == '2024-05-10'
+    assert df.index.is_unique and df.index.is_monotonic_increasing
+    assert list(df.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    expected = {row['date']: row['close'] for row in payload['historical']}
+    assert all(expected[d.strftime('%Y-%m-%d')] == c
+               for d, c in df['Close'].items())
+    assert df['Close'].dtype == np.float64 and df['Volume'].dtype == np.int64
+
+
+def test_update_serves_stored_bars_when_fetch_fails(tmp_path):
+    payload = make_historical('MSFT', days=100, end=datetime.date(2024, 5, 10))
+    fetch = RecordedFetch(payload)
+    store = OhlcvStore(LocalBlobStore(str(tmp_path)), fetch)
+    store.update('MSFT', '2024-02-01')
+
+    fetch.fail = True
+    df = store.update('MSFT', '2024-02-01')
+
+    assert df.index[-1].strftime('%Y-%m-%d') == '2024-05-10'
+
+    # Also when a longer window would have meant a full refetch
+    df = store.update('MSFT', '2024-01-02')
+    assert df.index[0].strftime('%Y-%m-%d') >= '2024-02-01'
+
+
+def test_update_refetches_when_window_grows(tmp_path):
+    payload = make_historical('NVDA', days=400, end=datetime.date(2024, 5, 10))
+    fetch = RecordedFetch(payload)
+    store = OhlcvStore(LocalBlobStore(str(tmp_path)), fetch)
+    store.update('NVDA', '2024-01-02')
+
+    df = store.update('NVDA', '2023-06-01')
+
+    assert fetch.calls == ['2024-01-02', '2023-06-01']
+    assert df.index[0] < datetime.datetime(2023, 6, 5)
+
+
+def test_update_refetches_when_history_is_revised(tmp_path):
+    payload = make_historical('TSLA', days=200, end=datetime.date(2024, 5, 10))
+    fetch = RecordedFetch(payload)
+    store = OhlcvStore(LocalBlobStore(str(tmp_path)), fetch)
+    store.update('TSLA', '2024-01-02')
+
+    # A 3:1 split rewrites every bar
+    fetch.payload = {'historical': [dict(row, close=row['close'] / 3)
+                                    for row in payload['historical']]}
+    df = store.update('TSLA', '2024-01-02')
+
+    assert fetch.calls == ['2024-01-02', '2024-05-09', '2024-01-02']
+    first = [row for row in payload['historical'] if row['date'] >= '2024-01-02'][-1]
+    assert df['Close'].iloc[0] == first['close'] / 3
+
+
+def test_load_reads_daily_float64_archives(tmp_path):
+    # The layout written before intraday dates and integer volumes
+    import io
+    buf = io.BytesIO()
+    dates = np.array(['2024-05-09', '2024-05-10'], dtype='datetime64[D]')
+    prices = {name: np.array([1.5, 2.5]) for name in ('open', 'high', 'low', 'close')}
+    np.savez_compressed(buf, date=dates.astype(np.int64), start=np.array('2024-05-01'),
+                        volume=np.array([100.0, 200.0]), **prices)
+    backend = LocalBlobStore(str(tmp_path))
+    backend.put('ohlcv/AAPL.npz', buf.getvalue())
+
+    df, start = OhlcvStore(backend, RecordedFetch({'historical': []})).load('AAPL')
+
+    assert start == '2024-05-01'
+    assert [d.strftime('%Y-%m-%d') for d in df.index] == ['2024-05-09', '2024-05-10']
+    assert df['Close'].dtype == np.float64 and df['Volume'].tolist() == [100, 200]
+
+
+def test_float32_archives_are_fetched_again(tmp_path):
+    # Prices written as float32 were rounded, so the whole window is refetched
+    payload = make_historical('AAPL', days=30, end=datetime.date(2024, 5, 10))
+    store = OhlcvStore(LocalBlobStore(str(tmp_path)), RecordedFetch(payload))
+    store.update('AAPL', '2024-04-15')
+    import io
+    archive = dict(np.load(io.BytesIO(store.store.get('ohlcv/AAPL.npz'))))
+    for name in ('open', 'high', 'low', 'close'):
+        archive[name] = archive[name].astype(np.float32)
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **archive)
+    store.store.put('ohlcv/AAPL.npz', buf.getvalue())
+
+    assert store.load('AAPL') == (None, None)
+    df = store.update('AAPL', '2024-04-15')
+    assert store.fetch_fn.calls[-1] == '2024-04-15'
+    assert df['Close'].dtype == np.float64
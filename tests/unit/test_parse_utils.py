@@ -0,0 +1,61 @@
+import pandas as pd
+
+from utils.indicator_utils import calculate_adrp, calculate_change_last_two_prices
+from utils.parse_utils import parse_closes, parse_ohlcv
+from tests.stubs import make_historical
+
+
+def legacy_parse(historical):
+    # The list-comprehension parse the handler used before parse_utils
+    ohlc_data = [(row['date'], row['open'], row['high'],
+                  row['low'], row['close']) for row in historical]
+    volume_data = [row['volume'] for row in historical]
+    df = pd.DataFrame(ohlc_data[::-1], columns=[
+        'Date', 'Open', 'High', 'Low', 'Close'])
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+    df.set_index('Date', inplace=True)
+    df['Volume'] = volume_data[::-1]
+    return df
+
+
+def test_parse_ohlcv_matches_legacy_parse():
+    historical = make_historical('AAPL', days=400)['historical']
+
+    pd.testing.assert_frame_equal(parse_ohlcv(historical),
+                                  legacy_parse(historical), check_dtype=False,
+                                  check_index_type=False)
+
+
+def test_parse_closes_is_oldest_first():
+    historical = make_historical('SPY', days=30)['historical']
+
+    spy_df = parse_closes(historical, 'SPY Close')
+
+    assert list(spy_df.columns) == ['SPY Close']
+    assert spy_df.index.is_monotonic_increasing
+    assert spy_df['SPY Close'].iloc[-1] == historical[0]['close']
+
+
+def test_parse_empty_payload():
+    df = parse_ohlcv([])
+
+    assert len(df) == 0
+    assert list(df.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def test_six_figure_prices_are_quoted_exactly():
+    # A BRK-A sized price; float32 would read 612345.67 back as 612345.69
+    historical = [
+        {'date': '2024-05-10', 'open': 612000.0, 'high': 613500.25, 'low': 611000.5,
+         'close': 612345.67, 'volume': 5},
+        {'date': '2024-05-09', 'open': 610000.0, 'high': 612100.0, 'low': 609500.0,
+         'close': 611234.56, 'volume': 4},
+    ]
+
+    df = parse_ohlcv(historical)
+    change, percent = calculate_change_last_two_prices(df)
+
+    assert f'${df["Close"].iloc[-1]:.2f}' == '$612345.67'
+    assert f'${change:.2f}' == '$1111.11'
+    assert round(percent, 6) == round(1111.11 / 611234.56 * 100, 6)
+    assert f'{calculate_adrp(df, 2):.6f}' == f'{(2499.75 + 2600.0) / 2 / 612345.67 * 100:.6f}'
@@ -0,0 +1,82 @@
+import datetime
+import importlib
+
+import pytest
+
+from utils import fetch_utils
+from utils.benchmark_cache import BenchmarkCache
+from utils.blob_store import MemoryBlobStore
+from utils.chart_cache import ChartCache
+from utils.ohlcv_store import OhlcvStore
+from utils.request_stats import RequestStats
+from tests.stubs import FmpStub
+
+
+@pytest.fixture
+def prerender_module(monkeypatch):
+    module = importlib.import_module('prerender')
+    store = MemoryBlobStore()
+    fetch = fetch_utils.fetch_data_from_api
+    monkeypatch.setattr(module, 'benchmark_cache',
+                        BenchmarkCache(fetch, transform=module.parse_benchmark))
+    monkeypatch.setattr(module, 'ohlcv_store', OhlcvStore(store, fetch))
+    monkeypatch.setattr(module, 'chart_cache', ChartCache(store))
+    monkeypatch.setattr(module, 'request_stats', RequestStats(store))
+    with FmpStub() as fmp:
+        monkeypatch.setattr(fetch_utils, 'base_url', fmp.url)
+        yield module
+
+
+def test_prerender_fills_chart_cache(prerender_module):
+    report = prerender_module.prerender(['AAPL', 'MSFT'], workers=2, executor_kind='thread')
+
+    assert sorted(report['rendered']) == ['AAPL', 'MSFT']
+    assert report['executor'] == 'thread'
+    objects = prerender_module.chart_cache.store.objects
+    assert len([key for key in objects if key.startswith('charts/cache/')]) == 2
+
+    # A second run finds every chart in the cache
+    report = prerender_module.prerender(['AAPL', 'MSFT'], workers=2, executor_kind='thread')
+    assert report['rendered'] == [] and sorted(report['cached']) == ['AAPL', 'MSFT']
+
+
+def test_prerender_renders_in_process_pool(prerender_module):
+    report = prerender_module.prerender(['NVDA', 'TSLA'], workers=2)
+
+    assert sorted(report['rendered']) == ['NVDA', 'TSLA']
+    assert report['executor'] == 'process'
+
+
+def test_prerender_symbols_falls_back_to_most_requested(prerender_module, monkeypatch):
+    monkeypatch.setattr(prerender_module, 'watchlist', [])
+    monkeypatch.setattr(prerender_module, 'top_n', 2)
+    stats = prerender_module.request_stats
+    stats.record(['AAPL', 'MSFT', 'AMD'])
+    stats.record(['MSFT', 'AMD'])
+    stats.record(['AMD'])
+
+    assert prerender_module.prerender_symbols({}) == ['AMD', 'MSFT']
+    assert prerender_module.prerender_symbols({'symbols': ['spy']}) == ['SPY']
+
+
+def test_request_stats_sum_containers_and_days():
+    store = MemoryBlobStore()
+    now = datetime.datetime(2024, 5, 10, 12, tzinfo=datetime.timezone.utc)
+    first, second = RequestStats(store), RequestStats(store)
+    first.record(['AAPL', 'MSFT'], now=now - datetime.timedelta(days=1))
+    second.record(['AAPL'], now=now)
+    second.record(['AAPL', 'NVDA'], now=now)
+
+    assert second.counts(days=5, now=now) == {'AAPL': 3, 'MSFT': 1, 'NVDA': 1}
+    assert second.counts(days=1, now=now) == {'AAPL': 2, 'NVDA': 1}
+
+
+def test_prerender_tops_up_the_rank_universe(prerender_module, monkeypatch):
+    monkeypatch.setattr(prerender_module, 'rank_universe', ['AAPL', 'MSFT'])
+
+    report = prerender_module.refresh_rank_universe()
+
+    assert report['universe'] == 2 and report['failed'] == []
+    assert prerender_module.ohlcv_store.tickers() == ['AAPL', 'MSFT']
+    df, start = prerender_module.ohlcv_store.load('AAPL')
+    assert start == prerender_module.rank_from_date()
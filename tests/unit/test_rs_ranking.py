@@ -0,0 +1,104 @@
+import datetime
+import importlib
+import json
+
+import numpy as np
+import pytest
+
+from utils import discord_utils, fetch_utils
+from utils.benchmark_cache import BenchmarkCache
+from utils.blob_store import MemoryBlobStore
+from utils.indicator_utils import IndicatorEngine, calculate_adrp, calculate_change_last_two_prices
+from utils.ohlcv_store import OhlcvStore
+from utils.parse_utils import parse_closes, parse_ohlcv
+from utils.rs_ranking import align_universe, format_rank_table, rank_universe, rank_window
+from tests.stubs import DiscordStub, FmpStub, make_historical
+
+END = datetime.date(2024, 5, 10)
+
+
+def universe_frames():
+    spy_df = parse_closes(make_historical('SPY', days=500, end=END)['historical'], 'SPY Close')
+    frames = {symbol: parse_ohlcv(make_historical(symbol, days=500, end=END)['historical'])
+              for symbol in ('AAPL', 'MSFT', 'NVDA')}
+    # A ticker whose bars stop two sessions early is stale
+    frames['OLD'] = frames['NVDA'].iloc[:-2]
+    return frames, spy_df.iloc[-rank_window():]
+
+
+def ranked(frames, spy_df, top=10):
+    universe = {symbol: (df.index.values, {name: df[name].to_numpy() for name in df})
+                for symbol, df in frames.items()}
+    symbols, matrices = align_universe(universe, spy_df.index.values)
+    return rank_universe(symbols, matrices, spy_df['SPY Close'].to_numpy(), top=top)
+
+
+def test_rank_matches_per_ticker_indicators():
+    frames, spy_df = universe_frames()
+
+    result = ranked(frames, spy_df)
+
+    assert result['ranked'] == 3 and result['stale'] == 1
+    changes = [row['rs_change_pct'] for row in result['rows']]
+    assert changes == sorted(changes, reverse=True)
+    for row in result['rows']:
+        frame = frames[row['symbol']].join(spy_df, how='inner')
+        indicators, _ = IndicatorEngine().run(frame)
+        rs = indicators['rs']
+        assert row['rs_change_pct'] == pytest.approx((rs.iloc[-1] / rs.iloc[-64] - 1) * 100)
+        assert row['rs_new_high'] == bool(indicators['rs_new_high'].iloc[-1])
+        assert row['adrp'] == pytest.approx(calculate_adrp(frame, 20), rel=1e-5)
+        assert row['change_pct'] == pytest.approx(calculate_change_last_two_prices(frame)[1], rel=1e-5)
+
+
+def test_rank_leaves_out_tickers_missing_the_last_bar():
+    frames, spy_df = universe_frames()
+
+    rows = ranked(frames, spy_df, top=2)['rows']
+
+    assert len(rows) == 2
+    assert 'OLD' not in [row['symbol'] for row in ranked(frames, spy_df)['rows']]
+
+
+def test_align_places_bars_by_date():
+    frames, spy_df = universe_frames()
+    universe = {'OLD': (frames['OLD'].index.values,
+                        {name: frames['OLD'][name].to_numpy() for name in frames['OLD']})}
+
+    _, matrices = align_universe(universe, spy_df.index.values)
+
+    close = matrices['Close'][:, 0]
+    assert np.isnan(close[-2:]).all()
+    assert close[-3] == frames['OLD']['Close'].iloc[-1]
+
+
+def test_table_fits_a_discord_message():
+    row = {'symbol': 'GOOGL', 'close': 1234.5, 'change_pct': -1.5, 'adrp': 3.2,
+           'rs_change_pct': 25.0, 'rs_new_high': True}
+    assert len(format_rank_table([row] * 30)) < 2000
+
+
+def test_handler_posts_ranking(monkeypatch):
+    module = importlib.import_module('rs_rank')
+    store = MemoryBlobStore()
+    fetch = fetch_utils.fetch_data_from_api
+    monkeypatch.setattr(module, 'benchmark_cache',
+                        BenchmarkCache(fetch, transform=module.parse_benchmark))
+    monkeypatch.setattr(module, 'ohlcv_store', OhlcvStore(store, fetch))
+    message = {'application_id': 'app', 'token': 'tok',
+               'data': {'name': 'rank', 'options': [{'name': 'top', 'value': 2}]}}
+    with FmpStub() as fmp, DiscordStub() as discord:
+        monkeypatch.setattr(fetch_utils, 'base_url', fmp.url)
+        monkeypatch.setattr(discord_utils, 'api_base', discord.url)
+        for symbol in ('AAPL', 'MSFT', 'NVDA'):
+            module.ohlcv_store.update(symbol, fetch_utils.default_from_date())
+
+        module.handler({'Records': [{'Sns': {'Message': json.dumps(message)}}]}, None)
+
+    [(_, method, _, posted)] = discord.events
+    assert method == 'POST'
+    assert posted['content'].startswith('Top 2 of 3 by RS vs SPY')
+    assert ('Universe 3: 3 ranked, 0 skipped as stale, 0 with too little history, '
+            '0 never fetched') in posted['content']
+    # Title, counts, header and two rows inside the code block
+    assert len([line for line in posted['content'].splitlines() if '`' not in line]) == 5
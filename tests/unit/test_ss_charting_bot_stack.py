@@ -1,7 +1,11 @@
+import json
+
 import aws_cdk as core
 import aws_cdk.assertions as assertions
+from aws_cdk import aws_lambda as _lambda
 
-from ss_charting_bot.ss_charting_bot_stack import SsChartingBotStack
+from ss_charting_bot.ss_charting_bot_stack import (DEFAULT_PROFILE, SsChartingBotStack,
+                                                   lambda_runtime, load_lambda_profile)
 
 # example tests. To run these tests, uncomment this file along with the example
 # resource in ss_charting_bot/ss_charting_bot_stack.py
@@ -13,3 +17,20 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+def test_lambda_profile_defaults_without_a_file(tmp_path):
+    assert load_lambda_profile(str(tmp_path / 'missing.json')) == DEFAULT_PROFILE
+
+
+def test_lambda_profile_reads_the_chart_handler_settings(tmp_path):
+    path = tmp_path / 'lambda_profile.json'
+    path.write_text(json.dumps({'candidates': [], 'chart_handler': {
+        'memory_size': 1769, 'runtime': 'python3.12', 'architecture': 'arm64',
+        'provisioned_concurrency': 2}}))
+
+    profile = load_lambda_profile(str(path))
+
+    assert profile == dict(DEFAULT_PROFILE, memory_size=1769, runtime='python3.12',
+                           architecture='arm64', provisioned_concurrency=2)
+    assert lambda_runtime(profile['runtime']).name == _lambda.Runtime.PYTHON_3_12.name == 'python3.12'
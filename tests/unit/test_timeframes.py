@@ -0,0 +1,70 @@
+import datetime
+
+import pytest
+
+from utils.parse_utils import parse_closes, parse_ohlcv
+from utils.timeframes import AGGREGATIONS, TIMEFRAMES, chart_frame, make_chart_frame, resample, timeframe_name
+from tests.stubs import make_historical
+
+END = datetime.date(2024, 5, 10)
+
+
+def daily_frame(days=3 * 365):
+    df = parse_ohlcv(make_historical('AAPL', days=days, end=END)['historical'])
+    spy_df = parse_closes(make_historical('SPY', days=days, end=END)['historical'], 'SPY Close')
+    return df.join(spy_df, how='inner')
+
+
+@pytest.mark.parametrize('period, rule', [('week', 'W-SUN'), ('month', 'ME')])
+def test_resample_matches_pandas(period, rule):
+    frame = daily_frame()
+
+    bars = resample(frame, period)
+
+    expected = frame.resample(rule).agg(AGGREGATIONS).dropna()
+    assert len(bars) == len(expected)
+    for name in frame.columns:
+        assert (bars[name].to_numpy() == expected[name].to_numpy()).all(), name
+
+
+def test_resample_dates_bars_by_their_last_trading_day():
+    frame = daily_frame().loc['2024-04-29':'2024-05-10']
+
+    bars = resample(frame, 'week')
+
+    assert list(bars.index.strftime('%Y-%m-%d')) == ['2024-05-03', '2024-05-10']
+    assert bars['Open'].iloc[0] == frame['Open'].loc['2024-04-29']
+    assert bars['Volume'].iloc[1] == frame['Volume'].loc['2024-05-06':].sum()
+
+
+def test_chart_frame_trims_before_resampling():
+    df = parse_ohlcv(make_historical('AAPL', days=3 * 365, end=END)['historical'])
+    spy_df = parse_closes(make_historical('SPY', days=3 * 365, end=END)['historical'], 'SPY Close')
+
+    frame = chart_frame(df, spy_df, 'monthly', from_date=str(df.index[-300].date()))
+
+    assert frame.index[0] >= df.index[-300]
+    assert list(frame.columns) == ['Open', 'High', 'Low', 'Close', 'Volume', 'SPY Close']
+    assert chart_frame(df, spy_df, 'daily').equals(df.join(spy_df, how='inner'))
+
+
+def test_make_chart_frame_counts_history_with_the_callers_clock():
+    df = parse_ohlcv(make_historical('AAPL', days=3 * 365, end=END)['historical'])
+    spy_df = parse_closes(make_historical('SPY', days=3 * 365, end=END)['historical'], 'SPY Close')
+    calls = []
+
+    def from_date(days):
+        calls.append(days)
+        return str(END - datetime.timedelta(days=days))
+
+    frame = make_chart_frame(df, spy_df, 'daily', from_date_fn=from_date)
+
+    assert calls == [TIMEFRAMES['daily']['history_days']]
+    assert len(frame) and frame.index[-1] == df.index[-1]
+    assert frame.index[0] >= df.index[-1] - datetime.timedelta(days=calls[0])
+
+
+def test_timeframe_name_defaults_to_daily():
+    assert timeframe_name(' Weekly ') == 'weekly'
+    assert timeframe_name(None) == 'daily'
+    assert timeframe_name('hourly') == 'daily'